@@ -6,216 +6,194 @@
 
 import streamlit as st
 import datetime
+import functools
+import io
+import json
+import os
 import pandas as pd
 from datetime import timedelta
-from collections import Counter
+
+from roteirizador_core import (
+    CAMPOS_CLIENTE, CAMPOS_COORDENADAS, CAMPOS_PADRAO, DEFAULTS, DIAS_SEMANA, FORMATOS_EXPORTACAO, INSTRUMENTACAO,
+    MAPA_DIA_IDX, MODOS_CENARIO, REGRAS_FREQUENCIA, TAMANHO_PAGINA_CLIENTES, CacheCompartilhado, GerenciadorTarefas,
+    alertas_agenda, criar_armazem, formatar_dias, gravar_traco, instrumentado, servir_metricas, tarefa_cenarios,
+    tarefa_exportar, tarefa_gerar_agenda, tarefa_importar, tarefa_redistribuir, tarefa_redistribuir_global,
+    tarefa_sequenciar, tem_coordenadas,
+)
 
 # -------------------------------
 # Configuração inicial
 # -------------------------------
 st.set_page_config(page_title="OptiMove Roteirização", page_icon="🧭", layout="wide")
 st.title("🧭 Sistema de Roteirização com calendário e alertas")
-
-DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]
-MAPA_DIA_IDX = {dia: i for i, dia in enumerate(DIAS_SEMANA)}  # útil para ordenação / consistência
+execucao = INSTRUMENTACAO.iniciar_execucao("pagina")
 
 # -------------------------------
 # Estado global
 # -------------------------------
-if "clientes" not in st.session_state:
-    st.session_state.clientes = [
-        {"id": 1, "nome": "Cliente A", "rota": "BR001", "dia_semana": "Segunda", "frequencia": 7},
-        {"id": 2, "nome": "Cliente B", "rota": "BR001", "dia_semana": "Segunda", "frequencia": 14},
-        {"id": 3, "nome": "Cliente C", "rota": "BR001", "dia_semana": "Terça", "frequencia": 30},
-    ]
-
-DEFAULTS = {
-    "capacidade_por_dia": 40,
-    "semanas": 6,
-    "inicio": datetime.date(2025, 12, 24),  # Semana 1 sempre começa em 24/12/2025
-    "rota": None,
-    "limiar_desequilibrio_porcento": 0.5,
-    "limiar_semana_porcento": 0.3,
-}
+# Os clientes ficam no armazém compartilhado pelo processo (ver obter_armazem)
 if "parametros" not in st.session_state:
     st.session_state.parametros = DEFAULTS.copy()
 else:
     for k, v in DEFAULTS.items():
         st.session_state.parametros.setdefault(k, v)
 
-# -------------------------------
-# Utilitários
-# -------------------------------
-def dedupe_clientes(clientes):
-    """Remove duplicações por id mantendo o primeiro registro."""
-    vistos = set()
-    unicos = []
-    for c in clientes:
-        cid = c.get("id")
-        if cid not in vistos:
-            unicos.append(c)
-            vistos.add(cid)
-    return unicos
-
-def primeira_semana_do_mes(date_obj):
-    """Retorna True se a semana (seg-sex ancorada em 'date_obj') cair nos 7 primeiros dias do mês."""
-    # Consideramos 'date_obj' como a segunda-feira de referência (Semana inicia em 'inicio' fornecido)
-    return date_obj.day <= 7
-
-# -------------------------------
-# Função de geração de agenda (com proteção contra duplicações)
-# -------------------------------
-def gerar_agenda(inicio, semanas, clientes, capacidade_por_dia, rota=None,
-                 limiar_dia_pct=0.5, limiar_semana_pct=0.3):
-    # Dedupe clientes por id antes de usar
-    base_total = dedupe_clientes(clientes)
-    base = [c for c in base_total if (rota is None or c.get("rota") == rota)]
-
-    agenda = {}
-    alertas = []
-    resumo = {"total_clientes": len(base), "semanas": semanas, "capacidade_por_dia": capacidade_por_dia}
-
-    # Validação de cadastro
-    for c in base:
-        if not c.get("dia_semana") or not c.get("frequencia"):
-            alertas.append(f"⚠️ Cadastro incompleto: {c.get('nome','(sem nome)')} (rota {c.get('rota','?')})")
-        if c.get("dia_semana") not in DIAS_SEMANA:
-            alertas.append(f"⚠️ Dia inválido para {c.get('nome')} (recebido: {c.get('dia_semana')})")
-
-    # Agenda por semanas
-    for sidx in range(semanas):
-        semana_inicio = inicio + timedelta(weeks=sidx)
-        semana_fim = semana_inicio + timedelta(days=4)  # segunda a sexta
-        semana_id = f"Semana {sidx+1} ({semana_inicio.strftime('%d/%m/%Y')} - {semana_fim.strftime('%d/%m/%Y')})"
-        agenda[semana_id] = {dia: [] for dia in DIAS_SEMANA}
-
-        # Controle de inclusão por cliente/dia para garantir não-duplicação
-        inclusos_id_por_dia = {dia: set() for dia in DIAS_SEMANA}
-
-        for c in base:
-            dia = c.get("dia_semana")
-            freq = c.get("frequencia")
-            cid = c.get("id")
-
-            if not dia or dia not in DIAS_SEMANA or not freq:
-                continue
-
-            incluir = False
-            if freq == 7:
-                incluir = True
-            elif freq == 14:
-                # Quinzenal: primeira semana, terceira, quinta... (sidx % 2 == 0)
-                incluir = (sidx % 2 == 0)
-            elif freq == 30:
-                # Mensal: somente se a semana cair nos primeiros 7 dias do mês
-                incluir = primeira_semana_do_mes(semana_inicio)
-            else:
-                alertas.append(f"⚠️ Frequência desconhecida ({freq}) para {c.get('nome','(sem nome)')}")
-
-            if incluir and cid not in inclusos_id_por_dia[dia]:
-                # Usar cópia para evitar efeitos colaterais em redistribuição
-                agenda[semana_id][dia].append({
-                    "id": c.get("id"),
-                    "nome": c.get("nome"),
-                    "rota": c.get("rota"),
-                    "dia_semana": c.get("dia_semana"),
-                    "frequencia": c.get("frequencia"),
-                })
-                inclusos_id_por_dia[dia].add(cid)
-
-        # Alertas de capacidade/desequilíbrio
-        cargas = {dia: len(lst) for dia, lst in agenda[semana_id].items()}
-        max_dia = max(cargas.values()) if cargas else 0
-        min_dia = min(cargas.values()) if cargas else 0
-
-        for dia, qtd in cargas.items():
-            if qtd > capacidade_por_dia:
-                alertas.append(
-                    f"🚨 Sobrecarga em {semana_id} {dia}: {qtd} clientes (capacidade {capacidade_por_dia})"
-                )
-            elif qtd > 0 and qtd < int(capacidade_por_dia * limiar_dia_pct):
-                alertas.append(
-                    f"⚠️ Desequilíbrio em {semana_id} {dia}: apenas {qtd} clientes (<{int(limiar_dia_pct*100)}% da capacidade)"
-                )
-
-        if max_dia - min_dia > int(capacidade_por_dia * limiar_semana_pct):
-            alertas.append(
-                f"⚠️ Desequilíbrio semanal em {semana_id}: max {max_dia} vs min {min_dia} (capacidade {capacidade_por_dia})"
-            )
-
-        # Verificação de duplicação por segurança
-        for dia, lst in agenda[semana_id].items():
-            ids = [c["id"] for c in lst]
-            dup = [i for i, ct in Counter(ids).items() if ct > 1]
-            if dup:
-                alertas.append(f"⚠️ Duplicação detectada em {semana_id} {dia}: IDs {dup}")
-
-    return agenda, alertas, resumo
-
-# -------------------------------
-# Redistribuição balanceada (sem duplicar clientes)
-# -------------------------------
-def redistribuir_balanceado(agenda, capacidade_por_dia, permitir_mover_semanal=False, preservar_dia_semana=False):
+# Modo servidor: com ROTEIRIZADOR_REGIOES (ex.: "norte,sul"), cada região (equipe) tem seu armazém e suas
+# entradas no cache compartilhado; a região vem de ?regiao= na URL ou do seletor no topo da página
+REGIOES = [r.strip() for r in os.environ.get("ROTEIRIZADOR_REGIOES", "").split(",") if r.strip()]
+
+@st.cache_resource
+def obter_cache():
+    """Cache de agendas único por processo (orçamento em ROTEIRIZADOR_CACHE_MB e ROTEIRIZADOR_CACHE_REGIAO_MB)."""
+    limite_regiao = os.environ.get("ROTEIRIZADOR_CACHE_REGIAO_MB")
+    return CacheCompartilhado(int(os.environ.get("ROTEIRIZADOR_CACHE_MB", "512")) * 2**20,
+                              int(limite_regiao) * 2**20 if limite_regiao else None)
+
+@st.cache_resource
+def obter_armazem(regiao=None):
+    """Handle único por processo (e por região), compartilhado por todas as sessões."""
+    armazem = criar_armazem(regiao=regiao)
+    # Cadastros e importações descartam do cache só as entradas das rotas alteradas
+    armazem.ouvintes.append(functools.partial(obter_cache().invalidar, regiao))
+    return armazem
+
+@st.cache_resource
+def obter_gerenciador():
+    """Pool de tarefas em segundo plano, único por processo: sessões com os mesmos parâmetros reaproveitam resultados."""
+    return GerenciadorTarefas()
+
+@st.cache_resource
+def iniciar_servidor_metricas(porta):
+    """Endpoint Prometheus (/metrics) único por processo, ligado por ROTEIRIZADOR_METRICAS_PORTA."""
+    INSTRUMENTACAO.ativa = True
+    return servir_metricas(porta)
+
+if os.environ.get("ROTEIRIZADOR_METRICAS_PORTA"):
+    iniciar_servidor_metricas(int(os.environ["ROTEIRIZADOR_METRICAS_PORTA"]))
+# Arquivo (JSON por linha) que recebe o traço de cada execução da página, se definido
+ARQUIVO_TRACOS = os.environ.get("ROTEIRIZADOR_TRACOS")
+
+# Tempo que a página espera uma tarefa antes de passar a acompanhá-la em segundo plano
+ESPERA_TAREFA_SEGUNDOS = 0.5
+
+@st.fragment(run_every=ESPERA_TAREFA_SEGUNDOS)
+def acompanhar_tarefa(chave, titulo, cancelavel=True, mostrar_parciais=None):
+    """Atualiza só este trecho com o progresso da tarefa; quando ela termina, a página inteira é refeita."""
+    tarefa = obter_gerenciador().obter(chave)
+    if tarefa is None or tarefa.terminada:
+        st.rerun()
+    st.progress(tarefa.progresso, text=f"{titulo} {tarefa.mensagem}")
+    if mostrar_parciais is not None:
+        mostrar_parciais(tarefa.parciais())
+    if cancelavel and st.button("Cancelar", key=f"btn_cancelar_{chave[0]}"):
+        tarefa.cancelar()
+
+TAMANHO_PAGINA_ALERTAS = 50
+
+@instrumentado("exibicao.alertas")
+def mostrar_alertas(tabela, chave):
+    """Exibe uma TabelaAlertas com filtros e paginação; só as linhas da página viram texto."""
+    if not len(tabela):
+        st.success("Sem alertas no cenário atual.")
+        return
+    contagem = tabela.contagem_por_severidade()
+    st.caption(f"🚨 {contagem.get('erro', 0)} sobrecargas · ⚠️ {contagem.get('aviso', 0)} avisos")
+    colf = st.columns(3)
+    with colf[0]:
+        sev = st.selectbox("Severidade", ["(todas)", "erro", "aviso"], key=f"{chave}_severidade")
+    with colf[1]:
+        semanas_tab = sorted(tabela.rotulos_semana)
+        sem = st.selectbox("Semana", [None] + semanas_tab, key=f"{chave}_semana",
+                           format_func=lambda s: "(todas)" if s is None else tabela.rotulos_semana[s])
+    linhas = tabela.filtrar(severidade=None if sev == "(todas)" else sev, semana=sem)
+    paginas = max(1, -(-len(linhas) // TAMANHO_PAGINA_ALERTAS))
+    with colf[2]:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, key=f"{chave}_pagina")
+    inicio_pag = (pagina - 1) * TAMANHO_PAGINA_ALERTAS
+    for i in linhas[inicio_pag:inicio_pag + TAMANHO_PAGINA_ALERTAS]:
+        if tabela.severidade(i) == "erro":
+            st.error(tabela.texto(i))
+        else:
+            st.warning(tabela.texto(i))
+    st.caption(f"{len(linhas)} alertas · página {pagina} de {paginas}")
+
+def seletor_pagina(total, chave, tamanho=TAMANHO_PAGINA_CLIENTES):
+    """Seletor de página (guardado na sessão); retorna a fatia (inicio, fim) que deve ser materializada."""
+    paginas = max(1, -(-total // tamanho))
+    chave_pagina = f"{chave}_pagina"
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = 1  # o filtro reduziu o número de páginas
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, key=chave_pagina)
+    st.caption(f"{total} linhas · página {pagina} de {paginas}")
+    inicio = (pagina - 1) * tamanho
+    return inicio, min(inicio + tamanho, total)
+
+@instrumentado("exibicao.agenda_compacta")
+def mostrar_agenda_compacta(linhas, rotulo, capacidade, chave):
     """
-    Balanceia cargas dentro da semana, movendo clientes de dias sobrecarregados
-    para dias com folga. Não cria duplicações (move o mesmo registro).
-    Prioridade: freq 30 -> 14 -> 7 (se permitir_mover_semanal=True)
+    Tabela semana x dia paginada. 'linhas' são tuplas (semana, índice do dia, clientes) e 'rotulo(semana)'
+    monta o texto da semana; filtros e ordenação trabalham nas tuplas e só a página vira DataFrame.
     """
-    realocados = []
-    for semana_id, dias in agenda.items():
-        cargas = {dia: len(lst) for dia, lst in dias.items()}
-        total_semana = sum(cargas.values())
-        if len(DIAS_SEMANA) == 0:
-            continue
-        media = total_semana // len(DIAS_SEMANA) if total_semana > 0 else 0
-        alvo_por_dia = min(capacidade_por_dia, max(media, 0))
-
-        def lista_moviveis(lst):
-            return sorted(lst, key=lambda c: {30: 0, 14: 1, 7: 2}.get(c.get("frequencia", 14)))
-
-        def pode_mover(cliente):
-            f = cliente.get("frequencia", 14)
-            return (f in (14, 30)) or (permitir_mover_semanal and f == 7)
-
-        for _ in range(1000):
-            dias_excesso = [d for d in DIAS_SEMANA if cargas[d] > alvo_por_dia]
-            dias_deficit = [d for d in DIAS_SEMANA if cargas[d] < alvo_por_dia]
-            if not dias_excesso or not dias_deficit:
-                break
-
-            movido_na_iteracao = False
-            for origem in dias_excesso:
-                candidatos = lista_moviveis(dias[origem])
-                for cliente in candidatos:
-                    if not pode_mover(cliente):
-                        continue
-                    destinos_ordenados = sorted(dias_deficit, key=lambda d: cargas[d])
-                    for destino in destinos_ordenados:
-                        if preservar_dia_semana and destino == cliente.get("dia_semana"):
-                            continue
-                        if cargas[destino] >= capacidade_por_dia:
-                            continue
-                        # mover (sem duplicar)
-                        dias[destino].append(cliente)
-                        dias[origem].remove(cliente)
-                        cargas[destino] += 1
-                        cargas[origem] -= 1
-                        realocados.append((cliente.get("nome"), semana_id, origem, destino))
-                        movido_na_iteracao = True
-                        break
-                    if movido_na_iteracao:
-                        break
-                if movido_na_iteracao:
-                    break
-            if not movido_na_iteracao:
-                break
-
-    return agenda, realocados
+    colf = st.columns(3)
+    with colf[0]:
+        dias_sel = st.multiselect("Dias", DIAS_SEMANA, key=f"{chave}_dias")
+    with colf[1]:
+        ordem = st.selectbox("Ordenar por", ["Semana", "Clientes (maior primeiro)"], key=f"{chave}_ordem")
+    with colf[2]:
+        acima = st.checkbox("Somente dias acima da capacidade", key=f"{chave}_acima")
+    if dias_sel:
+        idx_sel = {MAPA_DIA_IDX[dia] for dia in dias_sel}
+        linhas = [linha for linha in linhas if linha[1] in idx_sel]
+    if acima:
+        linhas = [linha for linha in linhas if linha[2] > capacidade]
+    if ordem != "Semana":
+        linhas = sorted(linhas, key=lambda linha: -linha[2])
+    inicio, fim = seletor_pagina(len(linhas), chave)
+    st.dataframe(pd.DataFrame(
+        [{"Semana": rotulo(sem), "Dia": DIAS_SEMANA[d], "Clientes": qtd} for sem, d, qtd in linhas[inicio:fim]],
+        columns=["Semana", "Dia", "Clientes"],
+    ), use_container_width=True)
+
+ORDENACAO_REALOCADOS = {"Ordem da redistribuição": None, "Cliente": 0, "Dia de origem": 2, "Dia de destino": 3}
+
+@instrumentado("exibicao.realocados")
+def mostrar_realocados(realocados, chave):
+    """Log de realocações (nome, semana, origem, destino) paginado, com busca, filtro por semana e ordenação."""
+    colf = st.columns(3)
+    with colf[0]:
+        busca = st.text_input("Buscar cliente", key=f"{chave}_busca")
+    with colf[1]:
+        semanas_log = list(dict.fromkeys(r[1] for r in realocados))
+        semana = st.selectbox("Semana", ["(todas)"] + semanas_log, key=f"{chave}_semana")
+    with colf[2]:
+        ordem = st.selectbox("Ordenar por", list(ORDENACAO_REALOCADOS), key=f"{chave}_ordem")
+    indices = range(len(realocados))
+    if busca:
+        trecho = busca.lower()
+        indices = [i for i in indices if trecho in str(realocados[i][0]).lower()]
+    if semana != "(todas)":
+        indices = [i for i in indices if realocados[i][1] == semana]
+    campo = ORDENACAO_REALOCADOS[ordem]
+    if campo == 0:
+        indices = sorted(indices, key=lambda i: str(realocados[i][0]).lower())
+    elif campo is not None:
+        indices = sorted(indices, key=lambda i: MAPA_DIA_IDX.get(realocados[i][campo], -1))
+    inicio, fim = seletor_pagina(len(indices), chave)
+    st.dataframe(pd.DataFrame([realocados[i] for i in indices[inicio:fim]],
+                              columns=["Cliente", "Semana", "Origem", "Destino"]), use_container_width=True)
 
 # -------------------------------
 # Interface de parâmetros
 # -------------------------------
-rotas = sorted(list({c["rota"] for c in st.session_state.clientes}))
+regiao = None
+if REGIOES:
+    regiao_url = st.query_params.get("regiao")
+    regiao = st.selectbox("Região", REGIOES, index=REGIOES.index(regiao_url) if regiao_url in REGIOES else 0,
+                          key="selectbox_regiao")
+    st.query_params["regiao"] = regiao
+armazem = obter_armazem(regiao)
+gerenciador = obter_gerenciador()
+rotas = armazem.rotas()
 colp = st.columns(6)
 with colp[0]:
     rota_sel = st.selectbox("Rota", options=["(todas)"] + rotas, index=0, key="selectbox_rota")
@@ -223,7 +201,7 @@ with colp[1]:
     capacidade = st.number_input("Capacidade por dia", min_value=10, max_value=200,
                                  value=st.session_state.parametros.get("capacidade_por_dia", 40), key="num_capacidade")
 with colp[2]:
-    semanas = st.slider("Semanas no calendário", 1, 12, value=st.session_state.parametros.get("semanas", 6), key="slider_semanas")
+    semanas = st.slider("Semanas no calendário", 1, 104, value=st.session_state.parametros.get("semanas", 6), key="slider_semanas")
 with colp[3]:
     inicio = st.date_input("Data inicial", value=st.session_state.parametros.get("inicio", datetime.date.today()), key="date_inicio")
 with colp[4]:
@@ -247,47 +225,35 @@ st.session_state.parametros.update({
 # -------------------------------
 # Importação via Excel
 # -------------------------------
-st.subheader("📥 Importação de clientes via Excel (.xlsx)")
-arquivo = st.file_uploader("Selecione o arquivo com colunas: nome, rota, dia_semana, frequencia", type=["xlsx"], key="uploader_excel")
-
-if arquivo:
-    try:
-        # Força o engine para evitar erro de dependência
-        df = pd.read_excel(arquivo, engine="openpyxl")
-        df.columns = df.columns.str.lower()
-        colunas_ok = {"nome", "rota", "dia_semana", "frequencia"}.issubset(set(df.columns))
-        if not colunas_ok:
-            st.error("O arquivo deve conter as colunas: nome, rota, dia_semana, frequencia.")
-        else:
-            inseridos = 0
-            # Dedupe por nome+rota+dia+frequencia para evitar duplicações na importação
-            existentes_chaves = {
-                (c["nome"], c["rota"], c["dia_semana"], c["frequencia"]) for c in st.session_state.clientes
-            }
-            prox_id = (max([c["id"] for c in st.session_state.clientes], default=0) + 1)
-            for _, row in df.iterrows():
-                if not (pd.notna(row["nome"]) and pd.notna(row["rota"]) and pd.notna(row["dia_semana"]) and pd.notna(row["frequencia"])):
-                    continue
-                novo_chave = (str(row["nome"]).strip(), str(row["rota"]).strip(), str(row["dia_semana"]).strip(), int(row["frequencia"]))
-                if novo_chave in existentes_chaves:
-                    # já existe registro igual; ignora
-                    continue
-                novo = {
-                    "id": prox_id,
-                    "nome": novo_chave[0],
-                    "rota": novo_chave[1],
-                    "dia_semana": novo_chave[2],
-                    "frequencia": novo_chave[3],
-                }
-                st.session_state.clientes.append(novo)
-                existentes_chaves.add(novo_chave)
-                prox_id += 1
-                inseridos += 1
-            st.success(f"{inseridos} clientes importados com sucesso!")
-    except ImportError:
-        st.error("Dependência 'openpyxl' não encontrada. Instale com: pip install openpyxl")
-    except Exception as e:
-        st.error(f"Falha ao ler o Excel: {e}")
+st.subheader("📥 Importação de clientes via Excel (.xlsx), CSV ou Parquet")
+arquivo = st.file_uploader("Selecione o arquivo com colunas: nome, rota, dia_semana, frequencia (opcionais: lat, lon, deslocamento)",
+                           type=["xlsx", "csv", "parquet"], key="uploader_excel")
+
+# O arquivo continua no uploader entre reruns: importa uma única vez por upload, em segundo plano
+if arquivo and st.session_state.get("ultimo_upload_importado") != arquivo.file_id:
+    st.session_state.tarefa_importacao = ("importacao", regiao, arquivo.file_id)
+    gerenciador.submeter(st.session_state.tarefa_importacao, tarefa_importar,
+                         io.BytesIO(arquivo.getvalue()), arquivo.name, armazem, max(arquivo.size, 1))
+    st.session_state.ultimo_upload_importado = arquivo.file_id
+
+tarefa_importacao = gerenciador.obter(st.session_state.get("tarefa_importacao"))
+if tarefa_importacao is not None and not tarefa_importacao.aguardar(ESPERA_TAREFA_SEGUNDOS):
+    acompanhar_tarefa(tarefa_importacao.chave, "Importando clientes...")
+elif tarefa_importacao is not None:
+    # O resultado da importação é mostrado uma única vez
+    st.session_state.tarefa_importacao = None
+    e = tarefa_importacao.erro
+    if tarefa_importacao.estado == "concluida":
+        st.success(f"{tarefa_importacao.resultado['inseridos']} clientes importados com sucesso!")
+    elif tarefa_importacao.estado == "cancelada":
+        st.warning("Importação cancelada; os clientes dos blocos já lidos foram mantidos.")
+    elif isinstance(e, ValueError):
+        st.error(str(e))
+    elif isinstance(e, ImportError):
+        modulo = e.name or "openpyxl"
+        st.error(f"Dependência '{modulo}' não encontrada. Instale com: pip install {modulo}")
+    else:
+        st.error(f"Falha ao ler o arquivo: {e}")
 
 # -------------------------------
 # Cadastro de clientes manual
@@ -296,76 +262,121 @@ st.subheader("📝 Cadastro de clientes")
 with st.form("cadastro_cliente", clear_on_submit=True):
     nome = st.text_input("Nome do cliente", "", key="txt_nome_cliente")
     rota = st.text_input("Rota", "BR001", key="txt_rota_cliente")
-    dia = st.selectbox("Dia da semana", DIAS_SEMANA, index=0, key="selectbox_dia_cliente")
-    freq_map = {"Semanal (007)": 7, "Quinzenal (014)": 14, "Mensal (030)": 30}
+    dias_cliente = st.multiselect("Dias da semana", DIAS_SEMANA, default=DIAS_SEMANA[:1], key="multiselect_dias_cliente")
+    freq_map = {"Semanal (007)": 7, "Quinzenal (014)": 14, "A cada 3 semanas (021)": 21,
+                "A cada 4 semanas (028)": 28, "Mensal (030)": 30, "Bimestral (060)": 60}
     freq_label = st.selectbox("Frequência", list(freq_map.keys()), index=0, key="selectbox_freq_cliente")
+    deslocamento = st.number_input("Deslocamento da cadência (semanas; meses nas frequências mensais)",
+                                   min_value=0, max_value=11, value=0, step=1, key="num_deslocamento_cliente")
+    colg = st.columns(2)
+    with colg[0]:
+        lat = st.number_input("Latitude (opcional)", min_value=-90.0, max_value=90.0, value=None,
+                              format="%.6f", key="num_lat_cliente")
+    with colg[1]:
+        lon = st.number_input("Longitude (opcional)", min_value=-180.0, max_value=180.0, value=None,
+                              format="%.6f", key="num_lon_cliente")
     submitted = st.form_submit_button("Adicionar cliente")
 
     if submitted:
         if not nome.strip():
             st.error("Informe o nome do cliente.")
+        elif not dias_cliente:
+            st.error("Escolha ao menos um dia da semana.")
         else:
             novo = {
-                "id": (max([c["id"] for c in st.session_state.clientes], default=0) + 1),
+                "id": armazem.proximo_id(),
                 "nome": nome.strip(),
                 "rota": rota.strip(),
-                "dia_semana": dia,
+                "dia_semana": formatar_dias(MAPA_DIA_IDX[d] for d in dias_cliente),
                 "frequencia": freq_map[freq_label],
             }
-            st.session_state.clientes.append(novo)
+            if lat is not None and lon is not None:
+                novo["lat"], novo["lon"] = lat, lon
+            if deslocamento:
+                novo["deslocamento"] = int(deslocamento)
+            armazem.adicionar([novo])
             st.success(f"Cliente '{novo['nome']}' cadastrado com sucesso.")
 
-st.dataframe(st.session_state.clientes, use_container_width=True)
+# Tabela de clientes: filtro, ordenação e paginação feitos no armazém; só a página é carregada
+colc = st.columns(5)
+with colc[0]:
+    busca_nome = st.text_input("Buscar nome", key="txt_busca_clientes")
+with colc[1]:
+    rota_tabela = st.selectbox("Rota", ["(todas)"] + rotas, key="selectbox_rota_clientes")
+with colc[2]:
+    dia_tabela = st.selectbox("Dia", ["(todos)"] + DIAS_SEMANA, key="selectbox_dia_clientes")
+with colc[3]:
+    ordenar_clientes = st.selectbox("Ordenar por", ["(cadastro)"] + list(CAMPOS_CLIENTE), key="selectbox_ordem_clientes")
+with colc[4]:
+    decrescente_clientes = st.checkbox("Decrescente", key="checkbox_ordem_clientes")
+filtros_clientes = {}
+if busca_nome.strip():
+    filtros_clientes["nome"] = busca_nome.strip()
+if rota_tabela != "(todas)":
+    filtros_clientes["rota"] = rota_tabela
+if dia_tabela != "(todos)":
+    filtros_clientes["dia_semana"] = dia_tabela
+inicio_pag, fim_pag = seletor_pagina(armazem.contar(filtros_clientes), "tabela_clientes")
+st.dataframe(pd.DataFrame(
+    armazem.pagina(filtros_clientes, None if ordenar_clientes == "(cadastro)" else ordenar_clientes,
+                   decrescente_clientes, inicio_pag, fim_pag - inicio_pag),
+    columns=list(CAMPOS_CLIENTE + CAMPOS_COORDENADAS + CAMPOS_PADRAO),
+), use_container_width=True)
 
 # -------------------------------
 # Geração da agenda (inicial)
 # -------------------------------
-agenda, alertas, resumo = gerar_agenda(
-    inicio=st.session_state.parametros["inicio"],
-    semanas=st.session_state.parametros["semanas"],
-    clientes=st.session_state.clientes,
-    capacidade_por_dia=st.session_state.parametros["capacidade_por_dia"],
-    rota=st.session_state.parametros["rota"],
-    limiar_dia_pct=st.session_state.parametros.get("limiar_desequilibrio_porcento", 0.5),
-    limiar_semana_pct=st.session_state.parametros.get("limiar_semana_porcento", 0.3),
+parametros_agenda = {
+    "inicio": st.session_state.parametros["inicio"],
+    "semanas": st.session_state.parametros["semanas"],
+    "capacidade_por_dia": st.session_state.parametros["capacidade_por_dia"],
+    "rota": st.session_state.parametros["rota"],
+    "limiar_dia_pct": st.session_state.parametros.get("limiar_desequilibrio_porcento", 0.5),
+    "limiar_semana_pct": st.session_state.parametros.get("limiar_semana_porcento", 0.3),
+}
+# As tarefas e o cache são do processo: sessões da mesma região com os mesmos parâmetros calculam uma vez só.
+# A chave inclui a região e a versão da rota: só cadastros/importações na rota (ou região) geram uma nova tarefa
+versao_clientes = (regiao, armazem.versao_rota(st.session_state.parametros["rota"]))
+chave_agenda = ("agenda", versao_clientes, tuple(sorted(parametros_agenda.items())))
+tarefa_agenda = gerenciador.submeter(
+    chave_agenda, tarefa_gerar_agenda,
+    clientes=armazem.listar(st.session_state.parametros["rota"]),
+    cache=obter_cache().escopo(regiao), **parametros_agenda,
 )
+if not tarefa_agenda.aguardar(ESPERA_TAREFA_SEGUNDOS):
+    acompanhar_tarefa(chave_agenda, "Gerando agenda...", cancelavel=False)
+    st.stop()
+if tarefa_agenda.estado != "concluida":
+    st.error(f"Falha ao gerar a agenda: {tarefa_agenda.erro}")
+    st.stop()
+agenda, alertas, resumo = tarefa_agenda.resultado
 
 # -------------------------------
 # Visualização didática por semana
 # -------------------------------
 st.subheader("📊 Visão didática por semana")
 
-semanas_disponiveis = list(agenda.keys())
+compacta = resumo["agenda_compacta"]
+semanas_disponiveis = range(len(compacta))
 if semanas_disponiveis:
     semana_escolhida = st.selectbox(
         "Selecione a semana para visualizar",
         semanas_disponiveis,
+        format_func=compacta.rotulo,
         key="selectbox_semana_didatica"
     )
 
-    if semana_escolhida:
+    if semana_escolhida is not None:
         dados = []
-        # Datas reais (extraídas do ID da semana)
-        periodo = semana_escolhida.split("(")[1].split(")")[0]
-        semana_inicio_str, _semana_fim_str = periodo.split(" - ")
-        semana_inicio = datetime.datetime.strptime(semana_inicio_str.strip(), "%d/%m/%Y").date()
-
-        dias = agenda[semana_escolhida]
         for i, dia in enumerate(DIAS_SEMANA):
-            clientes_dia = dias[dia]
-            total = len(clientes_dia)
-            freq7 = sum(1 for c in clientes_dia if c.get("frequencia") == 7)
-            freq14 = sum(1 for c in clientes_dia if c.get("frequencia") == 14)
-            freq30 = sum(1 for c in clientes_dia if c.get("frequencia") == 30)
-            data_real = semana_inicio + timedelta(days=i)
-            dados.append({
+            linha = {
                 "Dia": dia,
-                "Data": data_real.strftime("%d/%m/%Y"),
-                "Clientes": total,
-                "Frequência 7": freq7,
-                "Frequência 14": freq14,
-                "Frequência 30": freq30,
-            })
+                "Data": compacta.data(semana_escolhida, i).strftime("%d/%m/%Y"),
+                "Clientes": compacta.carga(semana_escolhida, i),
+            }
+            for freq in REGRAS_FREQUENCIA:
+                linha[f"Frequência {freq}"] = compacta.contagem_frequencia(semana_escolhida, i, freq)
+            dados.append(linha)
 
         df_didatico = pd.DataFrame(dados)
         st.dataframe(df_didatico, use_container_width=True)
@@ -376,12 +387,10 @@ else:
 # Agenda compacta (antes da redistribuição)
 # -------------------------------
 st.subheader("📅 Agenda semanal (antes da redistribuição) — visão compacta")
-linhas = []
-for semana_id, dias in agenda.items():
-    for dia in DIAS_SEMANA:
-        linhas.append({"Semana": semana_id, "Dia": dia, "Clientes": len(dias[dia])})
-df_agenda = pd.DataFrame(linhas)
-st.dataframe(df_agenda, use_container_width=True)
+mostrar_agenda_compacta(
+    [(sidx, d, compacta.carga(sidx, d)) for sidx in semanas_disponiveis for d in range(len(DIAS_SEMANA))],
+    compacta.rotulo, st.session_state.parametros["capacidade_por_dia"], "agenda_original",
+)
 
 # -------------------------------
 # Redistribuição automática balanceada (com escolha de período)
@@ -392,22 +401,30 @@ st.subheader("🔄 Redistribuição automática balanceada")
 capacidade_por_dia = st.session_state.parametros.get("capacidade_por_dia", 40)
 
 # Escolha do modo de redistribuição
-semanas_disponiveis = list(agenda.keys())
 modo = st.radio(
     "Modo de redistribuição",
-    ["Por semana", "Por intervalo de datas"],
+    ["Por semana", "Por intervalo de datas", "Global (todas as semanas)"],
     key="radio_modo_redistribuicao"
 )
 
 semana_para_redistribuir = None
 periodo = None
+tempo_limite = None
 
 if modo == "Por semana":
     semana_para_redistribuir = st.selectbox(
         "Escolha a semana para redistribuir",
         semanas_disponiveis,
+        format_func=compacta.rotulo,
         key="selectbox_semana_redistribuicao"
     )
+elif modo == "Global (todas as semanas)":
+    st.caption("Escolhe um dia fixo por cliente olhando o horizonte inteiro, respeitando a cadência de cada frequência.")
+    tempo_limite = st.number_input(
+        "Tempo máximo de otimização (segundos)",
+        min_value=0.5, max_value=120.0, value=5.0, step=0.5,
+        key="number_tempo_limite_global"
+    )
 else:
     # Sugerir um intervalo padrão de segunda a sexta da primeira semana
     periodo_default = (
@@ -442,107 +459,379 @@ st.markdown(f"""
 
 executar = st.button("Executar redistribuição", key="btn_executar_redistribuicao")
 
-agenda_ajustada = None
-realocados = []
+# O resultado fica na sessão para sobreviver a reruns (ex.: paginação), enquanto as entradas não mudarem
+assinatura_redistribuicao = (
+    tuple(sorted(st.session_state.parametros.items(), key=lambda kv: kv[0])), versao_clientes,
+    modo, semana_para_redistribuir, periodo if isinstance(periodo, tuple) else None,
+    permitir_mover_semanal, preservar_dia, tempo_limite,
+)
+chave_redistribuicao = ("redistribuicao", assinatura_redistribuicao)
 
-if executar:
+if executar and modo == "Global (todas as semanas)":
+    gerenciador.submeter(
+        chave_redistribuicao, tarefa_redistribuir_global,
+        st.session_state.parametros["inicio"],
+        st.session_state.parametros["semanas"],
+        armazem.listar(st.session_state.parametros["rota"]),
+        capacidade_por_dia,
+        permitir_mover_semanal=permitir_mover_semanal,
+        preservar_dia_semana=preservar_dia,
+        tempo_limite=tempo_limite,
+    )
+    st.session_state.tarefa_redistribuicao = chave_redistribuicao
+elif executar:
     # Filtrar agenda conforme escolha
-    if modo == "Por semana" and semana_para_redistribuir:
-        agenda_filtrada = {semana_para_redistribuir: agenda[semana_para_redistribuir]}
+    if modo == "Por semana" and semana_para_redistribuir is not None:
+        semanas_sel = [semana_para_redistribuir]
     elif modo == "Por intervalo de datas":
         # Garantir que o retorno seja um intervalo válido (tuple de 2 datas)
         if isinstance(periodo, tuple) and len(periodo) == 2:
-            inicio_sel, fim_sel = periodo
             # Seleciona semanas cujo início esteja dentro do intervalo
-            def inicio_semana(sem_id):
-                inicio_str = sem_id.split("(")[1].split(" - ")[0].strip()
-                return datetime.datetime.strptime(inicio_str, "%d/%m/%Y").date()
-            agenda_filtrada = {
-                sem: dias for sem, dias in agenda.items()
-                if inicio_sel <= inicio_semana(sem) <= fim_sel
-            }
+            semanas_sel = compacta.semanas_entre(*periodo)
         else:
-            agenda_filtrada = {}
+            semanas_sel = []
             st.warning("Selecione um intervalo de datas válido (início e fim).")
     else:
-        agenda_filtrada = {}
+        semanas_sel = []
+    agenda_filtrada = {compacta.rotulo(i): agenda[compacta.rotulo(i)] for i in semanas_sel}
 
     if agenda_filtrada:
-        # Cópia superficial para trabalhar sem afetar a agenda original
-        agenda_ajustada = {sem: {dia: list(lst) for dia, lst in dias.items()} for sem, dias in agenda_filtrada.items()}
-        agenda_ajustada, realocados = redistribuir_balanceado(
-            agenda_ajustada,
+        # A tarefa trabalha sobre cópias das listas (e um recorte do painel), sem afetar a agenda original
+        gerenciador.submeter(
+            chave_redistribuicao, tarefa_redistribuir,
+            agenda_filtrada,
             capacidade_por_dia,
             permitir_mover_semanal=permitir_mover_semanal,
-            preservar_dia_semana=preservar_dia
+            preservar_dia_semana=preservar_dia,
+            painel=resumo.get("painel"),
         )
+        st.session_state.tarefa_redistribuicao = chave_redistribuicao
+
+def mostrar_semanas_redistribuidas(parciais):
+    """Semanas já redistribuídas enquanto a tarefa continua nas demais."""
+    if parciais:
+        st.dataframe(pd.DataFrame([
+            {"Semana": semana_id, "Realocados": len(realocados_semana),
+             **{dia: len(lst) for dia, lst in dias.items()}}
+            for semana_id, dias, realocados_semana in parciais
+        ]), use_container_width=True)
+
+# A tarefa só vale para a assinatura atual; o resultado concluído fica na sessão para sobreviver a reruns
+if st.session_state.get("tarefa_redistribuicao") == chave_redistribuicao:
+    tarefa_redistribuicao = gerenciador.obter(chave_redistribuicao)
+    if tarefa_redistribuicao is not None and not tarefa_redistribuicao.aguardar(ESPERA_TAREFA_SEGUNDOS):
+        acompanhar_tarefa(chave_redistribuicao, "Redistribuindo...", mostrar_parciais=mostrar_semanas_redistribuidas)
+    elif tarefa_redistribuicao is not None:
+        st.session_state.tarefa_redistribuicao = None
+        if tarefa_redistribuicao.estado == "concluida":
+            st.session_state.redistribuicao = (assinatura_redistribuicao,) + tuple(tarefa_redistribuicao.resultado)
+        elif tarefa_redistribuicao.estado == "cancelada":
+            st.warning("Redistribuição cancelada.")
+        else:
+            st.error(f"Falha na redistribuição: {tarefa_redistribuicao.erro}")
 
-        st.success(f"Redistribuição concluída: {len(realocados)} clientes realocados.")
-        if realocados:
-            with st.expander("Ver detalhes das realocações"):
-                for nome, semana, origem, destino in realocados:
-                    st.write(f"✅ {nome} movido em {semana}: {origem} → {destino}")
-
-        # Checagem de duplicações pós-redistribuição
-        from collections import Counter
-        for semana_id, dias in agenda_ajustada.items():
-            for dia, clientes in dias.items():
-                ids = [c["id"] for c in clientes]
-                duplicados = [i for i, ct in Counter(ids).items() if ct > 1]
-                if duplicados:
-                    st.error(f"⚠️ Duplicação detectada em {semana_id} {dia}: IDs {duplicados}")
+agenda_ajustada = None
+alertas_ajustada = None
+realocados = []
+relatorio_global = None
+painel_ajustado = None
+salvo = st.session_state.get("redistribuicao")
+if salvo and salvo[0] == assinatura_redistribuicao:
+    _, agenda_ajustada, realocados, relatorio_global, painel_ajustado = salvo
+
+if agenda_ajustada is not None:
+    st.success(f"Redistribuição concluída: {len(realocados)} clientes realocados.")
+    if relatorio_global:
+        # Comparação com a redistribuição gulosa (semana a semana) sobre as mesmas semanas
+        st.dataframe(pd.DataFrame([
+            {"Agenda": nome, "Sobrecarga (visitas)": m["sobrecarga"], "Desvio (soma dos quadrados)": m["desvio"],
+             "Movimentos": m.get("movimentos", 0)}
+            for nome, m in (("Original", relatorio_global["original"]), ("Gulosa", relatorio_global["guloso"]),
+                            ("Global", relatorio_global["global"]))
+        ]), use_container_width=True)
+        st.caption(
+            f"Melhoria do objetivo em relação à gulosa: {relatorio_global['melhoria_vs_guloso']:.1%} "
+            f"({relatorio_global['iteracoes']} iterações, {relatorio_global['semanas_gulosas']} semana(s) da gulosa"
+            f"{', interrompida pelo limite de tempo' if relatorio_global['interrompido_por_tempo'] else ''})."
+        )
+    if realocados:
+        with st.expander("Ver detalhes das realocações"):
+            mostrar_realocados(realocados, "realocados")
 
 # -------------------------------
 # Agenda compacta após redistribuição (se executada)
 # -------------------------------
 if agenda_ajustada:
     st.subheader("📅 Agenda semanal (após redistribuição) — visão compacta")
-    linhas2 = []
-    for semana_id, dias in agenda_ajustada.items():
-        for dia in DIAS_SEMANA:
-            linhas2.append({"Semana": semana_id, "Dia": dia, "Clientes": len(dias[dia])})
-    df_agenda2 = pd.DataFrame(linhas2)
-    st.dataframe(df_agenda2, use_container_width=True)
-
-    # Reavaliação rápida de alertas
+    mostrar_agenda_compacta(
+        [(semana_id, d, len(dias[dia])) for semana_id, dias in agenda_ajustada.items() for d, dia in enumerate(DIAS_SEMANA)],
+        str, capacidade_por_dia, "agenda_ajustada",
+    )
+
+    # Alertas (capacidade, desequilíbrio e duplicação) da agenda ajustada, a partir do painel atualizado
+    # a cada movimento; a redistribuição global não tem painel e os recalcula das listas
     st.subheader("🚨 Alertas (agenda ajustada)")
-    limiar_dia = st.session_state.parametros.get("limiar_desequilibrio_porcento", 0.5)
-    for semana_id, dias in agenda_ajustada.items():
-        cargas = {dia: len(lst) for dia, lst in dias.items()}
-        for dia, qtd in cargas.items():
-            if qtd > capacidade_por_dia:
-                st.error(f"🚨 Sobrecarga em {semana_id} {dia}: {qtd} clientes (capacidade {capacidade_por_dia})")
-            elif qtd > 0 and qtd < int(capacidade_por_dia * limiar_dia):
-                st.warning(f"⚠️ Desequilíbrio em {semana_id} {dia}: apenas {qtd} clientes")
-
-
-    # Reavaliação rápida de alertas com base na agenda ajustada
-    st.subheader("🚨 Alertas (reavaliação rápida da agenda ajustada)")
-    limiar_dia = st.session_state.parametros.get("limiar_desequilibrio_porcento", 0.5)
-    for semana_id, dias in agenda_ajustada.items():
-        cargas = {dia: len(lst) for dia, lst in dias.items()}
-        for dia, qtd in cargas.items():
-            if qtd > capacidade_por_dia:
-                st.error(f"🚨 Sobrecarga em {semana_id} {dia}: {qtd} clientes (capacidade {capacidade_por_dia})")
-            elif qtd > 0 and qtd < int(capacidade_por_dia * limiar_dia):
-                st.warning(f"⚠️ Desequilíbrio em {semana_id} {dia}: apenas {qtd} clientes")
+    alertas_ajustada = alertas_agenda(
+        agenda_ajustada, [], capacidade_por_dia,
+        st.session_state.parametros.get("limiar_desequilibrio_porcento", 0.5),
+        st.session_state.parametros.get("limiar_semana_porcento", 0.3),
+        rota=st.session_state.parametros["rota"],
+        indice_semana={compacta.rotulo(i): i for i in semanas_disponiveis},
+        painel=painel_ajustado,
+    )
+    mostrar_alertas(alertas_ajustada, "alertas_ajustada")
+
+# -------------------------------
+# Sequenciamento das visitas (ordem e distância de cada dia)
+# -------------------------------
+st.subheader("🗺️ Sequenciamento das visitas")
+agenda_base = agenda_ajustada if agenda_ajustada else agenda
+st.caption("Ordena as visitas de cada dia pela distância (clientes com latitude/longitude), "
+           + ("sobre a agenda ajustada." if agenda_ajustada else "sobre a agenda original."))
+cols = st.columns(4)
+with cols[0]:
+    usar_origem = st.checkbox("Sair e voltar de uma base", key="checkbox_origem")
+    origem = None
+    if usar_origem:
+        origem = (st.number_input("Latitude da base", -90.0, 90.0, 0.0, format="%.6f", key="num_lat_origem"),
+                  st.number_input("Longitude da base", -180.0, 180.0, 0.0, format="%.6f", key="num_lon_origem"))
+with cols[1]:
+    velocidade_kmh = st.number_input("Velocidade média (km/h)", 5.0, 120.0, 30.0, key="num_velocidade")
+with cols[2]:
+    minutos_por_visita = st.number_input("Minutos por visita", 0, 240, 15, key="num_minutos_visita")
+with cols[3]:
+    jornada_minutos = st.number_input("Jornada máxima (min, 0 = sem limite)", 0, 1440, 0, key="num_jornada")
+
+opcoes_sequenciamento = {
+    "origem": origem, "velocidade_kmh": velocidade_kmh, "minutos_por_visita": minutos_por_visita,
+    "jornada_minutos": jornada_minutos or None, "rota": st.session_state.parametros["rota"],
+    "indice_semana": {compacta.rotulo(i): i for i in semanas_disponiveis},
+}
+# A agenda sequenciada depende da agenda usada (original ou ajustada) e das opções
+chave_sequenciamento = ("sequenciamento", chave_agenda, assinatura_redistribuicao if agenda_ajustada else None,
+                        origem, velocidade_kmh, minutos_por_visita, jornada_minutos)
+if st.button("Sequenciar visitas", key="btn_sequenciar"):
+    gerenciador.submeter(chave_sequenciamento, tarefa_sequenciar, agenda_base, **opcoes_sequenciamento)
+    st.session_state.tarefa_sequenciamento = chave_sequenciamento
+
+if st.session_state.get("tarefa_sequenciamento") == chave_sequenciamento:
+    tarefa_sequenciamento = gerenciador.obter(chave_sequenciamento)
+    if tarefa_sequenciamento is not None and not tarefa_sequenciamento.aguardar(ESPERA_TAREFA_SEGUNDOS):
+        acompanhar_tarefa(chave_sequenciamento, "Sequenciando...")
+    elif tarefa_sequenciamento is not None:
+        st.session_state.tarefa_sequenciamento = None
+        if tarefa_sequenciamento.estado == "concluida":
+            st.session_state.sequenciamento = (chave_sequenciamento,) + tuple(tarefa_sequenciamento.resultado)
+        elif tarefa_sequenciamento.estado == "cancelada":
+            st.warning("Sequenciamento cancelado.")
+        else:
+            st.error(f"Falha no sequenciamento: {tarefa_sequenciamento.erro}")
+
+agenda_sequenciada = None
+salvo_seq = st.session_state.get("sequenciamento")
+if salvo_seq and salvo_seq[0] == chave_sequenciamento:
+    _, agenda_sequenciada, percursos, alertas_jornada = salvo_seq
+    cols = st.columns(2)
+    with cols[0]:
+        semana_seq = st.selectbox("Semana", list(agenda_sequenciada), key="selectbox_semana_sequencia")
+    with cols[1]:
+        dia_seq = st.selectbox("Dia", DIAS_SEMANA, key="selectbox_dia_sequencia")
+    st.dataframe(pd.DataFrame([
+        {"Dia": dia, "Visitas": len(agenda_sequenciada[semana_seq][dia]), "Km": p["km"], "Minutos": p["minutos"],
+         "Sem coordenadas": p["sem_coordenadas"]}
+        for dia, p in percursos[semana_seq].items()
+    ]), use_container_width=True)
+    visitas_dia = agenda_sequenciada[semana_seq][dia_seq]
+    inicio_pag, fim_pag = seletor_pagina(len(visitas_dia), "sequencia_dia")
+    st.dataframe(pd.DataFrame(
+        [{"Ordem": i + 1, "Cliente": c.get("nome"), "Lat": c.get("lat"), "Lon": c.get("lon")}
+         for i, c in enumerate(visitas_dia[inicio_pag:fim_pag], start=inicio_pag)],
+        columns=["Ordem", "Cliente", "Lat", "Lon"],
+    ), use_container_width=True)
+    pontos = [{"lat": c["lat"], "lon": c["lon"]} for c in visitas_dia if tem_coordenadas(c)]
+    if pontos:
+        st.map(pd.DataFrame(pontos))
+    if jornada_minutos:
+        st.subheader("🚨 Alertas de jornada")
+        mostrar_alertas(alertas_jornada, "alertas_jornada")
 
 # -------------------------------
 # Alertas (agenda original)
 # -------------------------------
 st.subheader("🚨 Alertas (agenda original)")
-if alertas:
-    for a in alertas:
-        if a.startswith("🚨"):
-            st.error(a)
-        else:
-            st.warning(a)
-else:
-    st.success("Sem alertas no cenário atual.")
+mostrar_alertas(alertas, "alertas_original")
+
+# -------------------------------
+# Cenários (what-if): vários parâmetros contra a mesma agenda base
+# -------------------------------
+st.subheader("🧪 Comparação de cenários")
+st.caption("Cada linha é um cenário avaliado sobre a mesma base de clientes; as semanas e os dias que não mudam "
+           "são compartilhados entre os cenários.")
+parametros_atuais = st.session_state.parametros
+cenarios_editados = st.data_editor(
+    pd.DataFrame([
+        {"Cenário": "Atual", "Capacidade": capacidade_por_dia, "Início": parametros_atuais["inicio"],
+         "Semanas": parametros_atuais["semanas"], "Redistribuição": "semanal",
+         "Mover semanais": False, "Preservar dia": False},
+        {"Cenário": "Capacidade +25%", "Capacidade": int(capacidade_por_dia * 1.25), "Início": parametros_atuais["inicio"],
+         "Semanas": parametros_atuais["semanas"], "Redistribuição": "semanal",
+         "Mover semanais": False, "Preservar dia": False},
+        {"Cenário": "Sem redistribuição", "Capacidade": capacidade_por_dia, "Início": parametros_atuais["inicio"],
+         "Semanas": parametros_atuais["semanas"], "Redistribuição": "nenhuma",
+         "Mover semanais": False, "Preservar dia": False},
+    ]),
+    num_rows="dynamic", use_container_width=True, key="editor_cenarios",
+    column_config={
+        "Capacidade": st.column_config.NumberColumn(min_value=1, step=1),
+        "Início": st.column_config.DateColumn(format="DD/MM/YYYY"),
+        "Semanas": st.column_config.NumberColumn(min_value=1, max_value=104, step=1),
+        "Redistribuição": st.column_config.SelectboxColumn(options=list(MODOS_CENARIO)),
+    },
+)
+cenarios = [
+    {"nome": str(linha["Cenário"] or f"Cenário {i + 1}"), "capacidade_por_dia": int(linha["Capacidade"]),
+     "inicio": pd.Timestamp(linha["Início"]).date(), "semanas": int(linha["Semanas"]),
+     "redistribuir": linha["Redistribuição"] or "nenhuma", "permitir_mover_semanal": bool(linha["Mover semanais"]),
+     "preservar_dia_semana": bool(linha["Preservar dia"])}
+    for i, linha in enumerate(cenarios_editados.to_dict("records"))
+    if not (pd.isna(linha["Capacidade"]) or pd.isna(linha["Início"]) or pd.isna(linha["Semanas"]))
+]
+chave_cenarios = ("cenarios", versao_clientes, parametros_atuais["rota"],
+                  tuple(tuple(sorted(c.items())) for c in cenarios))
+if st.button("Comparar cenários", key="btn_cenarios", disabled=not cenarios):
+    gerenciador.submeter(
+        chave_cenarios, tarefa_cenarios, armazem.listar(parametros_atuais["rota"]), cenarios,
+        parametros_atuais["inicio"], parametros_atuais["semanas"], capacidade_por_dia, rota=parametros_atuais["rota"],
+    )
+    st.session_state.tarefa_cenarios = chave_cenarios
+
+if st.session_state.get("tarefa_cenarios") == chave_cenarios:
+    tarefa_cenarios_atual = gerenciador.obter(chave_cenarios)
+    if tarefa_cenarios_atual is not None and not tarefa_cenarios_atual.aguardar(ESPERA_TAREFA_SEGUNDOS):
+        acompanhar_tarefa(chave_cenarios, "Avaliando cenários...")
+    elif tarefa_cenarios_atual is not None and tarefa_cenarios_atual.estado == "concluida":
+        st.dataframe(pd.DataFrame([
+            {"Cenário": r["nome"], "Sobrecarga (visitas)": r["metricas"]["sobrecarga"],
+             "Dias acima da capacidade": r["metricas"]["dias_acima"],
+             "Desvio (soma dos quadrados)": r["metricas"]["desvio"], "Movimentos": r["metricas"]["movimentos"],
+             "Dias alterados": r["metricas"]["dias_alterados"]}
+            for r in tarefa_cenarios_atual.resultado
+        ]), use_container_width=True)
+        st.caption("Dias alterados: dias cuja lista difere da agenda base (só eles ocupam memória própria).")
+    elif tarefa_cenarios_atual is not None and tarefa_cenarios_atual.estado == "cancelada":
+        st.warning("Comparação de cenários cancelada.")
+    elif tarefa_cenarios_atual is not None:
+        st.error(f"Falha na comparação de cenários: {tarefa_cenarios_atual.erro}")
 
+# -------------------------------
+# Exportação (Excel, CSV ou Parquet)
+# -------------------------------
+st.subheader("📤 Exportação")
+TIPOS_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/octet-stream",
+}
+# Fonte -> (agenda, alertas, chave que identifica o conteúdo da agenda)
+fontes_exportacao = {"Agenda original": (agenda, alertas, chave_agenda)}
+if agenda_ajustada:
+    fontes_exportacao["Agenda ajustada"] = (agenda_ajustada, alertas_ajustada, (chave_agenda, assinatura_redistribuicao))
+if agenda_sequenciada:
+    fontes_exportacao["Agenda sequenciada"] = (agenda_sequenciada, alertas_jornada, chave_sequenciamento)
+cols = st.columns(3)
+with cols[0]:
+    fonte_exportacao = st.selectbox("Agenda", list(fontes_exportacao), key="selectbox_fonte_exportacao")
+with cols[1]:
+    formato_exportacao = st.selectbox("Formato", FORMATOS_EXPORTACAO, key="selectbox_formato_exportacao")
+with cols[2]:
+    incluir_alertas = st.checkbox("Incluir alertas", value=True, key="checkbox_alertas_exportacao")
+agenda_exportar, alertas_exportar, conteudo_exportar = fontes_exportacao[fonte_exportacao]
+chave_exportacao = ("exportacao", conteudo_exportar, formato_exportacao, incluir_alertas)
+if st.button("Gerar arquivo", key="btn_exportar"):
+    gerenciador.submeter(
+        chave_exportacao, tarefa_exportar, agenda_exportar, st.session_state.parametros["inicio"],
+        formato_exportacao, alertas=alertas_exportar if incluir_alertas else None,
+        indice_semana={compacta.rotulo(i): i for i in semanas_disponiveis},
+    )
+    st.session_state.tarefa_exportacao = chave_exportacao
+
+if st.session_state.get("tarefa_exportacao") == chave_exportacao:
+    tarefa_exportacao = gerenciador.obter(chave_exportacao)
+    if tarefa_exportacao is not None and not tarefa_exportacao.aguardar(ESPERA_TAREFA_SEGUNDOS):
+        acompanhar_tarefa(chave_exportacao, "Exportando...")
+    elif tarefa_exportacao is not None and tarefa_exportacao.estado == "concluida":
+        arquivos = tarefa_exportacao.resultado
+        st.caption(f"{arquivos['linhas']} visitas exportadas.")
+        st.download_button(
+            "Baixar agenda", arquivos["agenda"], file_name=f"agenda.{formato_exportacao}",
+            mime=TIPOS_MIME[formato_exportacao], key="download_agenda",
+        )
+        if arquivos["alertas"] is not None:
+            st.download_button(
+                "Baixar alertas", arquivos["alertas"], file_name=f"alertas.{formato_exportacao}",
+                mime=TIPOS_MIME[formato_exportacao], key="download_alertas",
+            )
+    elif tarefa_exportacao is not None and tarefa_exportacao.estado == "cancelada":
+        st.warning("Exportação cancelada.")
+    elif tarefa_exportacao is not None:
+        st.error(f"Falha na exportação: {tarefa_exportacao.erro}")
 
-# In[ ]:
 
+# -------------------------------
+# Desempenho (instrumentação)
+# -------------------------------
+traco = INSTRUMENTACAO.finalizar_execucao(execucao) if INSTRUMENTACAO.ativa else None
+if traco and ARQUIVO_TRACOS:
+    gravar_traco(ARQUIVO_TRACOS, traco)
+
+def alternar_instrumentacao():
+    INSTRUMENTACAO.ativa = st.session_state.checkbox_instrumentacao
+
+with st.expander("⏱️ Desempenho"):
+    st.checkbox("Medir tempos e contadores (vale para todo o processo)", value=INSTRUMENTACAO.ativa,
+                key="checkbox_instrumentacao", on_change=alternar_instrumentacao)
+    if traco:
+        # O traço inclui as tarefas em segundo plano e outras sessões que rodaram durante esta execução
+        por_etapa = {}
+        for evento in traco["eventos"]:
+            chamadas, segundos = por_etapa.get(evento["etapa"], (0, 0.0))
+            por_etapa[evento["etapa"]] = (chamadas + 1, segundos + evento["segundos"])
+        st.caption(f"Última execução da página: {traco['segundos'] * 1000:.0f} ms · {len(traco['eventos'])} medições")
+        st.dataframe(pd.DataFrame(
+            [{"Etapa": etapa, "Chamadas": chamadas, "Total (ms)": round(segundos * 1000, 1)}
+             for etapa, (chamadas, segundos) in sorted(por_etapa.items(), key=lambda item: -item[1][1])],
+            columns=["Etapa", "Chamadas", "Total (ms)"],
+        ), use_container_width=True)
+    etapas, contadores = INSTRUMENTACAO.resumo()
+    if etapas:
+        st.markdown("**Acumulado do processo**")
+        st.dataframe(pd.DataFrame(
+            [{"Etapa": nome, "Chamadas": e["chamadas"], "Total (s)": round(e["segundos"], 3),
+              "Médio (ms)": round(e["segundos"] / e["chamadas"] * 1000, 1), "Máximo (ms)": round(e["maximo"] * 1000, 1)}
+             for nome, e in sorted(etapas.items(), key=lambda item: -item[1]["segundos"])]
+        ), use_container_width=True)
+    if contadores:
+        st.dataframe(pd.DataFrame(sorted(contadores.items()), columns=["Contador", "Valor"]), use_container_width=True)
+    cache = obter_cache()
+    st.caption(f"Cache compartilhado: {cache.bytes / 2**20:.1f} de {cache.limite_bytes / 2**20:.0f} MB · "
+               f"{cache.acertos} acertos · {cache.faltas} faltas · {cache.descartes} descartes")
+    st.dataframe(pd.DataFrame(
+        [{"Região": "(única)" if inquilino is None else inquilino, "Entradas": e["entradas"],
+          "MB": round(e["bytes"] / 2**20, 2)} for inquilino, e in cache.estatisticas().items()],
+        columns=["Região", "Entradas", "MB"],
+    ), use_container_width=True)
+    cols = st.columns(3)
+    with cols[0]:
+        if traco:
+            st.download_button("Baixar traço (JSON)", json.dumps(traco, ensure_ascii=False), file_name="traco.json",
+                               mime="application/json", key="download_traco")
+    with cols[1]:
+        st.download_button("Baixar métricas (Prometheus)", INSTRUMENTACAO.texto_prometheus(), file_name="metricas.prom",
+                           mime="text/plain", key="download_metricas")
+    with cols[2]:
+        if st.button("Zerar medições", key="btn_zerar_instrumentacao"):
+            INSTRUMENTACAO.zerar()
 
 
 
+# In[ ]:
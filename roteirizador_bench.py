@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Benchmarks do núcleo de agendamento com bases sintéticas reprodutíveis.
+
+Mede tempo (perf_counter) e pico de memória (tracemalloc) de cada etapa para
+combinações de tamanho da base x semanas, grava um JSON e, opcionalmente,
+compara com um baseline salvo anteriormente.
+
+Exemplos:
+    python roteirizador_bench.py --rapido
+    python roteirizador_bench.py --saida atual.json --baseline baseline.json --tolerancia 0.25
+"""
+
+import argparse
+import datetime
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import roteirizador_core as core
+
+TAMANHOS = [1_000, 10_000, 100_000, 1_000_000]
+SEMANAS = [6, 12, 52]
+
+# Acima destes tamanhos a etapa é pulada (use --sem-limites para forçar): as versões
+# baseadas em dicts/planilha ficam lentas ou consomem memória demais nessas escalas.
+LIMITE_CLIENTES = {
+    "redistribuir_balanceado": 10_000,
+    "gerar_agenda": 100_000,
+    "redistribuir_balanceado_heap": 100_000,
+    "importar_xlsx": 100_000,
+}
+
+
+def gerar_clientes_sinteticos(n, rotas=50, vies_dia=(5, 3, 2, 1, 1), mix_frequencia=None,
+                              fracao_duplicados=0.01, semente=42):
+    """
+    Base sintética de 'n' clientes: 'rotas' rotas, dias sorteados com pesos 'vies_dia'
+    (Segunda..Sexta), frequências com pesos 'mix_frequencia' ({freq: peso}) e uma
+    fração de registros com id repetido (para exercitar o dedupe).
+    """
+    rng = random.Random(semente)
+    mix_frequencia = mix_frequencia or {7: 5, 14: 3, 30: 2}
+    freqs, pesos_freq = list(mix_frequencia), list(mix_frequencia.values())
+    nomes_rota = [f"BR{r:04d}" for r in range(rotas)]
+    dias = rng.choices(core.DIAS_SEMANA, weights=vies_dia, k=n)
+    frequencias = rng.choices(freqs, weights=pesos_freq, k=n)
+    clientes = []
+    for i in range(n):
+        cid = i + 1
+        if i and rng.random() < fracao_duplicados:
+            cid = rng.randint(1, i)
+        clientes.append({
+            "id": cid,
+            "nome": f"Cliente {i + 1}",
+            "rota": nomes_rota[rng.randrange(rotas)],
+            "dia_semana": dias[i],
+            "frequencia": frequencias[i],
+        })
+    return clientes
+
+
+def _csv_clientes(clientes):
+    buf = io.BytesIO()
+    buf.write(b"nome,rota,dia_semana,frequencia\n")
+    for c in clientes:
+        buf.write(f"{c['nome']},{c['rota']},{c['dia_semana']},{c['frequencia']}\n".encode())
+    buf.seek(0)
+    return buf
+
+
+def _xlsx_clientes(clientes):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(core.COLUNAS_IMPORTACAO))
+    for c in clientes:
+        ws.append([c["nome"], c["rota"], c["dia_semana"], c["frequencia"]])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def _etapas(clientes, semanas, inicio, capacidade):
+    """Etapas medidas: nome -> (preparo não medido, função medida que recebe o resultado do preparo)."""
+    def agenda():
+        return core.gerar_agenda(inicio, semanas, clientes, capacidade)[0]
+
+    # Com a capacidade de geração, o alvo (média da semana) já fica acima dela e nada se move;
+    # a redistribuição é medida com capacidade folgada para balancear até a média.
+    capacidade_folgada = max(capacidade, len(clientes))
+
+    return {
+        "dedupe_clientes": (lambda: None, lambda _: core.dedupe_clientes(clientes)),
+        "gerar_agenda": (lambda: None, lambda _: core.gerar_agenda(inicio, semanas, clientes, capacidade)),
+        "gerar_agenda_vetorizada": (
+            lambda: None, lambda _: core.gerar_agenda_vetorizada(inicio, semanas, clientes, capacidade)),
+        "redistribuir_balanceado": (
+            agenda, lambda ag: core.redistribuir_balanceado(ag, capacidade_folgada, permitir_mover_semanal=True)),
+        "redistribuir_balanceado_heap": (
+            agenda, lambda ag: core.redistribuir_balanceado_heap(ag, capacidade_folgada, permitir_mover_semanal=True)),
+        "importar_csv": (
+            lambda: _csv_clientes(clientes),
+            lambda buf: core.importar_clientes(buf, "bench.csv", core.ArmazemClientesMemoria())),
+        "importar_xlsx": (
+            lambda: _xlsx_clientes(clientes),
+            lambda buf: core.importar_clientes(buf, "bench.xlsx", core.ArmazemClientesMemoria())),
+    }
+
+
+# Etapas que não dependem do número de semanas são medidas uma vez por tamanho
+INDEPENDENTES_DE_SEMANAS = {"dedupe_clientes", "importar_csv", "importar_xlsx"}
+
+
+def medir(preparo, funcao, memoria=True):
+    """Executa 'funcao' (após 'preparo', fora da medição) e retorna (segundos, pico em MB ou None)."""
+    entrada = preparo()
+    inicio = time.perf_counter()
+    funcao(entrada)
+    segundos = time.perf_counter() - inicio
+    pico_mb = None
+    if memoria:
+        entrada = preparo()
+        tracemalloc.start()
+        funcao(entrada)
+        pico_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return segundos, pico_mb
+
+
+def executar(tamanhos, semanas, etapas, rotas, semente, capacidade, memoria=True, sem_limites=False):
+    inicio = core.DEFAULTS["inicio"]
+    resultados = []
+    core.gerar_agenda_vetorizada(inicio, 1, [], capacidade)  # aquece a importação do numpy fora das medições
+    for n in tamanhos:
+        clientes = gerar_clientes_sinteticos(n, rotas=rotas, semente=semente)
+        for sem in semanas:
+            disponiveis = _etapas(clientes, sem, inicio, capacidade)
+            for etapa in etapas:
+                if etapa in INDEPENDENTES_DE_SEMANAS and sem != semanas[0]:
+                    continue
+                registro = {"etapa": etapa, "clientes": n,
+                            "semanas": None if etapa in INDEPENDENTES_DE_SEMANAS else sem}
+                if not sem_limites and n > LIMITE_CLIENTES.get(etapa, n):
+                    registro["pulado"] = True
+                else:
+                    preparo, funcao = disponiveis[etapa]
+                    registro["segundos"], registro["pico_mb"] = medir(preparo, funcao, memoria)
+                resultados.append(registro)
+                print(json.dumps(registro, ensure_ascii=False), file=sys.stderr)
+    return resultados
+
+
+def _chave(r):
+    return r["etapa"], r["clientes"], r["semanas"]
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Regressões de tempo acima de 'tolerancia' (fração) em relação ao baseline."""
+    anteriores = {_chave(r): r for r in baseline["resultados"] if "segundos" in r}
+    regressoes = []
+    for r in resultados:
+        antes = anteriores.get(_chave(r))
+        if antes is None or "segundos" not in r or antes["segundos"] <= 0:
+            continue
+        razao = r["segundos"] / antes["segundos"]
+        if razao > 1 + tolerancia:
+            regressoes.append({**r, "baseline_segundos": antes["segundos"], "razao": round(razao, 2)})
+    return regressoes
+
+
+def _lista_int(texto):
+    return [int(x) for x in texto.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do núcleo de agendamento.")
+    parser.add_argument("--tamanhos", type=_lista_int, default=TAMANHOS, help="ex.: 1000,10000")
+    parser.add_argument("--semanas", type=_lista_int, default=SEMANAS, help="ex.: 6,12,52")
+    parser.add_argument("--etapas", default=None, help="etapas separadas por vírgula (padrão: todas)")
+    parser.add_argument("--rotas", type=int, default=50)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--capacidade", type=int, default=core.DEFAULTS["capacidade_por_dia"])
+    parser.add_argument("--rapido", action="store_true", help="apenas 1k e 10k clientes, 6 e 12 semanas")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede pico de memória (mais rápido)")
+    parser.add_argument("--sem-limites", action="store_true", help="não pula etapas lentas em bases grandes")
+    parser.add_argument("--saida", default="bench_resultados.json")
+    parser.add_argument("--baseline", default=None, help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="regressão tolerada (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    todas = list(_etapas([], 1, core.DEFAULTS["inicio"], 1))
+    etapas = args.etapas.split(",") if args.etapas else todas
+    desconhecidas = set(etapas) - set(todas)
+    if desconhecidas:
+        parser.error(f"etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    tamanhos, semanas = (([1_000, 10_000], [6, 12]) if args.rapido else (args.tamanhos, args.semanas))
+
+    resultados = executar(tamanhos, semanas, etapas, args.rotas, args.semente, args.capacidade,
+                          memoria=not args.sem_memoria, sem_limites=args.sem_limites)
+    saida = {
+        "meta": {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "semente": args.semente,
+            "rotas": args.rotas,
+            "capacidade": args.capacidade,
+        },
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        for r in regressoes:
+            print(f"Regressão: {r['etapa']} ({r['clientes']} clientes, {r['semanas']} semanas): "
+                  f"{r['baseline_segundos']:.3f}s -> {r['segundos']:.3f}s (x{r['razao']})")
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
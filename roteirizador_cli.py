@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Geração de agendas em lote (cron), sem abrir a interface Streamlit.
+
+Exemplo:
+    python roteirizador_cli.py clientes.xlsx --semanas 12 --redistribuir \
+        --saida-agenda agenda.csv --saida-alertas alertas.txt
+"""
+
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import sys
+
+from roteirizador_core import (
+    COLUNAS_AGENDA_EXPORTACAO, DEFAULTS, INSTRUMENTACAO, ArmazemClientesMemoria, alertas_agenda, avaliar_cenarios,
+    escrever_linhas, exportar_alertas, formato_do_arquivo, gerar_agenda, gerar_agendas_por_rota, gravar_traco,
+    importar_clientes, linhas_agenda, redistribuir_balanceado_heap, redistribuir_global, sequenciar_agenda, validar_cadastro,
+)
+
+
+def _data(texto):
+    return datetime.datetime.strptime(texto, "%Y-%m-%d").date()
+
+
+def _coordenadas(texto):
+    lat, lon = (float(x) for x in texto.split(","))
+    return lat, lon
+
+
+def escrever_agenda(caminho, agendas, inicio):
+    """
+    Uma linha por visita: semana, data real, dia e dados do cliente. 'agendas' é um iterável de agendas;
+    o formato (csv, xlsx ou parquet) vem da extensão do arquivo, com csv como padrão.
+    """
+    linhas = itertools.chain.from_iterable(linhas_agenda(agenda, inicio) for agenda in agendas)
+    escrever_linhas(caminho, formato_do_arquivo(caminho) or "csv", COLUNAS_AGENDA_EXPORTACAO, linhas, aba="Agenda")
+
+
+def escrever_alertas(caminho, alertas, prefixar_rota=False):
+    """Em .csv/.xlsx/.parquet, uma linha por alerta com colunas; nos demais, o texto de um alerta por linha."""
+    formato = formato_do_arquivo(caminho)
+    if formato:
+        exportar_alertas(caminho, alertas, formato)
+        return
+    with open(caminho, "w", encoding="utf-8") as f:
+        for i in range(len(alertas)):
+            prefixo = f"[{alertas.rota[i]}] " if prefixar_rota else ""
+            f.write(f"{prefixo}{alertas.texto(i)}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera (e opcionalmente redistribui) a agenda de visitas.")
+    parser.add_argument("arquivo", help="clientes em .xlsx, .csv ou .parquet (colunas: nome, rota, dia_semana, frequencia; "
+                                       "opcionais: lat, lon, deslocamento)")
+    parser.add_argument("--inicio", type=_data, default=DEFAULTS["inicio"], help="data inicial (AAAA-MM-DD)")
+    parser.add_argument("--semanas", type=int, default=DEFAULTS["semanas"])
+    parser.add_argument("--capacidade", type=int, default=DEFAULTS["capacidade_por_dia"], help="capacidade por dia")
+    parser.add_argument("--rota", default=None, help="gera apenas esta rota (padrão: todas)")
+    parser.add_argument("--limiar-dia", type=float, default=DEFAULTS["limiar_desequilibrio_porcento"])
+    parser.add_argument("--limiar-semana", type=float, default=DEFAULTS["limiar_semana_porcento"])
+    parser.add_argument("--redistribuir", action="store_true", help="executa a redistribuição balanceada")
+    parser.add_argument("--mover-semanal", action="store_true", help="permite mover clientes semanais (freq. 7)")
+    parser.add_argument("--global", dest="redistribuir_global", action="store_true",
+                        help="com --redistribuir, usa a otimização global (todas as semanas de uma vez)")
+    parser.add_argument("--tempo-limite", type=float, default=5.0, help="segundos para a otimização global")
+    parser.add_argument("--preservar-dia", action="store_true", help="preserva o dia original do cliente")
+    parser.add_argument("--por-rota", action="store_true",
+                        help="gera cada rota separadamente (capacidade por rota), em paralelo")
+    parser.add_argument("--workers", type=int, default=None, help="processos para --por-rota e --cenarios (padrão: nº de CPUs)")
+    parser.add_argument("--sequenciar", action="store_true",
+                        help="ordena as visitas de cada dia pela distância (clientes com lat/lon)")
+    parser.add_argument("--origem", type=_coordenadas, default=None, help="base de saída e retorno: LAT,LON")
+    parser.add_argument("--velocidade", type=float, default=30.0, help="velocidade média em km/h")
+    parser.add_argument("--minutos-visita", type=float, default=15.0, help="duração de cada visita (min)")
+    parser.add_argument("--jornada", type=float, default=None, help="jornada máxima por dia (min); gera alertas")
+    parser.add_argument("--saida-agenda", default="agenda.csv", help="agenda em .csv, .xlsx ou .parquet")
+    parser.add_argument("--saida-alertas", default="alertas.txt",
+                        help="alertas em texto (.txt) ou em colunas (.csv, .xlsx, .parquet)")
+    parser.add_argument("--cenarios", default=None,
+                        help="JSON com a lista de cenários a comparar (ver avaliar_cenarios); imprime a comparação em CSV")
+    parser.add_argument("--metricas", default=None,
+                        help="grava tempos e contadores das etapas: .jsonl (traço da execução) ou texto Prometheus")
+    args = parser.parse_args(argv)
+    if args.por_rota and args.redistribuir_global:
+        # --por-rota redistribui cada rota com a gulosa; a otimização global roda sobre a base inteira
+        parser.error("--global não pode ser combinado com --por-rota")
+
+    if not args.metricas:
+        return executar(args)
+    INSTRUMENTACAO.ativa = True
+    execucao = INSTRUMENTACAO.iniciar_execucao("cli")
+    try:
+        return executar(args)
+    finally:
+        if args.metricas.endswith((".json", ".jsonl")):
+            gravar_traco(args.metricas, INSTRUMENTACAO.finalizar_execucao(execucao))
+        else:
+            with open(args.metricas, "w", encoding="utf-8") as f:
+                f.write(INSTRUMENTACAO.texto_prometheus())
+
+
+def comparar_cenarios(args, clientes):
+    """Avalia os cenários do arquivo JSON (datas em AAAA-MM-DD) e imprime uma linha de métricas por cenário."""
+    with open(args.cenarios, encoding="utf-8") as f:
+        cenarios = json.load(f)
+    for cenario in cenarios:
+        if "inicio" in cenario:
+            cenario["inicio"] = _data(cenario["inicio"])
+    resultados = avaliar_cenarios(clientes, cenarios, args.inicio, args.semanas, args.capacidade, rota=args.rota,
+                                  workers=args.workers)
+    colunas = ["sobrecarga", "dias_acima", "desvio", "movimentos", "dias_alterados"]
+    w = csv.writer(sys.stdout)
+    w.writerow(["cenario"] + colunas)
+    for r in resultados:
+        w.writerow([r["nome"]] + [r["metricas"][c] for c in colunas])
+    return 0
+
+
+def executar(args):
+    armazem = ArmazemClientesMemoria()
+    try:
+        importar_clientes(args.arquivo, args.arquivo, armazem)
+    except (OSError, ValueError) as e:
+        print(f"Falha ao ler o arquivo: {e}", file=sys.stderr)
+        return 2
+    except ImportError as e:
+        modulo = e.name or "openpyxl"
+        print(f"Dependência '{modulo}' não encontrada. Instale com: pip install {modulo}", file=sys.stderr)
+        return 2
+    clientes = armazem.listar(args.rota)
+
+    if args.cenarios:
+        return comparar_cenarios(args, clientes)
+
+    if args.por_rota:
+        agendas, alertas_rota, realocados = gerar_agendas_por_rota(
+            args.inicio, args.semanas, clientes, args.capacidade,
+            limiar_dia_pct=args.limiar_dia, limiar_semana_pct=args.limiar_semana,
+            redistribuir=args.redistribuir, permitir_mover_semanal=args.mover_semanal,
+            preservar_dia_semana=args.preservar_dia, workers=args.workers,
+        )
+        if args.sequenciar:
+            for rota in agendas:
+                agendas[rota], _, _ = sequenciar_agenda(
+                    agendas[rota], origem=args.origem, velocidade_kmh=args.velocidade,
+                    minutos_por_visita=args.minutos_visita, jornada_minutos=args.jornada,
+                    alertas=alertas_rota, rota=rota,
+                )
+        escrever_agenda(args.saida_agenda, agendas.values(), args.inicio)
+        escrever_alertas(args.saida_alertas, alertas_rota, prefixar_rota=True)
+        print(f"{len(clientes)} clientes, {len(agendas)} rotas, "
+              f"{len(realocados)} realocados, {len(alertas_rota)} alertas")
+        return 0
+
+    agenda, alertas, resumo = gerar_agenda(
+        args.inicio, args.semanas, clientes, args.capacidade,
+        limiar_dia_pct=args.limiar_dia, limiar_semana_pct=args.limiar_semana,
+    )
+    realocados = []
+    painel = resumo["painel"]
+    if args.redistribuir and args.redistribuir_global:
+        agenda, realocados, relatorio = redistribuir_global(
+            args.inicio, args.semanas, clientes, args.capacidade,
+            permitir_mover_semanal=args.mover_semanal, preservar_dia_semana=args.preservar_dia,
+            tempo_limite=args.tempo_limite,
+        )
+        painel = None  # agenda nova: os alertas são recalculados das listas
+        print(f"Otimização global: melhoria de {relatorio['melhoria_vs_guloso']:.1%} sobre a gulosa "
+              f"(sobrecarga {relatorio['guloso']['sobrecarga']} -> {relatorio['global']['sobrecarga']}; "
+              f"{relatorio['semanas_gulosas']} semana(s) mantida(s) da gulosa)")
+    elif args.redistribuir:
+        agenda, realocados = redistribuir_balanceado_heap(
+            agenda, args.capacidade,
+            permitir_mover_semanal=args.mover_semanal, preservar_dia_semana=args.preservar_dia, painel=painel,
+        )
+    if args.redistribuir:
+        alertas, freq_desconhecida = validar_cadastro(clientes)
+        alertas_agenda(agenda, freq_desconhecida, args.capacidade, args.limiar_dia, args.limiar_semana,
+                       alertas=alertas, rota=args.rota, painel=painel)
+    if args.sequenciar:
+        agenda, _, _ = sequenciar_agenda(
+            agenda, origem=args.origem, velocidade_kmh=args.velocidade, minutos_por_visita=args.minutos_visita,
+            jornada_minutos=args.jornada, alertas=alertas, rota=args.rota,
+        )
+
+    escrever_agenda(args.saida_agenda, [agenda], args.inicio)
+    escrever_alertas(args.saida_alertas, alertas)
+    print(f"{resumo['total_clientes']} clientes, {len(agenda)} semanas, "
+          f"{len(realocados)} realocados, {len(alertas)} alertas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2978 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Núcleo de agendamento do Roteirizador, sem dependência do Streamlit.
+
+Usado pela interface (Roteirizador.py) e pela linha de comando (roteirizador_cli.py).
+numpy e pandas são importados sob demanda, dentro das funções que os usam,
+para que importar o módulo continue barato em jobs batch.
+"""
+
+import contextlib
+import datetime
+import functools
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from collections import Counter, OrderedDict, deque
+
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta"]
+MAPA_DIA_IDX = {dia: i for i, dia in enumerate(DIAS_SEMANA)}  # útil para ordenação / consistência
+# Frequência (dias) -> (unidade, intervalo): visita a cada 'intervalo' semanas a partir da Semana 1,
+# ou na primeira semana do mês a cada 'intervalo' meses a partir do primeiro mês do horizonte
+REGRAS_FREQUENCIA = {
+    7: ("semanas", 1),
+    14: ("semanas", 2),
+    21: ("semanas", 3),
+    28: ("semanas", 4),
+    30: ("meses", 1),
+    60: ("meses", 2),
+}
+CLASSE_FREQUENCIA = {freq: k for k, freq in enumerate(REGRAS_FREQUENCIA)}  # classe -1 = frequência desconhecida
+FREQUENCIA_DA_CLASSE = list(REGRAS_FREQUENCIA)
+CAMPOS_CLIENTE = ("id", "nome", "rota", "dia_semana", "frequencia")
+CAMPOS_COORDENADAS = ("lat", "lon")  # opcionais: usados no sequenciamento das visitas
+# Padrão de visita: dia_semana aceita vários dias ("Segunda,Quinta"), e o deslocamento opcional
+# (em semanas, ou em meses nas frequências mensais) escolhe em qual semana do ciclo a cadência começa
+CAMPOS_PADRAO = ("deslocamento",)
+SEPARADOR_DIAS = ","
+
+CLIENTES_EXEMPLO = [
+    {"id": 1, "nome": "Cliente A", "rota": "BR001", "dia_semana": "Segunda", "frequencia": 7},
+    {"id": 2, "nome": "Cliente B", "rota": "BR001", "dia_semana": "Segunda", "frequencia": 14},
+    {"id": 3, "nome": "Cliente C", "rota": "BR001", "dia_semana": "Terça", "frequencia": 30},
+]
+
+DEFAULTS = {
+    "capacidade_por_dia": 40,
+    "semanas": 6,
+    "inicio": datetime.date(2025, 12, 24),  # Semana 1 sempre começa em 24/12/2025
+    "rota": None,
+    "limiar_desequilibrio_porcento": 0.5,
+    "limiar_semana_porcento": 0.3,
+}
+
+# -------------------------------
+# Instrumentação (tempos e contadores por etapa)
+# -------------------------------
+EVENTOS_MAX = 10_000  # eventos recentes guardados para montar os traços por execução
+_CONTEXTO_NULO = contextlib.nullcontext()
+
+class _Cronometro:
+    __slots__ = ("_instrumentacao", "_nome", "_inicio", "_t0")
+
+    def __init__(self, instrumentacao, nome):
+        self._instrumentacao = instrumentacao
+        self._nome = nome
+
+    def __enter__(self):
+        self._inicio = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._instrumentacao.registrar(self._nome, time.perf_counter() - self._t0, self._inicio)
+        return False
+
+class Instrumentacao:
+    """
+    Tempos (perf_counter) e contadores por etapa do pipeline, compartilhados pelo processo e pelas threads.
+    Desligada, etapa() devolve um contexto nulo e contar() retorna de imediato; os laços internos
+    acumulam contadores em variáveis locais e os publicam uma vez ao final.
+    Os tempos são inclusivos: uma etapa chamada dentro de outra conta nas duas.
+    """
+
+    def __init__(self, ativa=False, eventos_max=EVENTOS_MAX):
+        self.ativa = ativa
+        self.etapas = {}                            # etapa -> [chamadas, segundos, máximo]
+        self.contadores = Counter()
+        self.eventos = deque(maxlen=eventos_max)    # (etapa, início em time.time(), segundos, thread)
+        self._lock = threading.Lock()
+
+    def etapa(self, nome):
+        """Contexto que mede a etapa 'nome' (nulo se desligada)."""
+        if not self.ativa:
+            return _CONTEXTO_NULO
+        return _Cronometro(self, nome)
+
+    def registrar(self, nome, segundos, inicio):
+        with self._lock:
+            estatisticas = self.etapas.get(nome)
+            if estatisticas is None:
+                estatisticas = self.etapas[nome] = [0, 0.0, 0.0]
+            estatisticas[0] += 1
+            estatisticas[1] += segundos
+            estatisticas[2] = max(estatisticas[2], segundos)
+            self.eventos.append((nome, inicio, segundos, threading.current_thread().name))
+
+    def contar(self, nome, n=1):
+        if not self.ativa:
+            return
+        with self._lock:
+            self.contadores[nome] += n
+
+    def zerar(self):
+        with self._lock:
+            self.etapas.clear()
+            self.contadores.clear()
+            self.eventos.clear()
+
+    def resumo(self):
+        """Cópia consistente: ({etapa: {"chamadas", "segundos", "maximo"}}, {contador: valor})."""
+        with self._lock:
+            etapas = {nome: {"chamadas": e[0], "segundos": e[1], "maximo": e[2]} for nome, e in self.etapas.items()}
+            return etapas, dict(self.contadores)
+
+    def iniciar_execucao(self, rotulo):
+        """Marca o início de uma execução (ex.: um rerun da página); feche com finalizar_execucao."""
+        return {"rotulo": rotulo, "inicio": time.time(), "t0": time.perf_counter()}
+
+    def finalizar_execucao(self, execucao):
+        """
+        Traço da execução: {"rotulo", "inicio" (ISO), "segundos", "eventos"}, com os eventos registrados
+        desde o início em qualquer thread do processo (inclui tarefas em segundo plano e outras sessões).
+        """
+        segundos = time.perf_counter() - execucao["t0"]
+        with self._lock:
+            eventos = [e for e in self.eventos if e[1] >= execucao["inicio"]]
+        return {
+            "rotulo": execucao["rotulo"],
+            "inicio": datetime.datetime.fromtimestamp(execucao["inicio"]).isoformat(timespec="milliseconds"),
+            "segundos": segundos,
+            "eventos": [{"etapa": nome, "deslocamento": inicio - execucao["inicio"], "segundos": seg, "thread": thread}
+                        for nome, inicio, seg, thread in eventos],
+        }
+
+    def texto_prometheus(self, prefixo="roteirizador"):
+        """Tempos e contadores no formato texto do Prometheus."""
+        etapas, contadores = self.resumo()
+        linhas = []
+        for metrica, tipo, campo, ajuda in (
+            ("etapa_chamadas_total", "counter", "chamadas", "Execuções de cada etapa."),
+            ("etapa_segundos_total", "counter", "segundos", "Tempo acumulado de cada etapa (inclusivo)."),
+            ("etapa_segundos_max", "gauge", "maximo", "Maior duração de uma execução da etapa."),
+        ):
+            linhas += [f"# HELP {prefixo}_{metrica} {ajuda}", f"# TYPE {prefixo}_{metrica} {tipo}"]
+            linhas += [f'{prefixo}_{metrica}{{etapa="{nome}"}} {e[campo]}' for nome, e in sorted(etapas.items())]
+        linhas += [f"# HELP {prefixo}_contador_total Contadores das etapas (iterações, movimentos, linhas...).",
+                   f"# TYPE {prefixo}_contador_total counter"]
+        linhas += [f'{prefixo}_contador_total{{nome="{nome}"}} {valor}' for nome, valor in sorted(contadores.items())]
+        return "\n".join(linhas) + "\n"
+
+INSTRUMENTACAO = Instrumentacao(ativa=os.environ.get("ROTEIRIZADOR_INSTRUMENTACAO") == "1")
+
+def instrumentado(nome):
+    """Decorador: mede cada chamada da função como a etapa 'nome' em INSTRUMENTACAO."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not INSTRUMENTACAO.ativa:
+                return funcao(*args, **kwargs)
+            with _Cronometro(INSTRUMENTACAO, nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+def gravar_traco(caminho, traco):
+    """Acrescenta o traço de uma execução ao arquivo, um JSON por linha."""
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(traco, ensure_ascii=False) + "\n")
+
+def servir_metricas(porta, host="127.0.0.1"):
+    """Expõe INSTRUMENTACAO.texto_prometheus() em http://host:porta/metrics numa thread daemon; retorna o servidor."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Metricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            corpo = INSTRUMENTACAO.texto_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), _Metricas)
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
+
+# -------------------------------
+# Utilitários
+# -------------------------------
+@instrumentado("dedupe_clientes")
+def dedupe_clientes(clientes):
+    """Remove duplicações por id mantendo o primeiro registro."""
+    vistos = set()
+    unicos = []
+    for c in clientes:
+        cid = c.get("id")
+        if cid not in vistos:
+            unicos.append(c)
+            vistos.add(cid)
+    INSTRUMENTACAO.contar("dedupe_clientes.registros", len(unicos))
+    return unicos
+
+def tem_coordenadas(c):
+    return c.get("lat") is not None and c.get("lon") is not None
+
+def copiar_cliente(c):
+    """Cópia com os campos da agenda; lat/lon e deslocamento só entram na cópia quando presentes."""
+    copia = {campo: c.get(campo) for campo in CAMPOS_CLIENTE}
+    if tem_coordenadas(c):
+        copia["lat"], copia["lon"] = c["lat"], c["lon"]
+    if c.get("deslocamento"):
+        copia["deslocamento"] = c["deslocamento"]
+    return copia
+
+@functools.lru_cache(maxsize=256)
+def dias_do_padrao(dia_semana):
+    """
+    Índices em DIAS_SEMANA (ordenados, sem repetição) dos dias de 'dia_semana': um dia ou vários
+    separados por SEPARADOR_DIAS. Tupla vazia se algum dos dias for inválido.
+    """
+    if not isinstance(dia_semana, str) or not dia_semana:
+        return ()
+    dias = set()
+    for parte in dia_semana.split(SEPARADOR_DIAS):
+        d = MAPA_DIA_IDX.get(parte.strip())
+        if d is None:
+            return ()
+        dias.add(d)
+    return tuple(sorted(dias))
+
+def formatar_dias(dias):
+    """Texto de dia_semana para os índices 'dias', na ordem da semana (ex.: "Segunda,Quinta")."""
+    return SEPARADOR_DIAS.join(DIAS_SEMANA[d] for d in sorted(dias))
+
+def cadencia_cliente(c):
+    """(classe de frequência, deslocamento normalizado) do cliente, ou None se a frequência for desconhecida."""
+    k = CLASSE_FREQUENCIA.get(c.get("frequencia"), -1)
+    if k < 0:
+        return None
+    return k, int(c.get("deslocamento") or 0) % REGRAS_FREQUENCIA[FREQUENCIA_DA_CLASSE[k]][1]
+
+def dias_bloqueados(cliente, preservar_dia_semana=False):
+    """
+    Dias (índices) para onde uma visita do cliente não pode ser movida na redistribuição: os do próprio
+    padrão quando preservar_dia_semana ou quando o cliente tem mais de um dia (evita duas visitas no mesmo dia).
+    """
+    dias = dias_do_padrao(cliente.get("dia_semana"))
+    return dias if preservar_dia_semana or len(dias) > 1 else ()
+
+def primeira_semana_do_mes(date_obj):
+    """Retorna True se a semana (seg-sex ancorada em 'date_obj') cair nos 7 primeiros dias do mês."""
+    # Consideramos 'date_obj' como a segunda-feira de referência (Semana inicia em 'inicio' fornecido)
+    return date_obj.day <= 7
+
+def rotulo_semana(sidx, semana_inicio):
+    """Monta o identificador textual da semana (segunda a sexta)."""
+    semana_fim = semana_inicio + timedelta(days=4)  # segunda a sexta
+    return f"Semana {sidx+1} ({semana_inicio.strftime('%d/%m/%Y')} - {semana_fim.strftime('%d/%m/%Y')})"
+
+# -------------------------------
+# Calendário de visitas (regras de frequência pré-calculadas)
+# -------------------------------
+class CalendarioVisitas:
+    """
+    Regras de frequência avaliadas uma única vez para o horizonte (inicio, semanas):
+    mascaras[k] tem o bit 'sidx' ligado nas semanas em que a classe k tem visita, e
+    padroes[sidx] é a tupla de classes ativas na semana (semanas com o mesmo padrão têm a mesma agenda).
+    Cadências deslocadas (classe, deslocamento) têm a máscara calculada na primeira consulta, via mascara().
+    Use calendario_visitas() para reaproveitar a instância já calculada.
+    """
+
+    def __init__(self, inicio, semanas):
+        self.inicio = inicio
+        self.semanas = semanas
+        self.inicios = [inicio + timedelta(weeks=sidx) for sidx in range(semanas)]
+
+        # Ordem de cada primeira semana do mês dentro do horizonte (-1 nas demais semanas)
+        ordem_mes = []
+        n_meses = 0
+        for semana_inicio in self.inicios:
+            if primeira_semana_do_mes(semana_inicio):
+                ordem_mes.append(n_meses)
+                n_meses += 1
+            else:
+                ordem_mes.append(-1)
+
+        self._ordem_mes = ordem_mes
+        self._deslocadas = {}
+        self.mascaras = [self._calcular_mascara(k, 0) for k in range(len(REGRAS_FREQUENCIA))]
+        self.padroes = [tuple(bool(m >> sidx & 1) for m in self.mascaras) for sidx in range(self.semanas)]
+
+    def _calcular_mascara(self, k, deslocamento):
+        unidade, intervalo = REGRAS_FREQUENCIA[FREQUENCIA_DA_CLASSE[k]]
+        mascara = 0
+        for sidx in range(self.semanas):
+            if unidade == "semanas":
+                ativa = (sidx - deslocamento) % intervalo == 0
+            else:
+                ordem = self._ordem_mes[sidx]
+                ativa = ordem >= 0 and (ordem - deslocamento) % intervalo == 0
+            if ativa:
+                mascara |= 1 << sidx
+        return mascara
+
+    def __len__(self):
+        return self.semanas
+
+    def mascara(self, k, deslocamento=0):
+        """Máscara de semanas da classe k com a cadência deslocada em 'deslocamento' (semanas ou meses)."""
+        if deslocamento == 0:
+            return self.mascaras[k]
+        chave = (k, deslocamento)
+        if chave not in self._deslocadas:
+            self._deslocadas[chave] = self._calcular_mascara(k, deslocamento)  # idempotente entre threads
+        return self._deslocadas[chave]
+
+    def padroes_de(self, cadencias):
+        """Padrão de cada semana (tupla de bools) para a lista de cadências (classe, deslocamento)."""
+        mascaras = [self.mascara(k, deslocamento) for k, deslocamento in cadencias]
+        return [tuple(bool(m >> sidx & 1) for m in mascaras) for sidx in range(self.semanas)]
+
+    def ativa(self, frequencia, sidx, deslocamento=0):
+        """True se um cliente com esta frequência tem visita na semana 'sidx' (False se desconhecida)."""
+        k = CLASSE_FREQUENCIA.get(frequencia, -1)
+        return k >= 0 and bool(self.mascara(k, deslocamento) >> sidx & 1)
+
+    def semanas_da_frequencia(self, frequencia, deslocamento=0):
+        """Índices das semanas com visita para a frequência (lista vazia se desconhecida)."""
+        k = CLASSE_FREQUENCIA.get(frequencia, -1)
+        mascara = self.mascara(k, deslocamento) if k >= 0 else 0
+        return [sidx for sidx in range(self.semanas) if mascara >> sidx & 1]
+
+    def rotulo(self, sidx):
+        return rotulo_semana(sidx, self.inicios[sidx])
+
+@functools.lru_cache(maxsize=64)
+def calendario_visitas(inicio, semanas):
+    """CalendarioVisitas do horizonte, calculado uma vez por (inicio, semanas) e compartilhado (somente leitura)."""
+    return CalendarioVisitas(inicio, semanas)
+
+# -------------------------------
+# Alertas estruturados
+# -------------------------------
+TIPOS_ALERTA = [
+    "cadastro_incompleto", "dia_invalido", "frequencia_desconhecida",
+    "sobrecarga", "desequilibrio_dia", "desequilibrio_semana", "duplicacao", "jornada_excedida",
+]
+IDX_TIPO_ALERTA = {t: i for i, t in enumerate(TIPOS_ALERTA)}
+SEVERIDADE_ALERTA = {t: ("erro" if t in ("sobrecarga", "jornada_excedida") else "aviso") for t in TIPOS_ALERTA}
+ICONE_SEVERIDADE = {"erro": "🚨", "aviso": "⚠️"}
+_QUALQUER = object()  # filtro ausente (rota None é um valor válido: agenda com todas as rotas)
+
+class TabelaAlertas:
+    """
+    Alertas como registros compactos: colunas numéricas em array.array, referências ao
+    cliente/rota em listas e índices de linhas por severidade, rota e semana.
+    O texto só é montado em texto(i), para as linhas efetivamente exibidas ou exportadas;
+    iterar a tabela produz os textos na ordem de inserção (mesmo formato das mensagens antigas).
+    """
+
+    def __init__(self):
+        self.tipo = array("b")
+        self.semana = array("i")       # índice da semana (-1 = não se aplica)
+        self.dia = array("b")          # índice em DIAS_SEMANA (-1 = não se aplica)
+        self.qtd = array("i")          # carga do dia, carga máxima no desequilíbrio semanal ou minutos da jornada
+        self.qtd_min = array("i")      # carga mínima no desequilíbrio semanal (visitas do dia na jornada)
+        self.capacidade = array("i")   # capacidade por dia (ou jornada máxima, em minutos)
+        self.limiar = array("h")       # limiar em % (desequilíbrio por dia)
+        self.rota = []
+        self.cliente = []              # referência ao dict do cliente (alertas de cadastro)
+        self.rotulos_semana = {}       # índice -> rótulo "Semana N (...)"
+        self._ids_duplicados = {}      # linha -> lista de ids (raro)
+        self._por_severidade = {}
+        self._por_rota = {}
+        self._por_semana = {}
+
+    def __len__(self):
+        return len(self.tipo)
+
+    def __iter__(self):
+        return (self.texto(i) for i in range(len(self)))
+
+    def adicionar(self, tipo, semana=-1, dia=-1, rota=None, cliente=None, qtd=0, qtd_min=0,
+                  capacidade=0, limiar=0, ids=None):
+        i = len(self.tipo)
+        self.tipo.append(IDX_TIPO_ALERTA[tipo])
+        self.semana.append(semana)
+        self.dia.append(dia)
+        self.qtd.append(qtd)
+        self.qtd_min.append(qtd_min)
+        self.capacidade.append(capacidade)
+        self.limiar.append(limiar)
+        self.rota.append(rota)
+        self.cliente.append(cliente)
+        if ids is not None:
+            self._ids_duplicados[i] = ids
+        self._por_severidade.setdefault(SEVERIDADE_ALERTA[tipo], array("i")).append(i)
+        self._por_rota.setdefault(rota, array("i")).append(i)
+        if semana >= 0:
+            self._por_semana.setdefault(semana, array("i")).append(i)
+        return i
+
+    def estender(self, outra):
+        """Acrescenta as linhas de outra tabela (ex.: resultados de várias rotas)."""
+        for i in range(len(outra)):
+            self.adicionar(TIPOS_ALERTA[outra.tipo[i]], outra.semana[i], outra.dia[i], outra.rota[i],
+                           outra.cliente[i], outra.qtd[i], outra.qtd_min[i], outra.capacidade[i],
+                           outra.limiar[i], outra._ids_duplicados.get(i))
+        for sidx, rotulo in outra.rotulos_semana.items():
+            self.rotulos_semana.setdefault(sidx, rotulo)
+        return self
+
+    def tipo_de(self, i):
+        return TIPOS_ALERTA[self.tipo[i]]
+
+    def severidade(self, i):
+        return SEVERIDADE_ALERTA[TIPOS_ALERTA[self.tipo[i]]]
+
+    def filtrar(self, severidade=None, rota=_QUALQUER, semana=None):
+        """Linhas (em ordem de inserção) que atendem a todos os filtros informados, via índices."""
+        candidatas = []
+        if severidade is not None:
+            candidatas.append(self._por_severidade.get(severidade, ()))
+        if rota is not _QUALQUER:
+            candidatas.append(self._por_rota.get(rota, ()))
+        if semana is not None:
+            candidatas.append(self._por_semana.get(semana, ()))
+        if not candidatas:
+            return list(range(len(self)))
+        menor = min(candidatas, key=len)
+        return [
+            i for i in menor
+            if (severidade is None or self.severidade(i) == severidade)
+            and (rota is _QUALQUER or self.rota[i] == rota)
+            and (semana is None or self.semana[i] == semana)
+        ]
+
+    def contagem_por_severidade(self):
+        return {sev: len(linhas) for sev, linhas in self._por_severidade.items()}
+
+    def contagem_por_tipo(self):
+        return {TIPOS_ALERTA[k]: n for k, n in Counter(self.tipo).items()}
+
+    def texto(self, i):
+        tipo = TIPOS_ALERTA[self.tipo[i]]
+        icone = ICONE_SEVERIDADE[SEVERIDADE_ALERTA[tipo]]
+        c = self.cliente[i]
+        if tipo == "cadastro_incompleto":
+            return f"{icone} Cadastro incompleto: {c.get('nome','(sem nome)')} (rota {c.get('rota','?')})"
+        if tipo == "dia_invalido":
+            return f"{icone} Dia inválido para {c.get('nome')} (recebido: {c.get('dia_semana')})"
+        if tipo == "frequencia_desconhecida":
+            return f"{icone} Frequência desconhecida ({c.get('frequencia')}) para {c.get('nome','(sem nome)')}"
+
+        semana_id = self.rotulos_semana.get(self.semana[i], f"Semana {self.semana[i] + 1}")
+        dia = DIAS_SEMANA[self.dia[i]] if self.dia[i] >= 0 else ""
+        if tipo == "sobrecarga":
+            return f"{icone} Sobrecarga em {semana_id} {dia}: {self.qtd[i]} clientes (capacidade {self.capacidade[i]})"
+        if tipo == "desequilibrio_dia":
+            return (f"{icone} Desequilíbrio em {semana_id} {dia}: apenas {self.qtd[i]} clientes "
+                    f"(<{self.limiar[i]}% da capacidade)")
+        if tipo == "desequilibrio_semana":
+            return (f"{icone} Desequilíbrio semanal em {semana_id}: max {self.qtd[i]} vs min {self.qtd_min[i]} "
+                    f"(capacidade {self.capacidade[i]})")
+        if tipo == "jornada_excedida":
+            return (f"{icone} Jornada excedida em {semana_id} {dia}: {self.qtd[i]} min para {self.qtd_min[i]} visitas "
+                    f"(limite {self.capacidade[i]} min)")
+        return f"{icone} Duplicação detectada em {semana_id} {dia}: IDs {self._ids_duplicados.get(i, [])}"
+
+    def textos(self, linhas):
+        return [self.texto(i) for i in linhas]
+
+def alertas_capacidade(alertas, sidx, cargas, capacidade_por_dia, limiar_dia_pct=0.5, limiar_semana_pct=0.3, rota=None):
+    """Registra alertas de sobrecarga/desequilíbrio a partir das cargas {dia: qtd} da semana 'sidx'."""
+    max_dia = max(cargas.values()) if cargas else 0
+    min_dia = min(cargas.values()) if cargas else 0
+
+    for dia, qtd in cargas.items():
+        if qtd > capacidade_por_dia:
+            alertas.adicionar("sobrecarga", sidx, MAPA_DIA_IDX[dia], rota, qtd=qtd, capacidade=capacidade_por_dia)
+        elif qtd > 0 and qtd < int(capacidade_por_dia * limiar_dia_pct):
+            alertas.adicionar("desequilibrio_dia", sidx, MAPA_DIA_IDX[dia], rota, qtd=qtd,
+                              capacidade=capacidade_por_dia, limiar=int(limiar_dia_pct * 100))
+
+    if max_dia - min_dia > int(capacidade_por_dia * limiar_semana_pct):
+        alertas.adicionar("desequilibrio_semana", sidx, -1, rota, qtd=max_dia, qtd_min=min_dia,
+                          capacidade=capacidade_por_dia)
+    return alertas
+
+class PainelCargas:
+    """
+    Cargas e alertas de capacidade/duplicação mantidos a cada visita incluída, removida ou movida, sem varrer
+    as listas da agenda. Por semana (rótulo): a carga de cada dia, o histograma das cargas (máximo e mínimo em
+    O(1) por movimento), os dias acima da capacidade ou abaixo do limiar do dia e os ids repetidos em um dia.
+    Os ids da semana ficam num mapa {id: máscara de dias} que pode ser compartilhado (somente leitura) entre
+    semanas com os mesmos clientes; cada semana guarda à parte só os ids alterados.
+    """
+
+    def __init__(self, capacidade_por_dia, limiar_dia_pct=0.5, limiar_semana_pct=0.3):
+        self.capacidade_por_dia = capacidade_por_dia
+        self.limiar_dia_pct = limiar_dia_pct
+        self.limiar_semana_pct = limiar_semana_pct
+        self._minimo_dia = int(capacidade_por_dia * limiar_dia_pct)
+        self.cargas = {}               # semana -> [qtd por dia]
+        self._histograma = {}          # semana -> {qtd: nº de dias}
+        self._extremos = {}            # semana -> [máximo, mínimo]
+        self._ids = {}                 # semana -> {id: máscara de dias} (compartilhado)
+        self._ids_alterados = {}       # semana -> {id: máscara de dias} dos ids alterados após o registro
+        self.repetidos = {}            # (semana, dia) -> Counter(id -> visitas além da primeira)
+        self.sobrecarregados = set()   # (semana, dia) acima da capacidade
+        self.subcarregados = set()     # (semana, dia) com 0 < carga < limiar do dia
+
+    @staticmethod
+    def mapear(dias):
+        """(cargas, {id: máscara de dias}, {dia: Counter de repetidos}) a partir das listas de uma semana."""
+        ids, repetidos = {}, {}
+        for d, dia in enumerate(DIAS_SEMANA):
+            bit = 1 << d
+            for c in dias[dia]:
+                cliente_id = c.get("id")
+                mascara = ids.get(cliente_id, 0)
+                if mascara & bit:
+                    repetidos.setdefault(d, Counter())[cliente_id] += 1
+                else:
+                    ids[cliente_id] = mascara | bit
+        return [len(dias[dia]) for dia in DIAS_SEMANA], ids, repetidos
+
+    @classmethod
+    def de_agenda(cls, agenda, capacidade_por_dia, limiar_dia_pct=0.5, limiar_semana_pct=0.3):
+        """Painel de uma agenda já montada; semanas com as mesmas listas são varridas uma única vez."""
+        painel = cls(capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+        mapas = {}
+        for semana_id, dias in agenda.items():
+            chave = tuple(id(dias[dia]) for dia in DIAS_SEMANA)
+            if chave not in mapas:
+                mapas[chave] = cls.mapear(dias)
+            painel.registrar_semana(semana_id, *mapas[chave])
+        return painel
+
+    def registrar_semana(self, semana_id, cargas, ids=None, repetidos=None):
+        """
+        Registra (ou substitui) a semana com as cargas por dia e o mapa {id: máscara de dias}, que não é
+        copiado nem modificado. 'repetidos' ({dia: Counter}) traz as visitas repetidas já encontradas.
+        """
+        self._ids[semana_id] = {} if ids is None else ids
+        self._ids_alterados[semana_id] = {}
+        for d in range(len(cargas)):
+            self.repetidos.pop((semana_id, d), None)
+        for d, contagem in (repetidos or {}).items():
+            if contagem:
+                self.repetidos[(semana_id, d)] = Counter(contagem)
+        self._definir_cargas(semana_id, cargas)
+
+    def _definir_cargas(self, semana_id, cargas):
+        self.cargas[semana_id] = list(cargas)
+        self._histograma[semana_id] = dict(Counter(cargas))
+        self._extremos[semana_id] = [max(cargas, default=0), min(cargas, default=0)]
+        for d, qtd in enumerate(cargas):
+            self._classificar(semana_id, d, qtd)
+
+    def recorte(self, semanas):
+        """Cópia independente com as semanas informadas; os mapas compartilhados de ids não são copiados."""
+        copia = PainelCargas(self.capacidade_por_dia, self.limiar_dia_pct, self.limiar_semana_pct)
+        semanas = [s for s in semanas if s in self.cargas]
+        for semana_id in semanas:
+            copia.cargas[semana_id] = list(self.cargas[semana_id])
+            copia._histograma[semana_id] = dict(self._histograma[semana_id])
+            copia._extremos[semana_id] = list(self._extremos[semana_id])
+            copia._ids[semana_id] = self._ids[semana_id]
+            copia._ids_alterados[semana_id] = dict(self._ids_alterados[semana_id])
+            for d in range(len(DIAS_SEMANA)):
+                if (semana_id, d) in self.repetidos:
+                    copia.repetidos[(semana_id, d)] = Counter(self.repetidos[(semana_id, d)])
+        semanas = set(semanas)
+        copia.sobrecarregados = {chave for chave in self.sobrecarregados if chave[0] in semanas}
+        copia.subcarregados = {chave for chave in self.subcarregados if chave[0] in semanas}
+        return copia
+
+    def _mascara(self, semana_id, cliente_id):
+        alterados = self._ids_alterados[semana_id]
+        if cliente_id in alterados:
+            return alterados[cliente_id]
+        return self._ids[semana_id].get(cliente_id, 0)
+
+    def contem(self, semana_id, d, cliente_id):
+        """True se o cliente tem visita no dia 'd' (índice) da semana."""
+        return semana_id in self.cargas and bool(self._mascara(semana_id, cliente_id) >> d & 1)
+
+    def adicionar(self, semana_id, d, cliente_id):
+        """Inclui uma visita; retorna False se o cliente já tinha visita no dia (fica registrada como repetida)."""
+        if semana_id not in self.cargas:
+            self.registrar_semana(semana_id, [0] * len(DIAS_SEMANA))
+        mascara = self._mascara(semana_id, cliente_id)
+        nova = not mascara >> d & 1
+        if nova:
+            self._ids_alterados[semana_id][cliente_id] = mascara | 1 << d
+        else:
+            self._repetir(semana_id, d, cliente_id)
+        self._ajustar(semana_id, d, 1)
+        return nova
+
+    def remover(self, semana_id, d, cliente_id):
+        """Retira uma visita do cliente no dia 'd' (primeiro as repetidas)."""
+        if not self._desrepetir(semana_id, d, cliente_id):
+            self._ids_alterados[semana_id][cliente_id] = self._mascara(semana_id, cliente_id) & ~(1 << d)
+        self._ajustar(semana_id, d, -1)
+
+    def mover(self, semana_id, origem, destino, cliente_id):
+        """Move uma visita entre dias (índices); retorna False se ela repetiu o cliente no destino."""
+        if (semana_id, origem) in self.repetidos:
+            self.remover(semana_id, origem, cliente_id)
+            return self.adicionar(semana_id, destino, cliente_id)
+        # Caminho comum (chamado a cada movimento da redistribuição): sem repetidos na origem
+        alterados = self._ids_alterados[semana_id]
+        mascara = alterados[cliente_id] if cliente_id in alterados else self._ids[semana_id].get(cliente_id, 0)
+        mascara &= ~(1 << origem)
+        nova = not mascara >> destino & 1
+        alterados[cliente_id] = mascara | 1 << destino
+        if not nova:
+            self._repetir(semana_id, destino, cliente_id)
+        self._ajustar(semana_id, origem, -1)
+        self._ajustar(semana_id, destino, 1)
+        return nova
+
+    def aplicar_semana(self, semana_id, cargas, movimentos):
+        """
+        Aplica de uma vez os movimentos [(id, origem, destino)] de uma semana já registrada, cujas cargas
+        finais são 'cargas': O(1) por movimento e O(dias) para cargas e extremos, em vez de mover() a cada um.
+        """
+        if any((semana_id, d) in self.repetidos for d in range(len(cargas))):
+            for cliente_id, origem, destino in movimentos:
+                self.mover(semana_id, origem, destino, cliente_id)
+            return
+        alterados = self._ids_alterados[semana_id]
+        ids = self._ids[semana_id]
+        repetiu = False
+        for cliente_id, origem, destino in movimentos:
+            mascara = alterados[cliente_id] if cliente_id in alterados else ids.get(cliente_id, 0)
+            # Depois que o lote repete um cliente, a saída pode ser dessa visita repetida (o dia continua na máscara)
+            if not (repetiu and self._desrepetir(semana_id, origem, cliente_id)):
+                mascara &= ~(1 << origem)
+            if mascara >> destino & 1:
+                self._repetir(semana_id, destino, cliente_id)
+                repetiu = True
+            alterados[cliente_id] = mascara | 1 << destino
+        self._definir_cargas(semana_id, cargas)
+
+    def _repetir(self, semana_id, d, cliente_id):
+        chave = (semana_id, d)
+        if chave not in self.repetidos:
+            self.repetidos[chave] = Counter()
+        self.repetidos[chave][cliente_id] += 1
+
+    def _desrepetir(self, semana_id, d, cliente_id):
+        """Retira uma visita repetida do cliente no dia, se houver; retorna False se não havia."""
+        chave = (semana_id, d)
+        repetidos = self.repetidos.get(chave)
+        if not repetidos or cliente_id not in repetidos:
+            return False
+        repetidos[cliente_id] -= 1
+        if not repetidos[cliente_id]:
+            del repetidos[cliente_id]
+            if not repetidos:
+                del self.repetidos[chave]
+        return True
+
+    def _ajustar(self, semana_id, d, delta):
+        cargas = self.cargas[semana_id]
+        histograma = self._histograma[semana_id]
+        extremos = self._extremos[semana_id]
+        antes = cargas[d]
+        depois = cargas[d] = antes + delta
+        if histograma[antes] == 1:
+            del histograma[antes]
+        else:
+            histograma[antes] -= 1
+        histograma[depois] = histograma.get(depois, 0) + 1
+        # As cargas mudam de uma em uma: um extremo só anda quando o último dia com aquela carga sai dela
+        if depois > extremos[0] or (antes == extremos[0] and antes not in histograma):
+            extremos[0] = depois
+        if depois < extremos[1] or (antes == extremos[1] and antes not in histograma):
+            extremos[1] = depois
+        # Os conjuntos só mudam quando a carga cruza a capacidade ou o limiar do dia
+        if (antes > self.capacidade_por_dia) != (depois > self.capacidade_por_dia) or \
+                (0 < antes < self._minimo_dia) != (0 < depois < self._minimo_dia):
+            self._classificar(semana_id, d, depois)
+
+    def _faixa(self, qtd):
+        return 2 if qtd > self.capacidade_por_dia else 1 if 0 < qtd < self._minimo_dia else 0
+
+    def _classificar(self, semana_id, d, qtd):
+        chave = (semana_id, d)
+        self.sobrecarregados.discard(chave)
+        self.subcarregados.discard(chave)
+        faixa = self._faixa(qtd)
+        if faixa == 2:
+            self.sobrecarregados.add(chave)
+        elif faixa == 1:
+            self.subcarregados.add(chave)
+
+    def maximo(self, semana_id):
+        return self._extremos[semana_id][0]
+
+    def minimo(self, semana_id):
+        return self._extremos[semana_id][1]
+
+    def registrar_alertas(self, alertas, indice_semana, freq_desconhecida=(), rota=None):
+        """
+        Registra em 'alertas' os alertas semanais das semanas de 'indice_semana' ({semana_id: índice}, em ordem),
+        na mesma ordem de alertas_agenda, só a partir dos contadores (O(dias) por semana).
+        """
+        limite_semana = int(self.capacidade_por_dia * self.limiar_semana_pct)
+        for semana_id, sidx in indice_semana.items():
+            alertas.rotulos_semana[sidx] = semana_id
+            for c in freq_desconhecida:
+                alertas.adicionar("frequencia_desconhecida", sidx, rota=c.get("rota"), cliente=c)
+            for d, qtd in enumerate(self.cargas[semana_id]):
+                if (semana_id, d) in self.sobrecarregados:
+                    alertas.adicionar("sobrecarga", sidx, d, rota, qtd=qtd, capacidade=self.capacidade_por_dia)
+                elif (semana_id, d) in self.subcarregados:
+                    alertas.adicionar("desequilibrio_dia", sidx, d, rota, qtd=qtd, capacidade=self.capacidade_por_dia,
+                                      limiar=int(self.limiar_dia_pct * 100))
+            maximo, minimo = self._extremos[semana_id]
+            if maximo - minimo > limite_semana:
+                alertas.adicionar("desequilibrio_semana", sidx, -1, rota, qtd=maximo, qtd_min=minimo,
+                                  capacidade=self.capacidade_por_dia)
+            for d in range(len(DIAS_SEMANA)):
+                repetidos = self.repetidos.get((semana_id, d))
+                if repetidos:
+                    alertas.adicionar("duplicacao", sidx, d, rota, ids=list(repetidos))
+        return alertas
+
+# -------------------------------
+# Função de geração de agenda (com proteção contra duplicações)
+# -------------------------------
+def validar_cadastro(base, alertas=None):
+    """
+    Registra os alertas que dependem só do cadastro e retorna (alertas, clientes com frequência
+    desconhecida). Estes últimos geram um alerta por semana, em alertas_agenda.
+    """
+    if alertas is None:
+        alertas = TabelaAlertas()
+    freq_desconhecida = []
+    for c in base:
+        if not c.get("dia_semana") or not c.get("frequencia"):
+            alertas.adicionar("cadastro_incompleto", rota=c.get("rota"), cliente=c)
+        if not dias_do_padrao(c.get("dia_semana")):
+            alertas.adicionar("dia_invalido", rota=c.get("rota"), cliente=c)
+        elif c.get("frequencia") and c.get("frequencia") not in CLASSE_FREQUENCIA:
+            freq_desconhecida.append(c)
+    return alertas, freq_desconhecida
+
+@instrumentado("montar_buckets")
+def montar_buckets(inicio, semanas, base, compartilhar=False, painel=None):
+    """
+    Distribui os clientes (já deduplicados/filtrados) nas semanas e dias, sem gerar alertas.
+    As regras de frequência vêm do calendário de visitas: os clientes são agrupados por cadência
+    (classe, deslocamento) e a lista de cada dia é montada uma vez por padrão de semana (cadências
+    ativas) e copiada para as semanas com esse padrão. Clientes com vários dias entram em cada um deles.
+    Com compartilhar=True não há cópias: semanas com o mesmo padrão recebem o mesmo dict de dias
+    (somente leitura), e a memória passa a depender do número de padrões e não do de semanas.
+    Com 'painel' (PainelCargas), cada semana é registrada com as cargas e o mapa de ids do seu padrão.
+    """
+    calendario = calendario_visitas(inicio, semanas)
+
+    # Visitas válidas por dia, com o índice da cadência do cliente, em ordem de cadastro
+    cadencias = {}
+    por_dia = {dia: [] for dia in DIAS_SEMANA}
+    for c in base:
+        dias = dias_do_padrao(c.get("dia_semana"))
+        cadencia = cadencia_cliente(c) if dias else None
+        if cadencia is None:
+            continue
+        j = cadencias.setdefault(cadencia, len(cadencias))
+        for d in dias:
+            por_dia[DIAS_SEMANA[d]].append((j, c))
+
+    agenda = {}
+    padroes = {}
+    for sidx, padrao in enumerate(calendario.padroes_de(list(cadencias))):
+        if padrao not in padroes:
+            dias = {}
+            ids = {}  # id -> máscara dos dias em que o cliente já entrou: garante a não-duplicação
+            for d, (dia, lst) in enumerate(por_dia.items()):
+                bit = 1 << d
+                dias[dia] = []
+                for k, c in lst:
+                    if padrao[k] and not ids.get(c.get("id"), 0) & bit:
+                        dias[dia].append(copiar_cliente(c))
+                        ids[c.get("id")] = ids.get(c.get("id"), 0) | bit
+            padroes[padrao] = (dias, ids, [len(lst) for lst in dias.values()])
+        dias, ids, cargas = padroes[padrao]
+        semana_id = calendario.rotulo(sidx)
+        if painel is not None:
+            painel.registrar_semana(semana_id, cargas, ids)
+        if compartilhar:
+            agenda[semana_id] = dias
+            continue
+        # Usar cópias para evitar efeitos colaterais em redistribuição
+        agenda[semana_id] = {dia: [dict(c) for c in lst] for dia, lst in dias.items()}
+    return agenda
+
+@instrumentado("alertas_agenda")
+def alertas_agenda(agenda, freq_desconhecida, capacidade_por_dia, limiar_dia_pct=0.5, limiar_semana_pct=0.3,
+                   alertas=None, rota=None, indice_semana=None, painel=None):
+    """
+    Registra os alertas semanais (frequência, capacidade/desequilíbrio e duplicação) de uma agenda montada.
+    'indice_semana' ({semana_id: índice}) mantém a numeração da agenda completa quando 'agenda' é um recorte.
+    Com 'painel' (PainelCargas da agenda, com a mesma capacidade e limiares), as listas não são varridas;
+    sem ele, um painel é montado a partir da agenda.
+    """
+    if alertas is None:
+        alertas = TabelaAlertas()
+    if painel is None:
+        painel = PainelCargas.de_agenda(agenda, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+    indice = {semana_id: indice_semana[semana_id] if indice_semana else pos for pos, semana_id in enumerate(agenda)}
+    return painel.registrar_alertas(alertas, indice, freq_desconhecida, rota)
+
+@instrumentado("gerar_agenda")
+def gerar_agenda(inicio, semanas, clientes, capacidade_por_dia, rota=None,
+                 limiar_dia_pct=0.5, limiar_semana_pct=0.3):
+    # Dedupe clientes por id antes de usar
+    base_total = dedupe_clientes(clientes)
+    base = [c for c in base_total if (rota is None or c.get("rota") == rota)]
+
+    resumo = {"total_clientes": len(base), "semanas": semanas, "capacidade_por_dia": capacidade_por_dia}
+
+    # Validação de cadastro
+    alertas, freq_desconhecida = validar_cadastro(base)
+
+    # Agenda por semanas; o painel acompanha as cargas para os alertas e a redistribuição
+    painel = PainelCargas(capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+    agenda = montar_buckets(inicio, semanas, base, painel=painel)
+    alertas_agenda(agenda, freq_desconhecida, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct,
+                   alertas=alertas, rota=rota, painel=painel)
+    resumo["painel"] = painel
+
+    return agenda, alertas, resumo
+
+# -------------------------------
+# Agenda compacta (índices inteiros de semana e dia)
+# -------------------------------
+class AgendaCompacta:
+    """
+    Agenda indexada por inteiros: visitas[semana][dia] é um array de posições em 'clientes'.
+    As datas de início das semanas são calculadas uma única vez e os rótulos "Semana N (...)"
+    só são montados na exibição. As contagens por frequência de cada dia são mantidas na inserção.
+    """
+
+    def __init__(self, inicio, semanas, clientes):
+        self.inicio = inicio
+        self.inicios = [inicio + timedelta(weeks=sidx) for sidx in range(semanas)]
+        self.clientes = clientes
+        self.visitas = [[array("i") for _ in DIAS_SEMANA] for _ in range(semanas)]
+        self.contagens = [[Counter() for _ in DIAS_SEMANA] for _ in range(semanas)]  # frequência -> qtd
+
+    @classmethod
+    def de_agenda(cls, agenda, inicio, clientes):
+        """Converte uma agenda em dicts (gerar_agenda/redistribuição); 'clientes' deve conter todos os ids da agenda."""
+        posicao = {c.get("id"): p for p, c in enumerate(clientes)}
+        compacta = cls(inicio, len(agenda), clientes)
+        for sidx, dias in enumerate(agenda.values()):
+            for d, dia in enumerate(DIAS_SEMANA):
+                for c in dias[dia]:
+                    compacta.adicionar(sidx, d, posicao[c["id"]])
+        return compacta
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def adicionar(self, sidx, d, pos):
+        self.visitas[sidx][d].append(pos)
+        self.contagens[sidx][d][self.clientes[pos].get("frequencia")] += 1
+
+    def rotulo(self, sidx):
+        return rotulo_semana(sidx, self.inicios[sidx])
+
+    def data(self, sidx, d):
+        return self.inicios[sidx] + timedelta(days=d)
+
+    def semanas_entre(self, data_ini, data_fim):
+        """Índices das semanas cujo início está em [data_ini, data_fim] (busca binária)."""
+        return range(bisect_left(self.inicios, data_ini), bisect_right(self.inicios, data_fim))
+
+    def carga(self, sidx, d):
+        return len(self.visitas[sidx][d])
+
+    def contagem_frequencia(self, sidx, d, frequencia):
+        return self.contagens[sidx][d][frequencia]
+
+    def ids(self, sidx, d):
+        return [self.clientes[p].get("id") for p in self.visitas[sidx][d]]
+
+    def para_dicts(self, semanas=None):
+        """Agenda no formato de gerar_agenda (cópias dos clientes), para as semanas indicadas (padrão: todas)."""
+        semanas = range(len(self)) if semanas is None else semanas
+        return {
+            self.rotulo(sidx): {
+                dia: [copiar_cliente(self.clientes[p]) for p in self.visitas[sidx][d]]
+                for d, dia in enumerate(DIAS_SEMANA)
+            }
+            for sidx in semanas
+        }
+
+# -------------------------------
+# Motor vetorizado (NumPy) para bases grandes
+# -------------------------------
+def clientes_para_colunas(clientes):
+    """
+    Converte a lista de clientes (já deduplicada por id) em arrays colunares.
+    'registros' guarda os dicts originais para materialização e mensagens; "dias" é a máscara
+    de bits dos dias de visita (0 = dia inválido) e "deslocamento" já vem normalizado pela cadência.
+    """
+    import numpy as np
+
+    registros = list(clientes)
+    n = len(registros)
+    ids = np.empty(n, dtype=object)
+    rotas = np.empty(n, dtype=object)
+    dias = np.zeros(n, dtype=np.uint8)
+    classe = np.full(n, -1, dtype=np.int8)
+    deslocamento = np.zeros(n, dtype=np.int8)
+    completo = np.zeros(n, dtype=bool)
+    for i, c in enumerate(registros):
+        dia = c.get("dia_semana")
+        freq = c.get("frequencia")
+        ids[i] = c.get("id")
+        rotas[i] = c.get("rota")
+        for d in dias_do_padrao(dia):
+            dias[i] |= 1 << d
+        cadencia = cadencia_cliente(c) if freq else None
+        if cadencia is not None:
+            classe[i], deslocamento[i] = cadencia
+        completo[i] = bool(dia) and bool(freq)
+    return {"registros": registros, "id": ids, "rota": rotas, "dias": dias,
+            "classe": classe, "deslocamento": deslocamento, "completo": completo}
+
+@instrumentado("gerar_agenda_vetorizada")
+def gerar_agenda_vetorizada(inicio, semanas, clientes, capacidade_por_dia, rota=None,
+                            limiar_dia_pct=0.5, limiar_semana_pct=0.3):
+    """
+    Mesmo contrato de gerar_agenda, mas cada dia da agenda é um array de índices
+    (posições em resumo["colunas"]["registros"]) em vez de cópias dos clientes.
+    A máscara de inclusão é calculada uma vez por cadência (classe, deslocamento) e dia; semanas com o
+    mesmo padrão do calendário de visitas compartilham os mesmos arrays (somente leitura).
+    """
+    import numpy as np
+
+    colunas = clientes_para_colunas(dedupe_clientes(clientes))
+    if rota is not None:
+        sel = np.flatnonzero(colunas["rota"] == rota)
+        colunas = {k: ([v[i] for i in sel] if k == "registros" else v[sel]) for k, v in colunas.items()}
+    registros = colunas["registros"]
+
+    agenda = {}
+    alertas = TabelaAlertas()
+    resumo = {"total_clientes": len(registros), "semanas": semanas,
+              "capacidade_por_dia": capacidade_por_dia, "colunas": colunas}
+
+    # Validação de cadastro (somente os registros problemáticos são visitados)
+    problemas = np.flatnonzero(~colunas["completo"] | (colunas["dias"] == 0))
+    for i in problemas:
+        c = registros[i]
+        if not colunas["completo"][i]:
+            alertas.adicionar("cadastro_incompleto", rota=c.get("rota"), cliente=c)
+        if colunas["dias"][i] == 0:
+            alertas.adicionar("dia_invalido", rota=c.get("rota"), cliente=c)
+
+    # Clientes válidos com frequência fora de REGRAS_FREQUENCIA: alerta repetido a cada semana
+    validos = (colunas["dias"] > 0) & colunas["completo"]
+    freq_desconhecida = [registros[i] for i in np.flatnonzero(validos & (colunas["classe"] < 0))]
+
+    # Índices por (cadência, dia), em ordem de cadastro; um cliente com vários dias entra em cada um
+    conhecidos = validos & (colunas["classe"] >= 0)
+    cadencias = sorted(set(zip(colunas["classe"][conhecidos].tolist(), colunas["deslocamento"][conhecidos].tolist())))
+    por_cadencia_dia = [
+        [np.flatnonzero(conhecidos & (colunas["classe"] == k) & (colunas["deslocamento"] == deslocamento)
+                        & ((colunas["dias"] >> d) & 1).astype(bool))
+         for d in range(len(DIAS_SEMANA))]
+        for k, deslocamento in cadencias
+    ]
+    padroes = {}
+    calendario = calendario_visitas(inicio, semanas)
+
+    for sidx, ativas in enumerate(calendario.padroes_de(cadencias)):
+        semana_id = calendario.rotulo(sidx)
+
+        if ativas not in padroes:
+            dias_padrao = {}
+            for d, dia in enumerate(DIAS_SEMANA):
+                partes = [por_cadencia_dia[j][d] for j in range(len(ativas)) if ativas[j]]
+                idx = np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.intp)
+                idx.flags.writeable = False
+                dias_padrao[dia] = idx
+            padroes[ativas] = dias_padrao
+        agenda[semana_id] = dict(padroes[ativas])
+
+        alertas.rotulos_semana[sidx] = semana_id
+        for c in freq_desconhecida:
+            alertas.adicionar("frequencia_desconhecida", sidx, rota=c.get("rota"), cliente=c)
+        cargas = {dia: len(idx) for dia, idx in agenda[semana_id].items()}
+        alertas_capacidade(alertas, sidx, cargas, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct, rota)
+        # Sem verificação de duplicação: após dedupe_clientes cada id aparece no máximo uma vez por dia
+
+    return agenda, alertas, resumo
+
+def materializar_agenda(agenda, colunas):
+    """Converte uma agenda de índices (motor vetorizado) no formato de dicts de gerar_agenda."""
+    registros = colunas["registros"]
+    return {
+        semana_id: {dia: [copiar_cliente(registros[i]) for i in idx] for dia, idx in dias.items()}
+        for semana_id, dias in agenda.items()
+    }
+
+# -------------------------------
+# Cache incremental da agenda (entre reruns do Streamlit)
+# -------------------------------
+CACHE_MAX_ENTRADAS = 512
+
+class CacheLRU:
+    """
+    Cache com número máximo de entradas; descarta o item usado há mais tempo.
+    Pode ser usado por várias threads: o cálculo de um valor ausente acontece fora do lock.
+    """
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.faltas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def obter(self, chave, calcular, rotas=None):
+        """
+        Retorna o valor da chave, calculando (e guardando) com 'calcular()' se ausente.
+        'rotas' (rotas de que o valor depende) só é usado pelo CacheCompartilhado.
+        """
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                INSTRUMENTACAO.contar("cache.acertos")
+                return self._itens[chave]
+            self.faltas += 1
+        INSTRUMENTACAO.contar("cache.faltas")
+        valor = calcular()
+        with self._lock:
+            self._itens[chave] = valor
+            while len(self._itens) > self.max_entradas:
+                self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+def hash_clientes(clientes):
+    """Hash de conteúdo dos campos usados na geração da agenda."""
+    h = hashlib.blake2b(digest_size=16)
+    for c in clientes:
+        h.update(repr(tuple(c.get(k) for k in CAMPOS_CLIENTE + CAMPOS_COORDENADAS + CAMPOS_PADRAO)).encode())
+    return h.hexdigest()
+
+@instrumentado("gerar_agenda_cacheada")
+def gerar_agenda_cacheada(inicio, semanas, clientes, capacidade_por_dia, rota=None,
+                          limiar_dia_pct=0.5, limiar_semana_pct=0.3, cache=None):
+    """
+    Mesmo resultado de gerar_agenda, reaproveitando cálculos anteriores guardados em 'cache'
+    (resumo["agenda_compacta"] traz também a AgendaCompacta equivalente).
+    Os buckets (semana x dia) são guardados por rota e hash do conteúdo da rota: ao cadastrar
+    ou importar clientes, só as rotas alteradas são remontadas. O resultado é compartilhado
+    com o cache e não deve ser modificado: redistribuir_balanceado_heap e tarefa_redistribuir já
+    trocam listas em vez de alterá-las; para redistribuir_balanceado, copie as listas antes.
+    O mesmo vale para resumo["painel"]: passe painel.recorte(semanas) a quem for atualizá-lo.
+    'cache' pode ser um CacheLRU ou o escopo de uma região em um CacheCompartilhado.
+    """
+    if cache is None:
+        cache = CacheLRU()
+
+    base_total = dedupe_clientes(clientes)
+    por_rota = {}
+    for c in base_total:
+        por_rota.setdefault(c.get("rota"), []).append(c)
+    rotas_alvo = list(por_rota) if rota is None else [r for r in (rota,) if r in por_rota]
+    hashes = {r: hash_clientes(por_rota[r]) for r in rotas_alvo}
+
+    def calcular():
+        buckets = [
+            cache.obter(("buckets", r, hashes[r], inicio, semanas),
+                        lambda r=r: montar_buckets(inicio, semanas, por_rota[r]), rotas=(r,))
+            for r in rotas_alvo
+        ]
+        if not buckets:
+            agenda = montar_buckets(inicio, semanas, [])
+        elif len(buckets) == 1:
+            agenda = {sem: dict(dias) for sem, dias in buckets[0].items()}
+        else:
+            # Intercala as rotas preservando a ordem de cadastro (ids são únicos após o dedupe)
+            posicao = {c.get("id"): i for i, c in enumerate(base_total)}
+            agenda = {
+                sem: {
+                    dia: list(heapq.merge(*(b[sem][dia] for b in buckets), key=lambda c: posicao[c["id"]]))
+                    for dia in DIAS_SEMANA
+                }
+                for sem in buckets[0]
+            }
+
+        base = base_total if rota is None else por_rota.get(rota, [])
+        alertas, freq_desconhecida = validar_cadastro(base)
+        painel = PainelCargas.de_agenda(agenda, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+        alertas_agenda(agenda, freq_desconhecida, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct,
+                       alertas=alertas, rota=rota, painel=painel)
+        resumo = {"total_clientes": len(base), "semanas": semanas, "capacidade_por_dia": capacidade_por_dia,
+                  "agenda_compacta": AgendaCompacta.de_agenda(agenda, inicio, base), "painel": painel}
+        return agenda, alertas, resumo
+
+    chave = ("agenda", tuple((r, hashes[r]) for r in rotas_alvo), inicio, semanas,
+             capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+    # Sem rota, a agenda depende da base inteira (inclusive de rotas que ainda serão cadastradas)
+    return cache.obter(chave, calcular, rotas=None if rota is None else (rota,))
+
+# -------------------------------
+# Cache compartilhado entre sessões (modo servidor)
+# -------------------------------
+CACHE_LIMITE_BYTES = 512 * 2**20
+_TIPOS_ATOMICOS = (str, bytes, int, float, bool, type(None), datetime.date, datetime.timedelta)
+
+def estimar_bytes(valor, amostra=8, _vistos=None):
+    """
+    Tamanho aproximado de 'valor' em memória (sys.getsizeof recursivo, sem contar duas vezes o mesmo objeto).
+    Em listas, dicts e conjuntos grandes só 'amostra' itens são medidos e o restante é extrapolado;
+    arrays numpy contam 'nbytes'. É uma estimativa barata para o orçamento do cache, não uma medida exata.
+    """
+    vistos = set() if _vistos is None else _vistos
+    if id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    tamanho = sys.getsizeof(valor, 64)
+    if isinstance(valor, _TIPOS_ATOMICOS):
+        return tamanho
+    nbytes = getattr(valor, "nbytes", None)
+    if isinstance(nbytes, int):
+        return tamanho + nbytes
+    if isinstance(valor, dict):
+        # Chave e valor medidos em separado: as tuplas de items() são temporárias e reaproveitariam ids
+        medidos = sum(estimar_bytes(k, amostra, vistos) + estimar_bytes(v, amostra, vistos)
+                      for k, v in itertools.islice(valor.items(), amostra))
+    elif isinstance(valor, (list, tuple, set, frozenset, deque)):
+        medidos = sum(estimar_bytes(item, amostra, vistos) for item in itertools.islice(valor, amostra))
+    elif hasattr(valor, "__dict__"):
+        return tamanho + estimar_bytes(vars(valor), amostra, vistos)
+    else:
+        return tamanho
+    n = len(valor)
+    return tamanho + (medidos * n // amostra if n > amostra else medidos)
+
+class CacheCompartilhado:
+    """
+    Cache de um processo inteiro, compartilhado pelas sessões (threads) e separado por inquilino (região):
+    as chaves de um inquilino nunca encontram valores de outro. Cada valor é guardado com as rotas de que
+    depende; invalidar(inquilino, rotas) descarta só essas entradas (e as que dependem da base inteira).
+    O orçamento é em bytes (estimar_bytes), global e opcionalmente por inquilino, com descarte do item
+    usado há mais tempo. Faltas simultâneas na mesma chave esperam um único cálculo, feito fora do lock;
+    um cálculo que termina depois de uma invalidação das suas rotas é devolvido, mas não guardado.
+    """
+
+    def __init__(self, limite_bytes=CACHE_LIMITE_BYTES, limite_por_inquilino=None):
+        self.limite_bytes = limite_bytes
+        self.limite_por_inquilino = limite_por_inquilino
+        self.acertos = 0
+        self.faltas = 0
+        self.descartes = 0
+        self.bytes = 0
+        self._itens = OrderedDict()     # (inquilino, chave) -> (valor, bytes, rotas ou None)
+        self._bytes = Counter()         # inquilino -> bytes guardados
+        self._alteracoes = Counter()    # inquilino -> nº de invalidações (de qualquer rota)
+        self._geracoes = Counter()      # (inquilino, rota) -> nº de invalidações; rota None = inquilino inteiro
+        self._em_calculo = {}           # (inquilino, chave) -> Future do cálculo em andamento
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def escopo(self, inquilino):
+        """Visão restrita a um inquilino, com a interface de CacheLRU (obter e limpar)."""
+        return _EscopoCache(self, inquilino)
+
+    def _geracao(self, inquilino, rotas):
+        if rotas is None:
+            return self._alteracoes[inquilino]
+        return self._geracoes[inquilino, None], tuple(self._geracoes[inquilino, r] for r in rotas)
+
+    def obter(self, inquilino, chave, calcular, rotas=None):
+        """
+        Valor de 'chave' no inquilino, calculado com 'calcular()' se ausente.
+        'rotas' são as rotas de que o valor depende (None = a base inteira do inquilino).
+        """
+        from concurrent.futures import Future
+
+        chave = (inquilino, chave)
+        rotas = None if rotas is None else tuple(rotas)
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                INSTRUMENTACAO.contar("cache.acertos")
+                return item[0]
+            futuro = self._em_calculo.get(chave)
+            calcula = futuro is None
+            if calcula:
+                futuro = self._em_calculo[chave] = Future()
+                geracao = self._geracao(inquilino, rotas)
+                self.faltas += 1
+            else:
+                self.acertos += 1
+        if not calcula:
+            INSTRUMENTACAO.contar("cache.esperas")
+            return futuro.result()
+        INSTRUMENTACAO.contar("cache.faltas")
+        try:
+            valor = calcular()
+        except BaseException as e:
+            with self._lock:
+                del self._em_calculo[chave]
+            futuro.set_exception(e)
+            raise
+        tamanho = estimar_bytes(valor)
+        with self._lock:
+            del self._em_calculo[chave]
+            if self._geracao(inquilino, rotas) == geracao:
+                self._guardar(chave, valor, tamanho, rotas)
+        futuro.set_result(valor)
+        return valor
+
+    def _guardar(self, chave, valor, tamanho, rotas):
+        inquilino = chave[0]
+        limite_inquilino = min(self.limite_por_inquilino or self.limite_bytes, self.limite_bytes)
+        if tamanho > limite_inquilino:
+            return  # maior que o orçamento: devolvido sem guardar
+        self._itens[chave] = (valor, tamanho, rotas)
+        self._bytes[inquilino] += tamanho
+        self.bytes += tamanho
+        while self._bytes[inquilino] > limite_inquilino:
+            self._descartar(next(c for c in self._itens if c[0] == inquilino))
+        while self.bytes > self.limite_bytes:
+            self._descartar(next(iter(self._itens)))
+
+    def _remover(self, chave):
+        _, tamanho, _ = self._itens.pop(chave)
+        self.bytes -= tamanho
+        self._bytes[chave[0]] -= tamanho
+        if not self._bytes[chave[0]]:
+            del self._bytes[chave[0]]
+
+    def _descartar(self, chave):
+        self._remover(chave)
+        self.descartes += 1
+        INSTRUMENTACAO.contar("cache.descartes")
+
+    def invalidar(self, inquilino, rotas=None):
+        """
+        Descarta as entradas do inquilino que dependem de 'rotas' e as que dependem da base inteira;
+        sem 'rotas', todas as entradas do inquilino. Retorna quantas entradas foram descartadas.
+        """
+        rotas = None if rotas is None else set(rotas)
+        with self._lock:
+            self._alteracoes[inquilino] += 1
+            for r in (None,) if rotas is None else rotas:
+                self._geracoes[inquilino, r] += 1
+            alvos = [
+                chave for chave, (_, _, dependencias) in self._itens.items()
+                if chave[0] == inquilino and (rotas is None or dependencias is None or not rotas.isdisjoint(dependencias))
+            ]
+            for chave in alvos:
+                self._remover(chave)
+        INSTRUMENTACAO.contar("cache.invalidacoes", len(alvos))
+        return len(alvos)
+
+    def limpar(self):
+        """Descarta todas as entradas de todos os inquilinos."""
+        with self._lock:
+            self._itens.clear()
+            self._bytes.clear()
+            self.bytes = 0
+
+    def estatisticas(self):
+        """{inquilino: {"entradas", "bytes"}}, para o painel de desempenho."""
+        with self._lock:
+            por_inquilino = {}
+            for (inquilino, _), (_, tamanho, _) in self._itens.items():
+                e = por_inquilino.setdefault(inquilino, {"entradas": 0, "bytes": 0})
+                e["entradas"] += 1
+                e["bytes"] += tamanho
+            return por_inquilino
+
+class _EscopoCache:
+    """As entradas de um inquilino em um CacheCompartilhado, com a interface de CacheLRU."""
+
+    def __init__(self, cache, inquilino):
+        self.cache = cache
+        self.inquilino = inquilino
+
+    def obter(self, chave, calcular, rotas=None):
+        return self.cache.obter(self.inquilino, chave, calcular, rotas=rotas)
+
+    def limpar(self):
+        self.cache.invalidar(self.inquilino)
+
+# -------------------------------
+# Redistribuição balanceada (sem duplicar clientes)
+# -------------------------------
+# Ordem de escolha dos clientes a mover: cadências mais longas primeiro (60 -> 30 -> 28 -> 21 -> 14 -> 7)
+PRIORIDADE_MOVER = {freq: p for p, freq in enumerate(sorted(REGRAS_FREQUENCIA, reverse=True))}
+
+@instrumentado("redistribuir_balanceado")
+def redistribuir_balanceado(agenda, capacidade_por_dia, permitir_mover_semanal=False, preservar_dia_semana=False,
+                            painel=None):
+    """
+    Balanceia cargas dentro da semana, movendo clientes de dias sobrecarregados
+    para dias com folga. Não cria duplicações (move o mesmo registro).
+    Prioridade: PRIORIDADE_MOVER (cadências mais longas primeiro; semanais só com permitir_mover_semanal=True)
+    Com 'painel' (PainelCargas da agenda), cada movimento atualiza as cargas e os alertas acompanhados.
+    """
+    realocados = []
+    iteracoes = 0
+    for semana_id, dias in agenda.items():
+        cargas = {dia: len(lst) for dia, lst in dias.items()}
+        total_semana = sum(cargas.values())
+        if len(DIAS_SEMANA) == 0:
+            continue
+        if painel is not None and semana_id not in painel.cargas:
+            painel.registrar_semana(semana_id, *PainelCargas.mapear(dias))
+        media = total_semana // len(DIAS_SEMANA) if total_semana > 0 else 0
+        alvo_por_dia = min(capacidade_por_dia, max(media, 0))
+
+        def lista_moviveis(lst):
+            return sorted(lst, key=lambda c: PRIORIDADE_MOVER.get(c.get("frequencia", 14), len(PRIORIDADE_MOVER)))
+
+        def pode_mover(cliente):
+            f = cliente.get("frequencia", 14)
+            return f in PRIORIDADE_MOVER and (f != 7 or permitir_mover_semanal)
+
+        for _ in range(1000):
+            iteracoes += 1
+            dias_excesso = [d for d in DIAS_SEMANA if cargas[d] > alvo_por_dia]
+            dias_deficit = [d for d in DIAS_SEMANA if cargas[d] < alvo_por_dia]
+            if not dias_excesso or not dias_deficit:
+                break
+
+            movido_na_iteracao = False
+            for origem in dias_excesso:
+                candidatos = lista_moviveis(dias[origem])
+                for cliente in candidatos:
+                    if not pode_mover(cliente):
+                        continue
+                    destinos_ordenados = sorted(dias_deficit, key=lambda d: cargas[d])
+                    bloqueados = dias_bloqueados(cliente, preservar_dia_semana)
+                    for destino in destinos_ordenados:
+                        if MAPA_DIA_IDX[destino] in bloqueados:
+                            continue
+                        # Cliente com vários dias: nunca duas visitas no mesmo dia
+                        if len(dias_do_padrao(cliente.get("dia_semana"))) > 1 and (
+                                painel.contem(semana_id, MAPA_DIA_IDX[destino], cliente.get("id")) if painel is not None
+                                else any(o.get("id") == cliente.get("id") for o in dias[destino])):
+                            continue
+                        if cargas[destino] >= capacidade_por_dia:
+                            continue
+                        # mover (sem duplicar)
+                        dias[destino].append(cliente)
+                        dias[origem].remove(cliente)
+                        cargas[destino] += 1
+                        cargas[origem] -= 1
+                        if painel is not None:
+                            painel.mover(semana_id, MAPA_DIA_IDX[origem], MAPA_DIA_IDX[destino], cliente.get("id"))
+                        realocados.append((cliente.get("nome"), semana_id, origem, destino))
+                        movido_na_iteracao = True
+                        break
+                    if movido_na_iteracao:
+                        break
+                if movido_na_iteracao:
+                    break
+            if not movido_na_iteracao:
+                break
+
+    INSTRUMENTACAO.contar("redistribuir_balanceado.iteracoes", iteracoes)
+    INSTRUMENTACAO.contar("redistribuir_balanceado.movimentos", len(realocados))
+    return agenda, realocados
+
+@instrumentado("redistribuir_balanceado_heap")
+def redistribuir_balanceado_heap(agenda, capacidade_por_dia, permitir_mover_semanal=False, preservar_dia_semana=False,
+                                 painel=None):
+    """
+    Mesmas regras e mesmo retorno de redistribuir_balanceado, sem limite de iterações.
+    Dias com excesso saem de um heap de máximo e dias com folga de um heap de mínimo;
+    os clientes de cada dia de origem ficam em filas por (prioridade, dias do padrão). Visitas de
+    clientes com vários dias nunca vão para um dia do próprio padrão nem para um dia que já recebeu
+    outra visita do mesmo cliente na semana.
+    As listas da agenda não são modificadas: no fim da semana, cada dia alterado recebe uma lista
+    nova no dict da semana. Quem passa {semana: dict(dias)} continua compartilhando os dias intactos.
+    Com 'painel' (PainelCargas da agenda), os movimentos de cada semana são aplicados a ele de uma vez,
+    ao fim da semana (as cargas já são acompanhadas aqui).
+    """
+    realocados = []
+    n_dias = len(DIAS_SEMANA)
+    if n_dias == 0:
+        return agenda, realocados
+    prioridades = [p for f, p in PRIORIDADE_MOVER.items() if f != 7 or permitir_mover_semanal]
+    iteracoes = 0
+
+    for semana_id, dias in agenda.items():
+        if painel is not None and semana_id not in painel.cargas:
+            painel.registrar_semana(semana_id, *PainelCargas.mapear(dias))
+        cargas = [len(dias[dia]) for dia in DIAS_SEMANA]
+        total_semana = sum(cargas)
+        media = total_semana // n_dias if total_semana > 0 else 0
+        alvo_por_dia = min(capacidade_por_dia, max(media, 0))
+
+        excesso = [(-cargas[d], d) for d in range(n_dias) if cargas[d] > alvo_por_dia]
+        folga = [(cargas[d], d) for d in range(n_dias) if cargas[d] < alvo_por_dia]
+        heapq.heapify(excesso)
+        heapq.heapify(folga)
+
+        # Filas de clientes móveis por dia de origem: [(prioridade, dias bloqueados, deque[(posição, cliente)])],
+        # uma por (prioridade, dia_semana) do cliente
+        filas = {}
+        for _, d in excesso:
+            grupos = {}
+            for pos, cliente in enumerate(dias[DIAS_SEMANA[d]]):
+                prio = PRIORIDADE_MOVER.get(cliente.get("frequencia", 14))
+                if prio in prioridades:
+                    grupos.setdefault((prio, cliente.get("dia_semana")), deque()).append((pos, cliente))
+            filas[d] = [(prio, dias_bloqueados({"dia_semana": dia_cli}, preservar_dia_semana), fila)
+                        for (prio, dia_cli), fila in grupos.items()]
+        movidos = set()
+        movimentos = []  # (id, origem, destino), aplicados ao painel no fim da semana
+        chegadas = {}  # dia de destino -> clientes recebidos, em ordem
+        recebidos_por_id = {}  # clientes com vários dias: id -> dias que já receberam uma visita movida
+
+        while excesso and folga:
+            iteracoes += 1
+            destinos = [d for _, d in sorted(folga)]
+            _, d_origem = heapq.heappop(excesso)
+
+            fila_escolhida, permitidos = None, None
+            for prio in prioridades:
+                for p, bloqueados, fila in filas[d_origem]:
+                    if p != prio or not fila:
+                        continue
+                    if fila_escolhida is not None and fila[0][0] > fila_escolhida[0][0]:
+                        continue
+                    ok = [d for d in destinos if d not in bloqueados]
+                    if ok:
+                        fila_escolhida, permitidos = fila, ok
+                if fila_escolhida is not None:
+                    break
+            if fila_escolhida is None:
+                # Nenhum cliente desta origem pode sair; como os destinos só diminuem, a origem fica esgotada
+                continue
+
+            _, cliente = fila_escolhida.popleft()
+            d_destino = permitidos[0]  # 'destinos' já vem ordenado por (carga, dia)
+            if len(dias_do_padrao(cliente.get("dia_semana"))) > 1:
+                ja_recebidos = recebidos_por_id.setdefault(cliente.get("id"), set())
+                d_destino = next((d for d in permitidos if d not in ja_recebidos), None)
+                if d_destino is None:
+                    # Esta visita fica no dia de origem; os demais clientes da origem seguem disponíveis
+                    heapq.heappush(excesso, (-cargas[d_origem], d_origem))
+                    continue
+                ja_recebidos.add(d_destino)
+            origem, destino = DIAS_SEMANA[d_origem], DIAS_SEMANA[d_destino]
+
+            chegadas.setdefault(d_destino, []).append(cliente)
+            movidos.add(id(cliente))
+            cargas[d_origem] -= 1
+            cargas[d_destino] += 1
+            if painel is not None:
+                movimentos.append((cliente.get("id"), d_origem, d_destino))
+            realocados.append((cliente.get("nome"), semana_id, origem, destino))
+
+            # Heap de folga tem no máximo um item por dia: reconstruí-lo custa O(len(DIAS_SEMANA))
+            folga = [(cargas[d], d) for _, d in folga if cargas[d] < alvo_por_dia]
+            heapq.heapify(folga)
+            if cargas[d_origem] > alvo_por_dia:
+                heapq.heappush(excesso, (-cargas[d_origem], d_origem))
+
+        if movidos:
+            for d in filas:
+                dia = DIAS_SEMANA[d]
+                if cargas[d] < len(dias[dia]):
+                    dias[dia] = [c for c in dias[dia] if id(c) not in movidos]
+            for d, recebidos in chegadas.items():
+                dia = DIAS_SEMANA[d]
+                dias[dia] = dias[dia] + recebidos
+        if movimentos:
+            painel.aplicar_semana(semana_id, cargas, movimentos)
+
+    INSTRUMENTACAO.contar("redistribuir_balanceado_heap.iteracoes", iteracoes)
+    INSTRUMENTACAO.contar("redistribuir_balanceado_heap.movimentos", len(realocados))
+    return agenda, realocados
+
+# -------------------------------
+# Redistribuição global (todas as semanas de uma vez)
+# -------------------------------
+def metricas_agenda(agenda, capacidade_por_dia):
+    """Sobrecarga total (visitas acima da capacidade) e desvio (soma dos quadrados em relação à média da semana)."""
+    sobrecarga = 0
+    desvio = 0.0
+    for dias in agenda.values():
+        cargas = [len(lst) for lst in dias.values()]
+        media = sum(cargas) / len(cargas) if cargas else 0
+        sobrecarga += sum(max(0, q - capacidade_por_dia) for q in cargas)
+        desvio += sum((q - media) ** 2 for q in cargas)
+    return {"sobrecarga": sobrecarga, "desvio": round(desvio, 2)}
+
+def _otimizar_dias_global(inicio, semanas, base, capacidade_por_dia, permitir_mover_semanal, preservar_dia_semana,
+                          limite):
+    """
+    Busca de redistribuir_global sobre a base já deduplicada, até o instante 'limite' (perf_counter).
+    Busca local de melhor melhoria (aplica a melhor troca da vizinhança até não haver troca que reduza
+    o custo): para em um mínimo local, sem garantia de ótimo; não é fluxo de custo mínimo nem programação inteira.
+    Retorna (destino_por_id, iteracoes, interrompido, peso): o novo dia de cada cliente movido.
+    """
+    n_dias = len(DIAS_SEMANA)
+
+    # Clientes de um dia por cadência e dia original; os de vários dias entram só como carga fixa
+    por_cadencia = {}
+    for c in base:
+        dias = dias_do_padrao(c.get("dia_semana"))
+        cadencia = cadencia_cliente(c) if dias and c.get("frequencia") else None
+        if cadencia is not None:
+            por_cadencia.setdefault(cadencia, []).append((dias, c))
+    cadencias = {cadencia: j for j, cadencia in enumerate(sorted(por_cadencia))}  # ordem estável: (classe, deslocamento)
+    n_cadencias = len(cadencias)
+    grupos = [[[] for _ in range(n_dias)] for _ in range(n_cadencias)]
+    fixas = [[0] * n_dias for _ in range(n_cadencias)]
+    for cadencia, j in cadencias.items():
+        for dias, c in por_cadencia[cadencia]:
+            if len(dias) == 1:
+                grupos[j][dias[0]].append(c)
+            else:
+                for d in dias:
+                    fixas[j][d] += 1
+    # Semanas com o mesmo padrão de cadências ativas têm a mesma carga
+    tipos = Counter(calendario_visitas(inicio, semanas).padroes_de(list(cadencias)))
+    moviveis = [j for (k, _), j in cadencias.items() if FREQUENCIA_DA_CLASSE[k] != 7 or permitir_mover_semanal]
+
+    # y[j][o][d]: clientes da cadência j com dia original o atribuídos ao dia d
+    y = [[[len(grupos[j][o]) if d == o else 0 for d in range(n_dias)] for o in range(n_dias)]
+         for j in range(n_cadencias)]
+    cargas = {t: [sum(t[j] * (len(grupos[j][d]) + fixas[j][d]) for j in range(n_cadencias)) for d in range(n_dias)]
+              for t in tipos}
+
+    peso = 4 * (len(base) + 1)  # uma visita de sobrecarga pesa mais que qualquer ganho de equilíbrio
+    # Custo por visita movida: com preservar_dia_semana (meia sobrecarga) supera o ganho de equilíbrio da semana
+    custo_mover = peso // 2 if preservar_dia_semana else 1
+    semanas_ativas = [sum(mult for t, mult in tipos.items() if t[j]) for j in range(n_cadencias)]
+
+    def f(q):
+        return peso * max(0, q - capacidade_por_dia) + q * q
+
+    def delta(k, o, a, b, qtd):
+        total = 0
+        for t, mult in tipos.items():
+            if t[k]:
+                la, lb = cargas[t][a], cargas[t][b]
+                total += mult * (f(la - qtd) - f(la) + f(lb + qtd) - f(lb))
+        return total + custo_mover * semanas_ativas[k] * qtd * ((a == o) - (b == o))
+
+    iteracoes = 0
+    interrompido = False
+    while not interrompido:
+        melhor = None
+        for k in moviveis:
+            # Prazo conferido a cada cadência: uma varredura completa pode custar mais que o tempo restante
+            if time.perf_counter() > limite:
+                interrompido = True
+                break
+            for o in range(n_dias):
+                for a in range(n_dias):
+                    disponivel = y[k][o][a]
+                    qtd = 1
+                    while qtd <= disponivel:
+                        for b in range(n_dias):
+                            if b != a:
+                                ganho = delta(k, o, a, b, qtd)
+                                if ganho < 0 and (melhor is None or ganho < melhor[0]):
+                                    melhor = (ganho, k, o, a, b, qtd)
+                        qtd *= 2
+        if melhor is None:
+            break
+        _, k, o, a, b, qtd = melhor
+        y[k][o][a] -= qtd
+        y[k][o][b] += qtd
+        for t in tipos:
+            if t[k]:
+                cargas[t][a] -= qtd
+                cargas[t][b] += qtd
+        iteracoes += 1
+    INSTRUMENTACAO.contar("redistribuir_global.iteracoes", iteracoes)
+
+    # Escolhe quais clientes mudam de dia (ordem de cadastro)
+    atribuicao = {}
+    for k in range(n_cadencias):
+        for o in range(n_dias):
+            fila = iter(grupos[k][o])
+            for d in range(n_dias):
+                if d == o:
+                    continue
+                for _ in range(y[k][o][d]):
+                    atribuicao[id(next(fila))] = DIAS_SEMANA[d]
+    destino_por_id = {c.get("id"): atribuicao[id(c)] for c in base if id(c) in atribuicao}
+    return destino_por_id, iteracoes, interrompido, peso
+
+def aplicar_dias_globais(agenda, destino_por_id):
+    """
+    Leva cada cliente de 'destino_por_id' ao seu novo dia em todas as semanas, sem modificar 'agenda': dias
+    sem saídas nem chegadas continuam sendo as mesmas listas, e semanas que compartilham o dict de dias
+    (montar_buckets com compartilhar=True) são processadas uma vez e compartilham o resultado.
+    Retorna (agenda, realocados), com 'realocados' no formato de redistribuir_balanceado.
+    """
+    nova, realocados, feitas = {}, [], {}
+    for semana_id, dias in agenda.items():
+        if id(dias) not in feitas:
+            movimentos = [(c.get("nome"), dia, destino_por_id[c["id"]]) for dia, lst in dias.items() for c in lst
+                          if destino_por_id.get(c["id"], dia) != dia]
+            ajustada = dias
+            if movimentos:
+                alterados = {dia for _, origem, destino in movimentos for dia in (origem, destino)}
+                ajustada = {dia: [] if dia in alterados else lst for dia, lst in dias.items()}
+                for dia, lst in dias.items():
+                    if dia in alterados:
+                        for c in lst:
+                            ajustada[destino_por_id.get(c["id"], dia)].append(c)
+            feitas[id(dias)] = (ajustada, movimentos)
+        nova[semana_id], movimentos = feitas[id(dias)]
+        realocados.extend((nome, semana_id, origem, destino) for nome, origem, destino in movimentos)
+    return nova, realocados
+
+def _global_sobre_base(inicio, semanas, base, agenda_base, capacidade_por_dia, permitir_mover_semanal,
+                       preservar_dia_semana, limite):
+    """
+    Núcleo de redistribuir_global sobre 'agenda_base' (montar_buckets da base com compartilhar=True), sem
+    modificá-la. A gulosa roda antes da busca, dentro do mesmo prazo; semanas em que ela deixa menos sobrecarga
+    que a busca ficam com a semana da gulosa. Retorna (agenda, realocados, guloso, realocados_guloso, info),
+    com listas compartilhadas com 'agenda_base'.
+    """
+    guloso, realocados_guloso = redistribuir_compartilhado(
+        agenda_base, capacidade_por_dia,
+        permitir_mover_semanal=permitir_mover_semanal, preservar_dia_semana=preservar_dia_semana,
+    )
+    destino_por_id, iteracoes, interrompido, peso = _otimizar_dias_global(
+        inicio, semanas, base, capacidade_por_dia, permitir_mover_semanal, preservar_dia_semana, limite,
+    )
+    agenda, realocados = aplicar_dias_globais(agenda_base, destino_por_id)
+
+    def sobrecarga(dias):
+        return sum(max(0, len(lst) - capacidade_por_dia) for lst in dias.values())
+
+    gulosas = {semana_id for semana_id, dias in agenda.items() if sobrecarga(guloso[semana_id]) < sobrecarga(dias)}
+    if gulosas:
+        agenda = {semana_id: guloso[semana_id] if semana_id in gulosas else dias for semana_id, dias in agenda.items()}
+        por_semana = {}
+        for movimentos, da_gulosa in ((realocados, False), (realocados_guloso, True)):
+            for movimento in movimentos:
+                if (movimento[1] in gulosas) == da_gulosa:
+                    por_semana.setdefault(movimento[1], []).append(movimento)
+        realocados = [movimento for semana_id in agenda for movimento in por_semana.get(semana_id, ())]
+    info = {"iteracoes": iteracoes, "interrompido_por_tempo": interrompido, "semanas_gulosas": len(gulosas),
+            "clientes_movidos": len(destino_por_id), "peso": peso}
+    return agenda, realocados, guloso, realocados_guloso, info
+
+@instrumentado("redistribuir_global")
+def redistribuir_global(inicio, semanas, clientes, capacidade_por_dia, permitir_mover_semanal=False,
+                        preservar_dia_semana=False, tempo_limite=5.0):
+    """
+    Escolhe um dia da semana por cliente olhando todas as semanas do horizonte ao mesmo tempo,
+    mantendo a cadência de cada frequência (semanas ativas do calendário de visitas).
+
+    Como a cadência depende só de (classe de frequência, deslocamento), os clientes são agregados em
+    contagens por (cadência, dia original, dia atribuído) e o custo
+        peso * sobrecarga + soma dos quadrados das cargas + custo por visita movida
+    é reduzido por busca local de melhor melhoria (mover lotes de 2^k clientes entre dias) até não haver
+    melhora ou esgotar 'tempo_limite' segundos. É uma heurística: para em um mínimo local, sem garantia de
+    ótimo. O prazo conta desde o início da chamada e cobre o agrupamento, a montagem da agenda base, a
+    redistribuição gulosa e a busca; só a montagem da agenda devolvida vem depois e cresce com clientes x semanas.
+
+    Com preservar_dia_semana, cada visita movida custa meia unidade de sobrecarga: só se move para aliviar
+    sobrecarga. Clientes semanais só se movem com permitir_mover_semanal e clientes com vários dias ficam fixos
+    (entram só como carga). Cada cliente fica no mesmo dia em todas as semanas, exceto nas semanas em que a
+    gulosa deixa menos sobrecarga: essas ficam com a semana da gulosa, então a sobrecarga nunca passa a dela.
+    O desvio pode ficar acima do da gulosa quando não há sobrecarga a aliviar.
+
+    Retorna (agenda, realocados, relatorio); 'realocados' segue o formato de redistribuir_balanceado
+    (uma entrada por visita movida) e 'relatorio' traz as métricas da agenda original, da gulosa e da global,
+    "melhoria_vs_guloso" e "semanas_gulosas".
+    """
+    limite = time.perf_counter() + tempo_limite
+    base = dedupe_clientes(clientes)
+    # Uma lista por padrão de semana; só a agenda devolvida ganha listas próprias em cada semana
+    agenda_original = montar_buckets(inicio, semanas, base, compartilhar=True)
+    ajustada, realocados, guloso, realocados_guloso, info = _global_sobre_base(
+        inicio, semanas, base, agenda_original, capacidade_por_dia, permitir_mover_semanal, preservar_dia_semana,
+        limite,
+    )
+    agenda = {semana_id: {dia: list(lst) for dia, lst in dias.items()} for semana_id, dias in ajustada.items()}
+    relatorio = {
+        "original": metricas_agenda(agenda_original, capacidade_por_dia),
+        "guloso": {**metricas_agenda(guloso, capacidade_por_dia), "movimentos": len(realocados_guloso)},
+        "global": {**metricas_agenda(agenda, capacidade_por_dia), "movimentos": len(realocados),
+                   "clientes_movidos": info["clientes_movidos"]},
+        "iteracoes": info["iteracoes"],
+        "interrompido_por_tempo": info["interrompido_por_tempo"],
+        "semanas_gulosas": info["semanas_gulosas"],
+    }
+
+    def objetivo(m):
+        return info["peso"] * m["sobrecarga"] + m["desvio"]
+
+    custo_guloso = objetivo(relatorio["guloso"])
+    relatorio["melhoria_vs_guloso"] = (
+        round((custo_guloso - objetivo(relatorio["global"])) / custo_guloso, 4) if custo_guloso else 0.0
+    )
+    return agenda, realocados, relatorio
+
+# -------------------------------
+# Cenários (what-if) sobre agendas base compartilhadas
+# -------------------------------
+MODOS_CENARIO = ("nenhuma", "semanal", "global")
+CENARIO_PADRAO = {"redistribuir": "semanal", "permitir_mover_semanal": False, "preservar_dia_semana": False,
+                  "tempo_limite": 5.0}
+
+def redistribuir_compartilhado(agenda, capacidade_por_dia, permitir_mover_semanal=False, preservar_dia_semana=False):
+    """
+    redistribuir_balanceado_heap sem copiar nem modificar 'agenda': semanas sem movimento continuam sendo o
+    mesmo dict da entrada e, nas demais, só os dias alterados ganham listas novas. Semanas que já compartilham
+    o mesmo dict (montar_buckets com compartilhar=True) são redistribuídas uma única vez e compartilham o resultado.
+    Retorna (agenda, realocados), como redistribuir_balanceado_heap.
+    """
+    nova, realocados, feitas = {}, [], {}
+    for semana_id, dias in agenda.items():
+        if id(dias) not in feitas:
+            ajustada, movimentos = redistribuir_balanceado_heap(
+                {semana_id: dict(dias)}, capacidade_por_dia,
+                permitir_mover_semanal=permitir_mover_semanal, preservar_dia_semana=preservar_dia_semana,
+            )
+            feitas[id(dias)] = (ajustada[semana_id] if movimentos else dias,
+                                [(nome, origem, destino) for nome, _, origem, destino in movimentos])
+        nova[semana_id], movimentos = feitas[id(dias)]
+        realocados.extend((nome, semana_id, origem, destino) for nome, origem, destino in movimentos)
+    return nova, realocados
+
+def _avaliar_cenario(parametros, base, clientes):
+    capacidade = parametros["capacidade_por_dia"]
+    modo = parametros["redistribuir"]
+    if modo == "semanal":
+        agenda, realocados = redistribuir_compartilhado(
+            base, capacidade, permitir_mover_semanal=parametros["permitir_mover_semanal"],
+            preservar_dia_semana=parametros["preservar_dia_semana"],
+        )
+    elif modo == "global":
+        # A agenda sai da base compartilhada, sem montar agendas próprias
+        agenda, realocados, _, _, _ = _global_sobre_base(
+            parametros["inicio"], parametros["semanas"], clientes, base, capacidade,
+            parametros["permitir_mover_semanal"], parametros["preservar_dia_semana"],
+            time.perf_counter() + parametros["tempo_limite"],
+        )
+    else:
+        agenda, realocados = base, []
+
+    metricas = metricas_agenda(agenda, capacidade)
+    metricas["movimentos"] = len(realocados)
+    metricas["dias_acima"] = sum(1 for dias in agenda.values() for lst in dias.values() if len(lst) > capacidade)
+    # Dias que não reaproveitam a lista da base: mede quanto o cenário ocupa além dela
+    metricas["dias_alterados"] = sum(
+        1 for semana_id, dias in agenda.items() for dia, lst in dias.items() if lst is not base[semana_id][dia]
+    )
+    return {"nome": parametros["nome"], "parametros": parametros, "agenda": agenda, "realocados": realocados,
+            "metricas": metricas}
+
+# Estado dos processos trabalhadores de avaliar_cenarios (preenchido por _iniciar_cenarios)
+_CENARIOS_CLIENTES = None
+_CENARIOS_BASES = {}
+
+def _base_cenarios(bases, clientes, inicio, semanas):
+    """Agenda base compartilhada por (inicio, semanas), montada uma única vez."""
+    chave = (inicio, semanas)
+    if chave not in bases:
+        bases[chave] = montar_buckets(inicio, semanas, clientes, compartilhar=True)
+    return bases[chave]
+
+def _iniciar_cenarios(clientes):
+    """Inicializador dos processos: recebe os clientes uma vez por processo, não a cada cenário."""
+    global _CENARIOS_CLIENTES
+    _CENARIOS_CLIENTES = clientes
+    _CENARIOS_BASES.clear()
+
+def _avaliar_cenario_processo(parametros):
+    """
+    Executado no processo trabalhador: avalia o cenário sobre a base local e devolve só as diferenças,
+    {"dias": [{dia: [ids]}], "semanas": {semana_id: posição em "dias"}}, com os dias alterados de cada
+    padrão de semana uma única vez, além de "realocados" e "metricas".
+    """
+    base = _base_cenarios(_CENARIOS_BASES, _CENARIOS_CLIENTES, parametros["inicio"], parametros["semanas"])
+    resultado = _avaliar_cenario(parametros, base, _CENARIOS_CLIENTES)
+    dias_alterados, semanas, vistos = [], {}, {}
+    for semana_id, dias in resultado["agenda"].items():
+        if id(dias) not in vistos:
+            alterados = {dia: [c["id"] for c in lst] for dia, lst in dias.items() if lst is not base[semana_id][dia]}
+            vistos[id(dias)] = None
+            if alterados:
+                vistos[id(dias)] = len(dias_alterados)
+                dias_alterados.append(alterados)
+        if vistos[id(dias)] is not None:
+            semanas[semana_id] = vistos[id(dias)]
+    return {"dias": dias_alterados, "semanas": semanas, "realocados": resultado["realocados"],
+            "metricas": resultado["metricas"]}
+
+def _agenda_de_diferencas(base, diferencas, por_id):
+    """Remonta no processo principal a agenda do cenário: a base, com os dias alterados trocados."""
+    dias_alterados = [{dia: [por_id[i] for i in ids] for dia, ids in alterados.items()}
+                      for alterados in diferencas["dias"]]
+    agenda, feitas = {}, {}
+    for semana_id, dias in base.items():
+        j = diferencas["semanas"].get(semana_id)
+        if j is None:
+            agenda[semana_id] = dias
+            continue
+        if (id(dias), j) not in feitas:
+            feitas[(id(dias), j)] = {**dias, **dias_alterados[j]}
+        agenda[semana_id] = feitas[(id(dias), j)]
+    return agenda
+
+@instrumentado("avaliar_cenarios")
+def avaliar_cenarios(clientes, cenarios, inicio, semanas, capacidade_por_dia, rota=None, workers=None,
+                     progresso=None):
+    """
+    Avalia N cenários contra agendas base compartilhadas. Cada cenário é um dict com "nome" e, opcionalmente,
+    "inicio", "semanas", "capacidade_por_dia" (padrão: os argumentos), "redistribuir" (um de MODOS_CENARIO),
+    "permitir_mover_semanal", "preservar_dia_semana" e "tempo_limite" (padrão: CENARIO_PADRAO).
+
+    Há uma agenda base por (inicio, semanas), montada uma única vez com as semanas de mesmo padrão
+    compartilhando os dias; os cenários não a modificam e só os dias alterados ganham listas novas (no modo
+    "global", a gulosa e a busca rodam sobre a base, sem agendas próprias). Os cenários rodam num
+    ProcessPoolExecutor com 'workers' processos (None = número de CPUs; 1 = sem pool, no próprio processo):
+    cada processo recebe os clientes uma vez e monta a própria base, cada cenário envia só os parâmetros e
+    devolve só os dias alterados (ids) e as métricas, e a agenda é remontada sobre a base do processo principal.
+    Retorna, na ordem de 'cenarios', {"nome", "parametros", "agenda", "realocados", "metricas"};
+    'progresso(feitos, total)' é chamado a cada cenário concluído.
+    """
+    padrao = {"inicio": inicio, "semanas": semanas, "capacidade_por_dia": capacidade_por_dia, **CENARIO_PADRAO}
+    parametros = [{**padrao, **cenario} for cenario in cenarios]
+    for p in parametros:
+        if p["redistribuir"] not in MODOS_CENARIO:
+            raise ValueError(f"Modo de redistribuição desconhecido no cenário {p.get('nome')}: {p['redistribuir']}")
+
+    base_clientes = [c for c in dedupe_clientes(clientes) if rota is None or c.get("rota") == rota]
+    bases = {}
+    for p in parametros:
+        _base_cenarios(bases, base_clientes, p["inicio"], p["semanas"])
+
+    if workers == 1 or len(parametros) <= 1:
+        resultados = []
+        for p in parametros:
+            resultados.append(_avaliar_cenario(p, bases[(p["inicio"], p["semanas"])], base_clientes))
+            if progresso:
+                progresso(len(resultados), len(parametros))
+        return resultados
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    por_id = {c["id"]: c for c in base_clientes}
+    resultados = [None] * len(parametros)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_cenarios, initargs=(base_clientes,))
+    try:
+        futuros = {pool.submit(_avaliar_cenario_processo, p): i for i, p in enumerate(parametros)}
+        for feitos, futuro in enumerate(as_completed(futuros), 1):
+            i = futuros[futuro]
+            diferencas = futuro.result()
+            p = parametros[i]
+            resultados[i] = {"nome": p["nome"], "parametros": p,
+                             "agenda": _agenda_de_diferencas(bases[(p["inicio"], p["semanas"])], diferencas, por_id),
+                             "realocados": diferencas["realocados"], "metricas": diferencas["metricas"]}
+            if progresso:
+                progresso(feitos, len(parametros))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return resultados
+
+# -------------------------------
+# Sequenciamento das visitas do dia (distância e ordem de visita)
+# -------------------------------
+RAIO_TERRA_KM = 6371.0
+VIZINHOS_CANDIDATOS = 10
+TAMANHO_SEGMENTO_OR_OPT = 3
+
+def matriz_distancias(lats, lons):
+    """Matriz n x n de distâncias haversine (km), calculada de uma vez com NumPy."""
+    import numpy as np
+
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    a = (np.sin((lat[:, None] - lat[None, :]) / 2) ** 2
+         + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin((lon[:, None] - lon[None, :]) / 2) ** 2)
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+class IndiceEspacial:
+    """
+    Grade regular sobre os pontos (células de 'passo' graus, ~2 pontos por célula se omitido).
+    candidatos(i, k) percorre anéis de células ao redor do ponto i até reunir k vizinhos,
+    mais um anel de margem, sem comparar o ponto com a base inteira.
+    """
+
+    def __init__(self, lats, lons, passo=None):
+        n = len(lats)
+        if passo is None:
+            extensao = max(max(lats, default=0) - min(lats, default=0), max(lons, default=0) - min(lons, default=0))
+            passo = max(extensao, 1e-6) / max(1, int(math.sqrt(n / 2)))
+        self.passo = passo
+        self.celula = [(math.floor(la / passo), math.floor(lo / passo)) for la, lo in zip(lats, lons)]
+        self.celulas = {}
+        for i, cel in enumerate(self.celula):
+            self.celulas.setdefault(cel, []).append(i)
+        linhas = [ci for ci, _ in self.celulas] or [0]
+        colunas = [cj for _, cj in self.celulas] or [0]
+        self._raio_max = max(max(linhas) - min(linhas), max(colunas) - min(colunas))
+
+    def _anel(self, ci, cj, raio):
+        if raio == 0:
+            yield ci, cj
+            return
+        for dj in range(-raio, raio + 1):
+            yield ci - raio, cj + dj
+            yield ci + raio, cj + dj
+        for di in range(-raio + 1, raio):
+            yield ci + di, cj - raio
+            yield ci + di, cj + raio
+
+    def candidatos(self, i, k):
+        """Pelo menos k pontos próximos de i (sem o próprio i), ou todos se houver menos."""
+        ci, cj = self.celula[i]
+        encontrados = []
+        raio, margem = 0, None
+        while raio <= self._raio_max and (margem is None or raio <= margem):
+            for cel in self._anel(ci, cj, raio):
+                encontrados.extend(j for j in self.celulas.get(cel, ()) if j != i)
+            if margem is None and len(encontrados) >= k:
+                margem = raio + 1
+            raio += 1
+        return encontrados
+
+def _inverter(t, pos, i, j):
+    """Inverte t[i..j] (i <= j) e atualiza as posições."""
+    t[i:j + 1] = t[i:j + 1][::-1]
+    for p in range(i, j + 1):
+        pos[t[p]] = p
+
+def _dois_opt(t, pos, dist, viz):
+    """2-opt com listas de candidatos: troca (a,b),(c,d) por (a,c),(b,d) enquanto houver ganho."""
+    n = len(t)
+    melhorou_algum = False
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for a in range(n):
+            for sentido in (1, -1):
+                i = pos[a]
+                b = t[(i + sentido) % n]
+                dab = dist[a][b]
+                for c in viz[a]:
+                    dac = dist[a][c]
+                    if dac >= dab:
+                        break  # candidatos em ordem crescente de distância
+                    j = pos[c]
+                    d = t[(j + sentido) % n]
+                    if c == b or d == a:
+                        continue
+                    if dac + dist[b][d] - dab - dist[c][d] < -1e-9:
+                        if sentido == 1:
+                            _inverter(t, pos, *((i + 1, j) if i < j else (j + 1, i)))
+                        else:
+                            _inverter(t, pos, *((j, i - 1) if j < i else (i, j - 1)))
+                        melhorou = melhorou_algum = True
+                        break
+    return melhorou_algum
+
+def _or_opt(t, pos, dist, viz):
+    """Or-opt: move trechos de até TAMANHO_SEGMENTO_OR_OPT visitas para junto de um candidato (em qualquer sentido)."""
+    n = len(t)
+    melhorou_algum = False
+    melhorou = True
+    while melhorou:
+        melhorou = False
+        for tamanho in range(1, min(TAMANHO_SEGMENTO_OR_OPT, n - 3) + 1):
+            for i in range(n - tamanho + 1):
+                trecho = t[i:i + tamanho]
+                s0, s1 = trecho[0], trecho[-1]
+                p, nx = t[i - 1], t[(i + tamanho) % n]
+                ganho = dist[p][s0] + dist[s1][nx] - dist[p][nx]
+                no_trecho = set(trecho)
+                melhor = None
+                for ponta, outra in ((s0, s1), (s1, s0)):
+                    for c in viz[ponta]:
+                        if dist[c][ponta] >= ganho:
+                            break
+                        if c in no_trecho:
+                            continue
+                        depois, antes = t[(pos[c] + 1) % n], t[pos[c] - 1]
+                        # 'ponta' encostada em c: c -> ponta ... outra -> depois, ou antes -> outra ... ponta -> c
+                        opcoes = []
+                        if depois not in no_trecho:
+                            opcoes.append((dist[c][ponta] + dist[outra][depois] - dist[c][depois], c, ponta))
+                        if antes not in no_trecho:
+                            opcoes.append((dist[antes][outra] + dist[ponta][c] - dist[antes][c], antes, outra))
+                        for custo, apos, primeiro in opcoes:
+                            if custo < ganho - 1e-9 and (melhor is None or custo < melhor[0]):
+                                melhor = (custo, apos, primeiro)
+                if melhor is None:
+                    continue
+                _, apos, primeiro = melhor
+                resto = t[:i] + t[i + tamanho:]
+                k = resto.index(apos) + 1
+                t[:] = resto[:k] + (trecho if primeiro == s0 else trecho[::-1]) + resto[k:]
+                for q, v in enumerate(t):
+                    pos[v] = q
+                melhorou = melhorou_algum = True
+    return melhorou_algum
+
+def _ordem_visita(clientes, origem=None, vizinhos=VIZINHOS_CANDIDATOS):
+    """
+    Ordem (posições em 'clientes') e distância em km da rota do dia. O nó 0 é a origem; sem origem,
+    é um nó fictício a distância zero de todos, o que transforma o circuito num caminho aberto.
+    """
+    import numpy as np
+
+    com = [p for p, c in enumerate(clientes) if tem_coordenadas(c)]
+    sem = [p for p, c in enumerate(clientes) if not tem_coordenadas(c)]
+    if len(com) < 2:
+        km = 0.0
+        if origem is not None and com:
+            c = clientes[com[0]]
+            km = 2 * float(matriz_distancias([origem[0], c["lat"]], [origem[1], c["lon"]])[0, 1])
+        return com + sem, km
+
+    lats = [float(clientes[p]["lat"]) for p in com]
+    lons = [float(clientes[p]["lon"]) for p in com]
+    n = len(com) + 1
+    matriz = matriz_distancias([origem[0] if origem else 0.0] + lats, [origem[1] if origem else 0.0] + lons)
+    if origem is None:
+        matriz[0, :] = 0.0
+        matriz[:, 0] = 0.0
+
+    # Listas de candidatos: vizinhos pela grade, ordenados pela matriz; a origem é candidata de todos
+    indice = IndiceEspacial(lats, lons)
+    viz = [sorted(range(1, n), key=matriz[0].__getitem__)]
+    for i in range(1, n):
+        linha = matriz[i]
+        proximos = sorted((j + 1 for j in indice.candidatos(i - 1, vizinhos)), key=linha.__getitem__)[:vizinhos]
+        viz.append(sorted(proximos + [0], key=linha.__getitem__))
+
+    # Vizinho mais próximo a partir da origem
+    restante = matriz.copy()
+    restante[:, 0] = np.inf
+    t = [0]
+    for _ in range(n - 1):
+        prox = int(np.argmin(restante[t[-1]]))
+        restante[:, prox] = np.inf
+        t.append(prox)
+
+    dist = matriz.tolist()
+    pos = [0] * n
+    for q, v in enumerate(t):
+        pos[v] = q
+    while _dois_opt(t, pos, dist, viz) | _or_opt(t, pos, dist, viz):
+        pass
+
+    zero = pos[0]
+    t = t[zero:] + t[:zero]
+    km = sum(dist[t[q]][t[(q + 1) % n]] for q in range(n))
+    return [com[v - 1] for v in t[1:]] + sem, km
+
+def sequenciar_dia(clientes, origem=None, vizinhos=VIZINHOS_CANDIDATOS):
+    """
+    Ordena as visitas de um dia: vizinho mais próximo seguido de 2-opt e Or-opt sobre a matriz haversine,
+    com candidatos vindos de um índice espacial em grade. Com 'origem' (lat, lon) a rota sai da base e
+    volta a ela; sem origem, é um caminho aberto. Clientes sem coordenadas vão para o fim, na ordem original.
+    Retorna (clientes na ordem de visita, distância total em km).
+    """
+    ordem, km = _ordem_visita(clientes, origem, vizinhos)
+    return [clientes[p] for p in ordem], km
+
+@instrumentado("sequenciar_agenda")
+def sequenciar_agenda(agenda, origem=None, velocidade_kmh=30.0, minutos_por_visita=15, jornada_minutos=None,
+                      alertas=None, rota=None, indice_semana=None, progresso=None):
+    """
+    Aplica sequenciar_dia a cada dia de uma agenda em dicts (gerar_agenda/redistribuição), em listas novas.
+    Dias com o mesmo conjunto de clientes (semanas com o mesmo padrão) são sequenciados uma única vez.
+    A duração do dia é o deslocamento a 'velocidade_kmh' mais 'minutos_por_visita' por visita; com
+    'jornada_minutos', dias acima do limite geram o alerta "jornada_excedida" em 'alertas'.
+    'progresso(semanas_feitas, total)' é chamado a cada semana.
+    Retorna (agenda sequenciada, percursos {semana_id: {dia: {"km", "minutos", "sem_coordenadas"}}}, alertas).
+    """
+    if alertas is None:
+        alertas = TabelaAlertas()
+    sequenciada, percursos, memo = {}, {}, {}
+    for pos, (semana_id, dias) in enumerate(agenda.items()):
+        sidx = indice_semana[semana_id] if indice_semana else pos
+        sequenciada[semana_id], percursos[semana_id] = {}, {}
+        for dia, lst in dias.items():
+            chave = tuple(c.get("id") for c in lst)
+            if chave not in memo:
+                memo[chave] = _ordem_visita(lst, origem)
+                INSTRUMENTACAO.contar("sequenciar_agenda.paradas", len(lst))
+            ordem, km = memo[chave]
+            minutos = (km / velocidade_kmh * 60 if velocidade_kmh else 0.0) + len(lst) * minutos_por_visita
+            sequenciada[semana_id][dia] = [lst[p] for p in ordem]
+            percursos[semana_id][dia] = {"km": round(km, 2), "minutos": round(minutos),
+                                         "sem_coordenadas": sum(1 for c in lst if not tem_coordenadas(c))}
+            if jornada_minutos and minutos > jornada_minutos:
+                alertas.rotulos_semana[sidx] = semana_id
+                alertas.adicionar("jornada_excedida", sidx, MAPA_DIA_IDX[dia], rota, qtd=round(minutos),
+                                  qtd_min=len(lst), capacidade=int(jornada_minutos))
+        if progresso:
+            progresso(pos + 1, len(agenda))
+    return sequenciada, percursos, alertas
+
+# -------------------------------
+# Geração por rota em paralelo (pool de processos)
+# -------------------------------
+def _processar_rota(tarefa):
+    """Executado no processo trabalhador: gera (e opcionalmente redistribui) a agenda de uma rota."""
+    rota, base, inicio, semanas, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct, opcoes = tarefa
+    # Os alertas saem do painel uma única vez, já com a redistribuição aplicada
+    alertas, freq_desconhecida = validar_cadastro(base)
+    painel = PainelCargas(capacidade_por_dia, limiar_dia_pct, limiar_semana_pct)
+    agenda = montar_buckets(inicio, semanas, base, painel=painel)
+    realocados = []
+    if opcoes is not None:
+        agenda, realocados = redistribuir_balanceado_heap(agenda, capacidade_por_dia, painel=painel, **opcoes)
+    alertas_agenda(agenda, freq_desconhecida, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct,
+                   alertas=alertas, rota=rota, painel=painel)
+    return rota, agenda, alertas, realocados
+
+def gerar_agendas_por_rota(inicio, semanas, clientes, capacidade_por_dia,
+                           limiar_dia_pct=0.5, limiar_semana_pct=0.3, redistribuir=False,
+                           permitir_mover_semanal=False, preservar_dia_semana=False, workers=None):
+    """
+    Gera uma agenda independente por rota, distribuindo as rotas num ProcessPoolExecutor
+    com 'workers' processos (None = número de CPUs; 1 = sem pool, no próprio processo).
+    Retorna (agendas {rota: agenda}, alertas (TabelaAlertas com a coluna rota preenchida),
+    realocados [(rota, nome, semana, origem, destino)]), sempre na ordem das rotas,
+    independente da ordem de conclusão dos processos.
+    """
+    por_rota = {}
+    for c in dedupe_clientes(clientes):
+        por_rota.setdefault(c.get("rota"), []).append(c)
+    opcoes = None
+    if redistribuir:
+        opcoes = {"permitir_mover_semanal": permitir_mover_semanal, "preservar_dia_semana": preservar_dia_semana}
+    tarefas = [
+        (rota, por_rota[rota], inicio, semanas, capacidade_por_dia, limiar_dia_pct, limiar_semana_pct, opcoes)
+        for rota in sorted(por_rota, key=lambda r: (r is None, str(r)))
+    ]
+
+    if workers == 1 or len(tarefas) <= 1:
+        resultados = map(_processar_rota, tarefas)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = workers or os.cpu_count() or 1
+            # map preserva a ordem das tarefas; blocos maiores reduzem o custo de comunicação
+            resultados = list(pool.map(_processar_rota, tarefas, chunksize=max(1, len(tarefas) // (4 * n))))
+
+    agendas, alertas, realocados = {}, TabelaAlertas(), []
+    for rota, agenda, alertas_rota, realocados_rota in resultados:
+        agendas[rota] = agenda
+        alertas.estender(alertas_rota)
+        realocados.extend((rota,) + r for r in realocados_rota)
+    return agendas, alertas, realocados
+
+# -------------------------------
+# Importação em blocos (xlsx / csv / parquet)
+# -------------------------------
+COLUNAS_IMPORTACAO = ["nome", "rota", "dia_semana", "frequencia"]
+TAMANHO_BLOCO_IMPORTACAO = 5000
+
+def ler_blocos_clientes(arquivo, nome_arquivo, tamanho_bloco=TAMANHO_BLOCO_IMPORTACAO):
+    """
+    Lê o arquivo em blocos de até 'tamanho_bloco' linhas, gerando DataFrames com colunas em minúsculas.
+    xlsx usa o modo read-only do openpyxl (linha a linha, sem carregar a planilha inteira).
+    """
+    import pandas as pd
+
+    extensao = nome_arquivo.lower().rsplit(".", 1)[-1]
+    if extensao == "csv":
+        for bloco in pd.read_csv(arquivo, chunksize=tamanho_bloco):
+            bloco.columns = bloco.columns.str.strip().str.lower()
+            yield bloco
+    elif extensao == "parquet":
+        import pyarrow.parquet as pq
+        for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=tamanho_bloco):
+            bloco = lote.to_pandas()
+            bloco.columns = bloco.columns.str.strip().str.lower()
+            yield bloco
+    else:
+        from openpyxl import load_workbook
+        wb = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            linhas = wb.active.iter_rows(values_only=True)
+            cabecalho = next(linhas, None) or ()
+            colunas = [str(h).strip().lower() if h is not None else "" for h in cabecalho]
+            buffer = []
+            for linha in linhas:
+                buffer.append(linha[:len(colunas)])
+                if len(buffer) >= tamanho_bloco:
+                    yield pd.DataFrame(buffer, columns=colunas)
+                    buffer = []
+            if buffer or not colunas:
+                yield pd.DataFrame(buffer, columns=colunas)
+        finally:
+            wb.close()
+
+def contar_linhas_clientes(arquivo, nome_arquivo):
+    """
+    Total de linhas de dados sem ler o arquivo inteiro: metadados no parquet e a dimensão gravada na
+    planilha no xlsx. None no CSV e quando a planilha não informa a dimensão. Volta 'arquivo' ao início.
+    """
+    extensao = nome_arquivo.lower().rsplit(".", 1)[-1]
+    try:
+        if extensao == "csv":
+            return None
+        if extensao == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(arquivo).metadata.num_rows
+        from openpyxl import load_workbook
+        wb = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max(max_row - 1, 0) if max_row else None
+    finally:
+        arquivo.seek(0)
+
+def normalizar_bloco(df):
+    """
+    Valida e normaliza um bloco de forma vetorizada; descarta linhas incompletas ou com frequência não numérica.
+    As colunas opcionais lat/lon (graus decimais) são mantidas quando presentes; valores vazios,
+    não numéricos ou fora da faixa viram None sem descartar a linha. Vários dias em dia_semana
+    ("Quinta, Segunda") ficam na forma canônica ("Segunda,Quinta"); dias inválidos são mantidos
+    como vieram, para o alerta de cadastro. A coluna opcional deslocamento vira inteiro (vazio = 0).
+    """
+    import pandas as pd
+
+    coordenadas = [c for c in CAMPOS_COORDENADAS if c in df.columns]
+    padrao = [c for c in CAMPOS_PADRAO if c in df.columns]
+    df = df[COLUNAS_IMPORTACAO + coordenadas + padrao].dropna(subset=COLUNAS_IMPORTACAO)
+    freq = pd.to_numeric(df["frequencia"], errors="coerce")
+    df = df[freq.notna()]
+    dia_semana = df["dia_semana"].astype(str).str.strip()
+    multiplos = dia_semana.str.contains(SEPARADOR_DIAS, regex=False)
+    if multiplos.any():
+        dia_semana.loc[multiplos] = [formatar_dias(dias_do_padrao(d)) if dias_do_padrao(d) else d
+                                 for d in dia_semana[multiplos]]
+    normalizado = pd.DataFrame({
+        "nome": df["nome"].astype(str).str.strip(),
+        "rota": df["rota"].astype(str).str.strip(),
+        "dia_semana": dia_semana,
+        "frequencia": freq[freq.notna()].astype(int),
+    })
+    if padrao:
+        normalizado["deslocamento"] = pd.to_numeric(df["deslocamento"], errors="coerce").fillna(0).astype(int)
+    if len(coordenadas) == len(CAMPOS_COORDENADAS):
+        lat = pd.to_numeric(df["lat"], errors="coerce")
+        lon = pd.to_numeric(df["lon"], errors="coerce")
+        validas = lat.between(-90, 90) & lon.between(-180, 180)
+        normalizado["lat"] = lat.astype(object).where(validas, None)
+        normalizado["lon"] = lon.astype(object).where(validas, None)
+    return normalizado
+
+@instrumentado("importar_clientes")
+def importar_clientes(arquivo, nome_arquivo, armazem, tamanho_bloco=TAMANHO_BLOCO_IMPORTACAO, progresso=None):
+    """
+    Importa clientes em blocos, gravando no armazém apenas chaves (nome, rota, dia_semana, frequencia) novas.
+    'progresso(linhas_lidas, inseridos)' é chamado ao fim de cada bloco. Retorna {"lidas", "inseridos", "ignorados"}.
+    """
+    existentes_chaves = armazem.chaves()
+    prox_id = armazem.proximo_id()
+    lidas = inseridos = 0
+
+    blocos = ler_blocos_clientes(arquivo, nome_arquivo, tamanho_bloco)
+    while True:
+        with INSTRUMENTACAO.etapa("importar_clientes.leitura"):
+            bloco = next(blocos, None)
+        if bloco is None:
+            break
+        if not set(COLUNAS_IMPORTACAO).issubset(bloco.columns):
+            raise ValueError("O arquivo deve conter as colunas: nome, rota, dia_semana, frequencia.")
+        lidas += len(bloco)
+        with INSTRUMENTACAO.etapa("importar_clientes.normalizacao"):
+            novos = normalizar_bloco(bloco).drop_duplicates(COLUNAS_IMPORTACAO)
+            chaves = list(zip(novos["nome"], novos["rota"], novos["dia_semana"], novos["frequencia"].tolist()))
+            manter = [k not in existentes_chaves for k in chaves]
+            novos = novos[manter]
+        if len(novos):
+            novos.insert(0, "id", range(prox_id, prox_id + len(novos)))
+            with INSTRUMENTACAO.etapa("importar_clientes.gravacao"):
+                armazem.adicionar(novos.to_dict("records"))
+            existentes_chaves.update(k for k, m in zip(chaves, manter) if m)
+            prox_id += len(novos)
+            inseridos += len(novos)
+        if progresso:
+            progresso(lidas, inseridos)
+
+    INSTRUMENTACAO.contar("importar_clientes.linhas", lidas)
+    INSTRUMENTACAO.contar("importar_clientes.inseridos", inseridos)
+    return {"lidas": lidas, "inseridos": inseridos, "ignorados": lidas - inseridos}
+
+# -------------------------------
+# Exportação (xlsx / csv / parquet), em fluxo direto da agenda
+# -------------------------------
+FORMATOS_EXPORTACAO = ("xlsx", "csv", "parquet")
+COLUNAS_AGENDA_EXPORTACAO = ["semana", "data", "dia", "id", "nome", "rota", "dia_semana", "frequencia",
+                             "ordem", "lat", "lon"]
+COLUNAS_ALERTAS_EXPORTACAO = ["severidade", "tipo", "semana", "dia", "rota", "cliente", "mensagem"]
+# Tipos usados no Parquet; as demais colunas são texto
+TIPOS_EXPORTACAO = {"data": "data", "id": "inteiro", "frequencia": "inteiro", "ordem": "inteiro",
+                    "lat": "real", "lon": "real"}
+TAMANHO_LOTE_EXPORTACAO = 50_000
+LIMITE_LINHAS_XLSX = 1_048_575  # linhas por aba no Excel, descontado o cabeçalho
+
+def formato_do_arquivo(nome_arquivo):
+    """Formato de exportação pela extensão do arquivo (None se não for um dos FORMATOS_EXPORTACAO)."""
+    extensao = nome_arquivo.lower().rsplit(".", 1)[-1]
+    return extensao if extensao in FORMATOS_EXPORTACAO else None
+
+def linhas_agenda(agenda, inicio, registros=None, indice_semana=None, progresso=None):
+    """
+    Uma tupla por visita (colunas COLUNAS_AGENDA_EXPORTACAO), gerada direto da agenda, sem listas intermediárias.
+    Aceita a agenda em dicts ou a de índices do motor vetorizado ('registros' = resumo["colunas"]["registros"]).
+    'indice_semana' ({semana_id: índice}) mantém as datas reais quando 'agenda' é um recorte;
+    'progresso(semanas_feitas, total)' é chamado ao fim de cada semana.
+    """
+    for pos, (semana_id, dias) in enumerate(agenda.items()):
+        sidx = indice_semana[semana_id] if indice_semana else pos
+        semana_inicio = inicio + timedelta(weeks=sidx)
+        for d, dia in enumerate(DIAS_SEMANA):
+            data = semana_inicio + timedelta(days=d)
+            for ordem, c in enumerate(dias[dia], 1):
+                if registros is not None:
+                    c = registros[c]
+                yield (semana_id, data, dia, c.get("id"), c.get("nome"), c.get("rota"), c.get("dia_semana"),
+                       c.get("frequencia"), ordem, c.get("lat"), c.get("lon"))
+        if progresso:
+            progresso(pos + 1, len(agenda))
+
+def linhas_alertas(alertas):
+    """Uma tupla por alerta (colunas COLUNAS_ALERTAS_EXPORTACAO); o texto é montado linha a linha."""
+    for i in range(len(alertas)):
+        c = alertas.cliente[i]
+        sidx, d = alertas.semana[i], alertas.dia[i]
+        yield (alertas.severidade(i), alertas.tipo_de(i), alertas.rotulos_semana.get(sidx, f"Semana {sidx + 1}") if sidx >= 0 else "",
+               DIAS_SEMANA[d] if d >= 0 else "", alertas.rota[i], c.get("nome") if c else None, alertas.texto(i))
+
+def escrever_xlsx(destino, abas):
+    """
+    Grava {nome da aba: (colunas, linhas)} em 'destino' (caminho ou arquivo binário) com o modo
+    write-only do openpyxl, que não mantém as células em memória. Acima do limite de linhas do Excel
+    a aba continua em "Nome (2)", "Nome (3)"... Retorna {nome da aba: linhas gravadas} (sem cabeçalhos).
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    contagem = {}
+    for nome, (colunas, linhas) in abas.items():
+        ws = wb.create_sheet(nome)
+        ws.append(list(colunas))
+        na_aba, partes = 0, 1
+        for linha in linhas:
+            if na_aba == LIMITE_LINHAS_XLSX:
+                partes += 1
+                ws = wb.create_sheet(f"{nome} ({partes})")
+                ws.append(list(colunas))
+                na_aba = 0
+            ws.append(linha)
+            na_aba += 1
+        contagem[nome] = na_aba + (partes - 1) * LIMITE_LINHAS_XLSX
+    wb.save(destino)
+    return contagem
+
+def _escrever_csv(destino, colunas, linhas):
+    import csv
+
+    texto = open(destino, "w", newline="", encoding="utf-8") if isinstance(destino, str) else \
+        io.TextIOWrapper(destino, encoding="utf-8", newline="", write_through=True)
+    total = 0
+    try:
+        w = csv.writer(texto)
+        w.writerow(colunas)
+        for linha in linhas:
+            w.writerow(linha)
+            total += 1
+    finally:
+        if isinstance(destino, str):
+            texto.close()
+        else:
+            texto.detach()  # o arquivo binário continua aberto para quem o passou
+    return total
+
+def _escrever_parquet(destino, colunas, linhas, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos = {"data": pa.date32(), "inteiro": pa.int64(), "real": pa.float64()}
+    esquema = pa.schema([(col, tipos.get(TIPOS_EXPORTACAO.get(col), pa.string())) for col in colunas])
+    texto = [i for i, col in enumerate(colunas) if col not in TIPOS_EXPORTACAO]
+    total = 0
+    with pq.ParquetWriter(destino, esquema) as writer:
+        lote = []
+        for linha in itertools.chain(linhas, [None]):
+            if linha is not None:
+                lote.append(linha)
+                if len(lote) < tamanho_lote:
+                    continue
+            if lote:
+                valores = [list(v) for v in zip(*lote)]
+                for i in texto:
+                    valores[i] = [None if v is None else str(v) for v in valores[i]]
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(v, type=campo.type) for v, campo in zip(valores, esquema)], schema=esquema))
+                total += len(lote)
+                lote = []
+    return total
+
+def escrever_linhas(destino, formato, colunas, linhas, aba="Dados"):
+    """Grava um iterável de tuplas em 'destino' (caminho ou arquivo binário); Parquet em lotes. Retorna o nº de linhas."""
+    if formato == "csv":
+        return _escrever_csv(destino, colunas, linhas)
+    if formato == "xlsx":
+        return escrever_xlsx(destino, {aba: (colunas, linhas)})[aba]
+    if formato == "parquet":
+        return _escrever_parquet(destino, colunas, linhas)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+@instrumentado("exportar_agenda")
+def exportar_agenda(destino, agenda, inicio, formato="csv", alertas=None, registros=None, indice_semana=None,
+                    progresso=None):
+    """
+    Exporta a agenda (original ou redistribuída) com datas reais. No xlsx, 'alertas' vira uma segunda aba;
+    em csv/parquet use exportar_alertas num arquivo separado. Retorna o número de linhas gravadas.
+    """
+    linhas = linhas_agenda(agenda, inicio, registros, indice_semana, progresso)
+    if formato == "xlsx" and alertas is not None:
+        total = escrever_xlsx(destino, {"Agenda": (COLUNAS_AGENDA_EXPORTACAO, linhas),
+                                        "Alertas": (COLUNAS_ALERTAS_EXPORTACAO, linhas_alertas(alertas))})["Agenda"]
+    else:
+        total = escrever_linhas(destino, formato, COLUNAS_AGENDA_EXPORTACAO, linhas, aba="Agenda")
+    INSTRUMENTACAO.contar("exportar_agenda.linhas", total)
+    return total
+
+@instrumentado("exportar_alertas")
+def exportar_alertas(destino, alertas, formato="csv"):
+    return escrever_linhas(destino, formato, COLUNAS_ALERTAS_EXPORTACAO, linhas_alertas(alertas), aba="Alertas")
+
+# -------------------------------
+# Armazenamento de clientes (memória ou SQLite)
+# -------------------------------
+TAMANHO_PAGINA_CLIENTES = 50
+
+def _atende_filtros(cliente, filtros):
+    """
+    Igualdade por campo; em "nome", busca o trecho sem diferenciar maiúsculas, e em "dia_semana",
+    clientes que visitam o dia (inclusive os de vários dias).
+    """
+    for campo, valor in filtros.items():
+        if campo == "nome":
+            if str(valor).lower() not in str(cliente.get("nome") or "").lower():
+                return False
+        elif campo == "dia_semana":
+            if valor not in str(cliente.get("dia_semana") or "").split(SEPARADOR_DIAS):
+                return False
+        elif cliente.get(campo) != valor:
+            return False
+    return True
+
+class _VersoesArmazem:
+    """
+    Versões dos armazéns: 'versao' muda a cada inserção e versao_rota(rota) só quando a rota é alterada.
+    Os 'ouvintes' (funções) recebem o conjunto de rotas alteradas depois de cada inserção, fora do lock;
+    o modo servidor os usa para invalidar o cache compartilhado (CacheCompartilhado.invalidar).
+    """
+
+    def __init__(self):
+        self.versao = 0
+        self._versoes_rota = Counter()
+        self.ouvintes = []
+
+    def versao_rota(self, rota=None):
+        """Versão da rota (ou, sem rota, do armazém inteiro), para compor chaves de cache e de tarefas."""
+        return self.versao if rota is None else self._versoes_rota[rota]
+
+    def _registrar_alteracao(self, novos):
+        rotas = {c.get("rota") for c in novos}
+        self.versao += 1
+        for rota in rotas:
+            self._versoes_rota[rota] += 1
+        return rotas
+
+    def _notificar(self, rotas):
+        for ouvinte in list(self.ouvintes):
+            ouvinte(rotas)
+
+class ArmazemClientesMemoria(_VersoesArmazem):
+    """
+    Armazém em memória (lista de dicts), com índice por rota refeito a cada alteração.
+    Mesma interface de ArmazemClientesSQLite; 'versao' muda a cada inserção (ver _VersoesArmazem).
+    """
+
+    def __init__(self, clientes=None):
+        _VersoesArmazem.__init__(self)
+        self._clientes = list(clientes or [])
+        self._lock = threading.Lock()
+        self._indice = None
+
+    def __len__(self):
+        return len(self._clientes)
+
+    def _indexar(self):
+        if self._indice is None:
+            unicos = dedupe_clientes(self._clientes)
+            por_rota = {}
+            for c in unicos:
+                por_rota.setdefault(c.get("rota"), []).append(c)
+            self._indice = (por_rota, unicos)
+        return self._indice
+
+    def todos(self):
+        """Todos os registros, na ordem de cadastro (inclusive ids repetidos)."""
+        with self._lock:
+            return list(self._clientes)
+
+    def listar(self, rota=None):
+        """Clientes deduplicados por id (primeiro registro), opcionalmente de uma só rota."""
+        with self._lock:
+            por_rota, unicos = self._indexar()
+            return list(unicos) if rota is None else list(por_rota.get(rota, []))
+
+    def rotas(self):
+        with self._lock:
+            return sorted({c["rota"] for c in self._clientes})
+
+    def chaves(self):
+        """Chaves (nome, rota, dia_semana, frequencia) já cadastradas, usadas no dedupe da importação."""
+        with self._lock:
+            return {(c["nome"], c["rota"], c["dia_semana"], c["frequencia"]) for c in self._clientes}
+
+    def proximo_id(self):
+        with self._lock:
+            return max((c["id"] for c in self._clientes), default=0) + 1
+
+    def _filtrados(self, filtros):
+        desconhecidos = set(filtros or ()) - set(CAMPOS_CLIENTE)
+        if desconhecidos:
+            raise ValueError(f"Campo de filtro desconhecido: {', '.join(sorted(desconhecidos))}")
+        with self._lock:
+            clientes = list(self._clientes)
+        return [c for c in clientes if _atende_filtros(c, filtros)] if filtros else clientes
+
+    def contar(self, filtros=None):
+        """Quantidade de registros (inclusive ids repetidos) que atendem 'filtros' ({campo: valor})."""
+        return len(self._filtrados(filtros))
+
+    def pagina(self, filtros=None, ordenar_por=None, decrescente=False, inicio=0, limite=TAMANHO_PAGINA_CLIENTES):
+        """
+        Fatia [inicio, inicio + limite) dos registros filtrados, ordenados por 'ordenar_por'
+        (vazios primeiro; empates e ausência de ordenação seguem a ordem de cadastro). Só a fatia é copiada.
+        """
+        clientes = self._filtrados(filtros)
+        if ordenar_por in CAMPOS_CLIENTE:
+            clientes = sorted(clientes, key=lambda c: (c.get(ordenar_por) is not None, c.get(ordenar_por)),
+                              reverse=decrescente)
+        return [{k: c.get(k) for k in CAMPOS_CLIENTE + CAMPOS_COORDENADAS + CAMPOS_PADRAO}
+                for c in clientes[inicio:inicio + limite]]
+
+    def adicionar(self, novos):
+        with self._lock:
+            self._clientes.extend(novos)
+            self._indice = None
+            rotas = self._registrar_alteracao(novos)
+        self._notificar(rotas)
+
+_CAMPOS_SQLITE = CAMPOS_CLIENTE + CAMPOS_COORDENADAS + CAMPOS_PADRAO
+_COLUNAS_SQLITE = ", ".join(_CAMPOS_SQLITE)
+
+class ArmazemClientesSQLite(_VersoesArmazem):
+    """
+    Armazém persistente em SQLite com índices em id, rota e dia_semana.
+    Uma única conexão é compartilhada entre sessões (threads) sob um lock;
+    as listagens ficam em memória até a próxima inserção.
+    """
+
+    def __init__(self, caminho, exemplos=None):
+        _VersoesArmazem.__init__(self)
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._memo = {}
+        self._con = sqlite3.connect(caminho, check_same_thread=False)
+        with self._con:
+            self._con.executescript("""
+                CREATE TABLE IF NOT EXISTS clientes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id INTEGER, nome TEXT, rota TEXT, dia_semana TEXT, frequencia INTEGER,
+                    lat REAL, lon REAL, deslocamento INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_clientes_id ON clientes(id);
+                CREATE INDEX IF NOT EXISTS idx_clientes_rota ON clientes(rota);
+                CREATE INDEX IF NOT EXISTS idx_clientes_dia ON clientes(dia_semana);
+            """)
+            # Bancos criados antes das coordenadas e do deslocamento ganham as colunas (vazias)
+            existentes = {linha[1] for linha in self._con.execute("PRAGMA table_info(clientes)")}
+            for campo in CAMPOS_COORDENADAS + CAMPOS_PADRAO:
+                if campo not in existentes:
+                    tipo = "REAL" if campo in CAMPOS_COORDENADAS else "INTEGER"
+                    self._con.execute(f"ALTER TABLE clientes ADD COLUMN {campo} {tipo}")
+        if exemplos and len(self) == 0:
+            self.adicionar(exemplos)
+
+    def __len__(self):
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+
+    def _consultar(self, chave, sql, params=()):
+        with self._lock:
+            if chave not in self._memo:
+                linhas = self._con.execute(sql, params).fetchall()
+                self._memo[chave] = [dict(zip(_CAMPOS_SQLITE, linha)) for linha in linhas]
+            return list(self._memo[chave])
+
+    def todos(self):
+        """Todos os registros, na ordem de cadastro (inclusive ids repetidos)."""
+        return self._consultar(("todos",), f"SELECT {_COLUNAS_SQLITE} FROM clientes ORDER BY seq")
+
+    def listar(self, rota=None):
+        """Clientes deduplicados por id (primeiro registro), opcionalmente de uma só rota (via índice)."""
+        primeiro_do_id = "c.seq = (SELECT MIN(seq) FROM clientes c2 WHERE c2.id IS c.id)"
+        if rota is None:
+            return self._consultar(("listar", None), f"""
+                SELECT {_COLUNAS_SQLITE} FROM clientes c
+                WHERE {primeiro_do_id} ORDER BY seq""")
+        return self._consultar(("listar", rota), f"""
+            SELECT {_COLUNAS_SQLITE} FROM clientes c
+            WHERE rota = ? AND {primeiro_do_id} ORDER BY seq""", (rota,))
+
+    def rotas(self):
+        with self._lock:
+            return [r for (r,) in self._con.execute("SELECT DISTINCT rota FROM clientes ORDER BY rota")]
+
+    def chaves(self):
+        """Chaves (nome, rota, dia_semana, frequencia) já cadastradas, usadas no dedupe da importação."""
+        with self._lock:
+            return set(self._con.execute("SELECT nome, rota, dia_semana, frequencia FROM clientes"))
+
+    def proximo_id(self):
+        with self._lock:
+            return (self._con.execute("SELECT MAX(id) FROM clientes").fetchone()[0] or 0) + 1
+
+    def _where(self, filtros):
+        condicoes, params = [], []
+        for campo, valor in (filtros or {}).items():
+            if campo not in CAMPOS_CLIENTE:
+                raise ValueError(f"Campo de filtro desconhecido: {campo}")
+            if campo == "nome":
+                condicoes.append("instr(lower(coalesce(nome, '')), lower(?)) > 0")
+            elif campo == "dia_semana":
+                # Também casa clientes de vários dias ("Segunda,Quinta")
+                condicoes.append("instr(',' || dia_semana || ',', ',' || ? || ',') > 0")
+            else:
+                condicoes.append(f"{campo} IS ?")
+            params.append(valor)
+        return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), params
+
+    def contar(self, filtros=None):
+        """Quantidade de registros (inclusive ids repetidos) que atendem 'filtros' ({campo: valor})."""
+        where, params = self._where(filtros)
+        with self._lock:
+            return self._con.execute(f"SELECT COUNT(*) FROM clientes{where}", params).fetchone()[0]
+
+    def pagina(self, filtros=None, ordenar_por=None, decrescente=False, inicio=0, limite=TAMANHO_PAGINA_CLIENTES):
+        """Fatia [inicio, inicio + limite) dos registros filtrados e ordenados, via LIMIT/OFFSET no banco."""
+        where, params = self._where(filtros)
+        ordem = "seq"
+        if ordenar_por in CAMPOS_CLIENTE:
+            ordem = f"{ordenar_por} {'DESC' if decrescente else 'ASC'}, seq"
+        with self._lock:
+            linhas = self._con.execute(
+                f"SELECT {_COLUNAS_SQLITE} FROM clientes{where} ORDER BY {ordem} LIMIT ? OFFSET ?",
+                params + [limite, inicio],
+            ).fetchall()
+        return [dict(zip(_CAMPOS_SQLITE, linha)) for linha in linhas]
+
+    def adicionar(self, novos):
+        with self._lock, self._con:
+            self._con.executemany(
+                f"INSERT INTO clientes ({_COLUNAS_SQLITE}) VALUES ({', '.join('?' * len(_CAMPOS_SQLITE))})",
+                ([c.get(k) for k in _CAMPOS_SQLITE] for c in novos),
+            )
+            self._memo.clear()
+            rotas = self._registrar_alteracao(novos)
+        self._notificar(rotas)
+
+def criar_armazem(destino=None, regiao=None):
+    """
+    Cria o armazém indicado por 'destino' (ou pela variável ROTEIRIZADOR_ARMAZEM):
+    "memoria" ou o caminho de um arquivo SQLite (padrão: roteirizador.db).
+    Com 'regiao', cada região tem seu próprio arquivo (roteirizador_<regiao>.db) ou armazém em memória.
+    """
+    destino = destino or os.environ.get("ROTEIRIZADOR_ARMAZEM", "roteirizador.db")
+    if regiao is not None and destino != "memoria":
+        base, extensao = os.path.splitext(destino)
+        destino = f"{base}_{regiao}{extensao}"
+    if destino == "memoria":
+        return ArmazemClientesMemoria(CLIENTES_EXEMPLO)
+    return ArmazemClientesSQLite(destino, exemplos=CLIENTES_EXEMPLO)
+
+# -------------------------------
+# Tarefas em segundo plano (geração, redistribuição e importação)
+# -------------------------------
+TAREFAS_CONCLUIDAS_MAX = 16
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa (em reportar/verificar_cancelamento) depois de um pedido de cancelamento."""
+
+class Tarefa:
+    """
+    Handle de uma tarefa submetida ao GerenciadorTarefas.
+    A função executada recebe a própria tarefa como primeiro argumento e chama reportar()
+    para publicar progresso (0 a 1), uma mensagem e resultados parciais; o cancelamento é
+    cooperativo e acontece na próxima chamada a reportar() ou verificar_cancelamento().
+    estado: "pendente", "executando", "concluida", "cancelada" ou "erro" (exceção em 'erro').
+    """
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.estado = "pendente"
+        self.progresso = 0.0
+        self.mensagem = ""
+        self.resultado = None
+        self.erro = None
+        self._parciais = []
+        self._cancelar = threading.Event()
+        self._fim = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    @property
+    def terminada(self):
+        return self.estado in ("concluida", "cancelada", "erro")
+
+    def cancelar(self):
+        self._cancelar.set()
+        if self._future is not None and self._future.cancel():
+            self.estado = "cancelada"  # ainda estava na fila do pool
+            self._fim.set()
+
+    def aguardar(self, timeout=None):
+        """Espera a tarefa terminar por até 'timeout' segundos; retorna True se terminou."""
+        return self._fim.wait(timeout)
+
+    def verificar_cancelamento(self):
+        if self._cancelar.is_set():
+            raise TarefaCancelada()
+
+    def reportar(self, progresso=None, mensagem=None, parcial=None):
+        self.verificar_cancelamento()
+        with self._lock:
+            if progresso is not None:
+                self.progresso = progresso
+            if mensagem is not None:
+                self.mensagem = mensagem
+            if parcial is not None:
+                self._parciais.append(parcial)
+
+    def parciais(self, desde=0):
+        """Resultados parciais publicados até agora, a partir da posição 'desde'."""
+        with self._lock:
+            return self._parciais[desde:]
+
+    def _executar(self, funcao, args, kwargs):
+        if self._cancelar.is_set():
+            self.estado = "cancelada"
+            self._fim.set()
+            return
+        self.estado = "executando"
+        try:
+            with INSTRUMENTACAO.etapa(f"tarefa.{funcao.__name__}"):
+                self.resultado = funcao(self, *args, **kwargs)
+            self.progresso = 1.0
+            self.estado = "concluida"
+        except TarefaCancelada:
+            self.estado = "cancelada"
+        except Exception as e:
+            self.erro = e
+            self.estado = "erro"
+        finally:
+            self._fim.set()
+
+class GerenciadorTarefas:
+    """
+    Pool de threads para tarefas longas, compartilhado por todas as sessões do processo.
+    Tarefas são identificadas por uma chave (tupla com os parâmetros): submeter() com a chave
+    de uma tarefa em andamento ou concluída devolve o mesmo handle, então sessões com os mesmos
+    parâmetros reaproveitam o resultado. Tarefas canceladas ou com erro são refeitas.
+    Só as 'max_concluidas' tarefas terminadas mais recentes são guardadas.
+    """
+
+    def __init__(self, workers=None, max_concluidas=TAREFAS_CONCLUIDAS_MAX):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.max_concluidas = max_concluidas
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="roteirizador")
+        self._tarefas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tarefas)
+
+    def submeter(self, chave, funcao, *args, **kwargs):
+        """Agenda funcao(tarefa, *args, **kwargs) no pool, ou devolve a tarefa existente com a mesma chave."""
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and tarefa.estado not in ("cancelada", "erro"):
+                self._tarefas.move_to_end(chave)
+                return tarefa
+            tarefa = Tarefa(chave)
+            self._tarefas[chave] = tarefa
+            terminadas = [k for k, t in self._tarefas.items() if t.terminada]
+            for k in terminadas[:max(0, len(terminadas) - self.max_concluidas)]:
+                del self._tarefas[k]
+            tarefa._future = self._pool.submit(tarefa._executar, funcao, args, kwargs)
+            return tarefa
+
+    def obter(self, chave):
+        with self._lock:
+            return self._tarefas.get(chave)
+
+    def encerrar(self):
+        """Cancela as tarefas pendentes/em andamento e libera o pool (sem esperar)."""
+        with self._lock:
+            for tarefa in self._tarefas.values():
+                tarefa.cancelar()
+        self._pool.shutdown(wait=False)
+
+def tarefa_gerar_agenda(tarefa, inicio, semanas, clientes, capacidade_por_dia, rota=None,
+                        limiar_dia_pct=0.5, limiar_semana_pct=0.3, cache=None):
+    """gerar_agenda_cacheada como tarefa; o resultado é (agenda, alertas, resumo)."""
+    tarefa.reportar(0.0, f"{len(clientes)} clientes, {semanas} semanas")
+    return gerar_agenda_cacheada(inicio, semanas, clientes, capacidade_por_dia, rota=rota,
+                                 limiar_dia_pct=limiar_dia_pct, limiar_semana_pct=limiar_semana_pct, cache=cache)
+
+def tarefa_redistribuir(tarefa, agenda, capacidade_por_dia, permitir_mover_semanal=False, preservar_dia_semana=False,
+                        painel=None):
+    """
+    redistribuir_balanceado_heap semana a semana (as semanas são independentes); cada semana ganha um dict
+    próprio e só os dias alterados ganham listas novas (os demais continuam compartilhados com 'agenda').
+    Cada semana ajustada é publicada como parcial (semana_id, dias, realocados da semana).
+    Com 'painel' (PainelCargas da agenda, não modificado), um recorte dele acompanha os movimentos.
+    O resultado é (agenda ajustada, realocados, None, painel ajustado ou None), no formato de
+    tarefa_redistribuir_global.
+    """
+    ajustada, realocados = {}, []
+    painel = painel.recorte(agenda) if painel is not None else None
+    total = len(agenda)
+    for n, (semana_id, dias) in enumerate(agenda.items(), 1):
+        tarefa.verificar_cancelamento()
+        semana, realocados_semana = redistribuir_balanceado_heap(
+            {semana_id: dict(dias)}, capacidade_por_dia,
+            permitir_mover_semanal=permitir_mover_semanal, preservar_dia_semana=preservar_dia_semana, painel=painel,
+        )
+        ajustada.update(semana)
+        realocados.extend(realocados_semana)
+        tarefa.reportar(n / total, f"{n} de {total} semanas", parcial=(semana_id, semana[semana_id], realocados_semana))
+    return ajustada, realocados, None, painel
+
+def tarefa_redistribuir_global(tarefa, inicio, semanas, clientes, capacidade_por_dia, permitir_mover_semanal=False,
+                               preservar_dia_semana=False, tempo_limite=5.0):
+    """redistribuir_global como tarefa; o resultado é (agenda, realocados, relatorio, None)."""
+    tarefa.reportar(0.0, f"otimizando (até {tempo_limite:g} s)")
+    return redistribuir_global(inicio, semanas, clientes, capacidade_por_dia,
+                               permitir_mover_semanal=permitir_mover_semanal,
+                               preservar_dia_semana=preservar_dia_semana, tempo_limite=tempo_limite) + (None,)
+
+def tarefa_importar(tarefa, arquivo, nome_arquivo, armazem, tamanho_total=None,
+                    tamanho_bloco=TAMANHO_BLOCO_IMPORTACAO):
+    """
+    importar_clientes como tarefa, com progresso a cada bloco: linhas lidas sobre o total de
+    contar_linhas_clientes (xlsx e parquet) ou, no CSV, posição de leitura sobre 'tamanho_total' bytes.
+    Sem total conhecido, só a mensagem avança. Ao cancelar, os blocos já gravados no armazém são mantidos.
+    """
+    csv = nome_arquivo.lower().endswith(".csv")
+    total_linhas = None if csv else contar_linhas_clientes(arquivo, nome_arquivo)
+
+    def progresso(lidas, inseridos):
+        if total_linhas:
+            fracao = min(lidas / total_linhas, 1.0)
+        elif csv and tamanho_total:
+            fracao = min(arquivo.tell() / tamanho_total, 1.0)
+        else:
+            fracao = None
+        tarefa.reportar(fracao, f"{lidas} linhas lidas, {inseridos} clientes novos")
+
+    return importar_clientes(arquivo, nome_arquivo, armazem, tamanho_bloco, progresso=progresso)
+
+def tarefa_sequenciar(tarefa, agenda, **opcoes):
+    """sequenciar_agenda como tarefa, com progresso por semana; o resultado é (agenda, percursos, alertas)."""
+    def progresso(feitas, total):
+        tarefa.reportar(feitas / total, f"{feitas} de {total} semanas")
+
+    return sequenciar_agenda(agenda, progresso=progresso, **opcoes)
+
+def tarefa_exportar(tarefa, agenda, inicio, formato, alertas=None, indice_semana=None):
+    """
+    Exporta para memória, com progresso por semana. O resultado é {"agenda": bytes, "alertas": bytes ou None,
+    "linhas": nº de linhas}; no xlsx os alertas vão numa aba do mesmo arquivo.
+    """
+    def progresso(feitas, total):
+        tarefa.reportar(feitas / total, f"{feitas} de {total} semanas")
+
+    saida = io.BytesIO()
+    linhas = exportar_agenda(saida, agenda, inicio, formato, alertas=alertas if formato == "xlsx" else None,
+                             indice_semana=indice_semana, progresso=progresso)
+    saida_alertas = None
+    if alertas is not None and formato != "xlsx":
+        saida_alertas = io.BytesIO()
+        exportar_alertas(saida_alertas, alertas, formato)
+    return {"agenda": saida.getvalue(), "alertas": saida_alertas.getvalue() if saida_alertas else None,
+            "linhas": linhas}
+
+def tarefa_cenarios(tarefa, clientes, cenarios, inicio, semanas, capacidade_por_dia, rota=None):
+    """avaliar_cenarios como tarefa, com progresso (e ponto de cancelamento) a cada cenário concluído."""
+    def progresso(feitos, total):
+        tarefa.reportar(feitos / total, f"{feitos} de {total} cenários")
+
+    return avaliar_cenarios(clientes, cenarios, inicio, semanas, capacidade_por_dia, rota=rota, progresso=progresso)
@@ -0,0 +1,150 @@
+"""CacheCompartilhado: orçamento em bytes por região, invalidação por rota e cálculo único em faltas simultâneas."""
+
+import datetime
+import threading
+
+import pytest
+
+from roteirizador_core import ArmazemClientesMemoria, CacheCompartilhado, estimar_bytes, gerar_agenda_cacheada
+
+VALOR = bytes(1000)
+TAMANHO = estimar_bytes(VALOR)
+ESPERA = 5
+
+
+def valor(n):
+    """Valores distintos com o mesmo tamanho estimado."""
+    return n.to_bytes(4, "big") + bytes(996)
+
+
+def test_orcamento_por_regiao_descarta_o_mais_antigo_so_da_regiao():
+    cache = CacheCompartilhado(limite_bytes=10 * TAMANHO, limite_por_inquilino=2 * TAMANHO)
+    cache.obter("B", "b1", lambda: valor(0))
+    for n in range(3):
+        cache.obter("A", f"a{n}", lambda n=n: valor(n))
+
+    assert cache.estatisticas() == {"A": {"entradas": 2, "bytes": 2 * TAMANHO},
+                                    "B": {"entradas": 1, "bytes": TAMANHO}}
+    assert cache.descartes == 1 and cache.bytes == 3 * TAMANHO
+    assert ("A", "a0") not in cache._itens and ("B", "b1") in cache._itens
+
+    # Usar a1 o torna o mais recente: o próximo descarte da região é a2
+    cache.obter("A", "a1", lambda: pytest.fail("a1 deveria estar no cache"))
+    cache.obter("A", "a3", lambda: valor(3))
+    assert [c for c in cache._itens if c[0] == "A"] == [("A", "a1"), ("A", "a3")]
+
+
+def test_orcamento_global_entre_regioes_e_valor_grande_demais():
+    cache = CacheCompartilhado(limite_bytes=3 * TAMANHO)
+    for n, regiao in enumerate("ABAB"):
+        cache.obter(regiao, n, lambda n=n: valor(n))
+    assert list(cache._itens) == [("B", 1), ("A", 2), ("B", 3)]
+    assert cache.bytes == 3 * TAMANHO and cache.descartes == 1
+
+    grande = bytes(10 * TAMANHO)
+    assert cache.obter("A", "grande", lambda: grande) is grande  # devolvido, mas não guardado
+    assert ("A", "grande") not in cache._itens and cache.bytes == 3 * TAMANHO
+
+
+def test_invalidar_so_as_rotas_alteradas():
+    cache = CacheCompartilhado()
+    cache.obter("A", "r1", lambda: valor(1), rotas=("R1",))
+    cache.obter("A", "r2", lambda: valor(2), rotas=("R2",))
+    cache.obter("A", "r1r2", lambda: valor(3), rotas=("R1", "R2"))
+    cache.obter("A", "base", lambda: valor(4))  # depende da base inteira
+    cache.obter("B", "r1", lambda: valor(5), rotas=("R1",))
+
+    assert cache.invalidar("A", ["R1"]) == 3
+    assert set(cache._itens) == {("A", "r2"), ("B", "r1")}
+    assert cache.bytes == 2 * TAMANHO
+
+    assert cache.invalidar("A") == 1
+    assert set(cache._itens) == {("B", "r1")}
+
+
+def test_calculo_invalidado_durante_a_falta_nao_e_guardado():
+    cache = CacheCompartilhado()
+
+    def calcular():
+        cache.invalidar("A", ["R1"])  # o cadastro muda enquanto o valor é calculado
+        return valor(1)
+
+    assert cache.obter("A", "r1", calcular, rotas=("R1",)) == valor(1)
+    assert len(cache) == 0
+    cache.obter("A", "r2", lambda: valor(2), rotas=("R2",))
+    assert len(cache) == 1
+
+
+def test_faltas_simultaneas_calculam_uma_vez():
+    cache = CacheCompartilhado()
+    liberar = threading.Event()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(ESPERA)
+        return object()
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(cache.obter("A", "k", calcular)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    while not chamadas:
+        liberar.wait(0.01)
+    liberar.set()
+    for t in threads:
+        t.join(ESPERA)
+
+    assert len(chamadas) == 1 and len(resultados) == 8
+    assert all(r is resultados[0] for r in resultados)
+    assert cache.faltas == 1 and cache.acertos == 7
+
+
+def test_erro_no_calculo_chega_a_quem_espera_e_nao_fica_no_cache():
+    cache = CacheCompartilhado()
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def falhar():
+        comecou.set()
+        liberar.wait(ESPERA)
+        raise RuntimeError("falhou")
+
+    erros = []
+
+    def pedir():
+        try:
+            cache.obter("A", "k", falhar)
+        except RuntimeError as e:
+            erros.append(e)
+
+    primeira = threading.Thread(target=pedir)
+    primeira.start()
+    assert comecou.wait(ESPERA)
+    segunda = threading.Thread(target=pedir)
+    segunda.start()
+    liberar.set()
+    primeira.join(ESPERA)
+    segunda.join(ESPERA)
+
+    assert len(erros) == 2 and len(cache) == 0
+    assert cache.obter("A", "k", lambda: valor(1)) == valor(1)
+
+
+def test_agenda_cacheada_invalidada_pelo_armazem_so_na_rota_alterada():
+    inicio = datetime.date(2025, 12, 24)
+    armazem = ArmazemClientesMemoria([
+        {"id": i, "nome": f"Cliente {i}", "rota": rota, "dia_semana": "Segunda", "frequencia": 7}
+        for i, rota in enumerate(["BR001", "BR002"] * 5)
+    ])
+    cache = CacheCompartilhado()
+    armazem.ouvintes.append(lambda rotas: cache.invalidar("Sul", rotas))
+    escopo = cache.escopo("Sul")
+
+    br002 = gerar_agenda_cacheada(inicio, 4, armazem.todos(), 3, rota="BR002", cache=escopo)
+    gerar_agenda_cacheada(inicio, 4, armazem.todos(), 3, rota="BR001", cache=escopo)
+    armazem.adicionar([{"id": 10, "nome": "Novo", "rota": "BR001", "dia_semana": "Terça", "frequencia": 7}])
+
+    assert gerar_agenda_cacheada(inicio, 4, armazem.todos(), 3, rota="BR002", cache=escopo) is br002
+    br001 = gerar_agenda_cacheada(inicio, 4, armazem.todos(), 3, rota="BR001", cache=escopo)
+    assert [c["nome"] for c in next(iter(br001[0].values()))["Terça"]] == ["Novo"]
@@ -0,0 +1,76 @@
+"""avaliar_cenarios: a base compartilhada não muda e cada cenário dá o mesmo resultado que rodando sozinho."""
+
+import copy
+import datetime
+import random
+
+import pytest
+
+from roteirizador_core import DIAS_SEMANA, avaliar_cenarios, montar_buckets
+
+INICIO = datetime.date(2025, 12, 24)
+SEMANAS = 8
+CENARIOS = [
+    {"nome": "Atual"},
+    {"nome": "Sem redistribuição", "redistribuir": "nenhuma"},
+    {"nome": "Capacidade menor", "capacidade_por_dia": 6},
+    {"nome": "Preservando o dia", "capacidade_por_dia": 6, "preservar_dia_semana": True},
+    {"nome": "Global", "redistribuir": "global", "tempo_limite": 60},
+    {"nome": "Global com semanais", "redistribuir": "global", "capacidade_por_dia": 6,
+     "permitir_mover_semanal": True, "tempo_limite": 60},
+    {"nome": "Outro horizonte", "inicio": datetime.date(2026, 1, 5), "semanas": 4},
+]
+
+
+def clientes_aleatorios():
+    r = random.Random(18)
+    return [
+        {"id": i, "nome": f"Cliente {i}", "rota": r.choice(["BR001", "BR002"]),
+         "dia_semana": ",".join(r.sample(DIAS_SEMANA[:3], r.choice([1, 1, 1, 2]))),
+         "frequencia": r.choice([7, 14, 21, 28, 30, 60]), "deslocamento": r.randint(0, 1)}
+        for i in range(120)
+    ]
+
+
+def ids(agenda):
+    return {semana_id: {dia: [c["id"] for c in lst] for dia, lst in dias.items()} for semana_id, dias in agenda.items()}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cenarios_iguais_aos_isolados_e_base_intacta(workers):
+    clientes = clientes_aleatorios()
+    copia = copy.deepcopy(clientes)
+    base = ids(montar_buckets(INICIO, SEMANAS, clientes))
+
+    feitos = []
+    resultados = avaliar_cenarios(clientes, CENARIOS, INICIO, SEMANAS, 8, workers=workers,
+                                  progresso=lambda n, total: feitos.append((n, total)))
+
+    assert clientes == copia
+    assert feitos == [(n, len(CENARIOS)) for n in range(1, len(CENARIOS) + 1)]
+    assert [r["nome"] for r in resultados] == [c["nome"] for c in CENARIOS]
+    for cenario, resultado in zip(CENARIOS, resultados):
+        (sozinho,) = avaliar_cenarios(clientes, [cenario], INICIO, SEMANAS, 8)
+        assert resultado["metricas"] == sozinho["metricas"]
+        assert ids(resultado["agenda"]) == ids(sozinho["agenda"])
+        assert resultado["realocados"] == sozinho["realocados"]
+
+    # A base não muda: o cenário sem redistribuição continua igual a ela, e os dias não alterados são os mesmos
+    # objetos da base em todos os cenários do mesmo horizonte
+    sem_redistribuicao = resultados[1]["agenda"]
+    assert ids(sem_redistribuicao) == base
+    for resultado in resultados:
+        if resultado["nome"] == "Outro horizonte":
+            continue
+        compartilhados = sum(1 for semana_id, dias in resultado["agenda"].items() for dia, lst in dias.items()
+                             if lst is sem_redistribuicao[semana_id][dia])
+        assert compartilhados + resultado["metricas"]["dias_alterados"] == SEMANAS * len(DIAS_SEMANA)
+
+
+def test_rota_e_modo_desconhecido():
+    clientes = clientes_aleatorios()
+    (resultado,) = avaliar_cenarios(clientes, [{"nome": "BR001", "redistribuir": "nenhuma"}], INICIO, SEMANAS, 8,
+                                    rota="BR001")
+    assert {c["rota"] for dias in resultado["agenda"].values() for lst in dias.values() for c in lst} == {"BR001"}
+    with pytest.raises(ValueError):
+        avaliar_cenarios(clientes, [{"nome": "x", "redistribuir": "otimo"}], INICIO, SEMANAS, 8)
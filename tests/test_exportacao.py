@@ -0,0 +1,157 @@
+"""Exportação em csv, xlsx e parquet: ida e volta contra a agenda, motor vetorizado e abas acima do limite do Excel."""
+
+import datetime
+import io
+import math
+import random
+
+import pandas as pd
+import pytest
+
+import roteirizador_core
+from roteirizador_core import (
+    COLUNAS_AGENDA_EXPORTACAO, COLUNAS_ALERTAS_EXPORTACAO, DIAS_SEMANA, FORMATOS_EXPORTACAO, exportar_agenda,
+    exportar_alertas, gerar_agenda, gerar_agenda_vetorizada, linhas_agenda, linhas_alertas,
+)
+
+INICIO = datetime.date(2025, 12, 24)
+SEMANAS = 5
+CAPACIDADE = 4
+
+
+def clientes_com_alertas():
+    """Clientes com e sem coordenadas, vários dias e cadastros que geram alertas."""
+    r = random.Random(16)
+    clientes = []
+    for i in range(40):
+        c = {"id": i + 1, "nome": f"Cliente {i}", "rota": r.choice(["BR001", "BR002"]),
+             "dia_semana": ",".join(r.sample(DIAS_SEMANA[:5], r.choice([1, 1, 2]))),
+             "frequencia": r.choice([7, 14, 28, 30])}
+        if r.random() < 0.7:
+            c["lat"], c["lon"] = round(r.uniform(-24, -23), 6), round(r.uniform(-47, -46), 6)
+        clientes.append(c)
+    clientes.append({"id": 99, "nome": "Sem dia", "rota": "BR001", "dia_semana": "Feriado", "frequencia": 7})
+    return clientes
+
+
+@pytest.fixture(scope="module")
+def gerada():
+    agenda, alertas, _ = gerar_agenda(INICIO, SEMANAS, clientes_com_alertas(), CAPACIDADE)
+    return agenda, alertas
+
+
+def normalizar(linhas, colunas):
+    """
+    Linhas como tuplas comparáveis, qualquer que seja o formato de origem (NaN e texto vazio -> None,
+    datas -> date): no csv e no xlsx, célula vazia e texto vazio são a mesma coisa.
+    """
+    def valor(coluna, v):
+        if v is None or v == "" or (isinstance(v, float) and math.isnan(v)) or v is pd.NaT:
+            return None
+        if coluna == "data":
+            return pd.Timestamp(v).date()
+        if coluna in ("id", "frequencia", "ordem"):
+            return int(v)
+        if coluna in ("lat", "lon"):
+            return float(v)
+        return str(v)
+    return [tuple(valor(col, v) for col, v in zip(colunas, linha)) for linha in linhas]
+
+
+def ler(caminho, formato):
+    """{aba: linhas} do arquivo gravado (uma única aba fora do xlsx)."""
+    if formato == "csv":
+        abas = {"": pd.read_csv(caminho, keep_default_na=False, na_values=[""])}
+    elif formato == "parquet":
+        abas = {"": pd.read_parquet(caminho)}
+    else:
+        abas = pd.read_excel(caminho, sheet_name=None, engine="openpyxl")
+    return {nome: list(df.astype(object).itertuples(index=False, name=None)) for nome, df in abas.items()}
+
+
+@pytest.mark.parametrize("formato", FORMATOS_EXPORTACAO)
+def test_agenda_ida_e_volta(tmp_path, gerada, formato):
+    agenda, _ = gerada
+    esperado = list(linhas_agenda(agenda, INICIO))
+    assert len(esperado) == sum(len(lst) for dias in agenda.values() for lst in dias.values())
+
+    caminho = str(tmp_path / f"agenda.{formato}")
+    assert exportar_agenda(caminho, agenda, INICIO, formato) == len(esperado)
+    (lidas,) = ler(caminho, formato).values()
+    assert normalizar(lidas, COLUNAS_AGENDA_EXPORTACAO) == normalizar(esperado, COLUNAS_AGENDA_EXPORTACAO)
+
+
+@pytest.mark.parametrize("formato", FORMATOS_EXPORTACAO)
+def test_agenda_vetorizada_igual_a_de_dicts(tmp_path, gerada, formato):
+    agenda, _ = gerada
+    vetorizada, _, resumo = gerar_agenda_vetorizada(INICIO, SEMANAS, clientes_com_alertas(), CAPACIDADE)
+    registros = resumo["colunas"]["registros"]
+    esperado = list(linhas_agenda(agenda, INICIO))
+    assert list(linhas_agenda(vetorizada, INICIO, registros=registros)) == esperado
+
+    caminho = str(tmp_path / f"vetorizada.{formato}")
+    assert exportar_agenda(caminho, vetorizada, INICIO, formato, registros=registros) == len(esperado)
+    (lidas,) = ler(caminho, formato).values()
+    assert normalizar(lidas, COLUNAS_AGENDA_EXPORTACAO) == normalizar(esperado, COLUNAS_AGENDA_EXPORTACAO)
+
+
+def test_recorte_mantem_datas_reais(gerada):
+    agenda, _ = gerada
+    semanas = list(agenda)
+    recorte = {semanas[2]: agenda[semanas[2]]}
+    linhas = list(linhas_agenda(recorte, INICIO, indice_semana={semana: i for i, semana in enumerate(semanas)}))
+    assert linhas == [linha for linha in linhas_agenda(agenda, INICIO) if linha[0] == semanas[2]]
+    assert {linha[1] for linha in linhas} <= {INICIO + datetime.timedelta(weeks=2, days=d) for d in range(7)}
+
+
+@pytest.mark.parametrize("formato", FORMATOS_EXPORTACAO)
+def test_alertas_ida_e_volta(tmp_path, gerada, formato):
+    _, alertas = gerada
+    esperado = list(linhas_alertas(alertas))
+    assert len(esperado) == len(alertas) > 0
+
+    caminho = str(tmp_path / f"alertas.{formato}")
+    assert exportar_alertas(caminho, alertas, formato) == len(esperado)
+    (lidas,) = ler(caminho, formato).values()
+    assert normalizar(lidas, COLUNAS_ALERTAS_EXPORTACAO) == normalizar(esperado, COLUNAS_ALERTAS_EXPORTACAO)
+
+
+def test_xlsx_com_aba_de_alertas_e_continuacao(tmp_path, gerada, monkeypatch):
+    agenda, alertas = gerada
+    limite = 7
+    monkeypatch.setattr(roteirizador_core, "LIMITE_LINHAS_XLSX", limite)
+    esperado = list(linhas_agenda(agenda, INICIO))
+    esperado_alertas = list(linhas_alertas(alertas))
+
+    caminho = str(tmp_path / "agenda.xlsx")
+    assert exportar_agenda(caminho, agenda, INICIO, "xlsx", alertas=alertas) == len(esperado)
+    abas = ler(caminho, "xlsx")
+
+    partes_agenda = math.ceil(len(esperado) / limite)
+    nomes_agenda = ["Agenda"] + [f"Agenda ({p})" for p in range(2, partes_agenda + 1)]
+    nomes_alertas = ["Alertas"] + [f"Alertas ({p})" for p in range(2, math.ceil(len(esperado_alertas) / limite) + 1)]
+    assert list(abas) == nomes_agenda + nomes_alertas
+    assert all(len(abas[nome]) == limite for nome in nomes_agenda[:-1] + nomes_alertas[:-1])
+
+    lidas = [linha for nome in nomes_agenda for linha in abas[nome]]
+    assert normalizar(lidas, COLUNAS_AGENDA_EXPORTACAO) == normalizar(esperado, COLUNAS_AGENDA_EXPORTACAO)
+    lidos = [linha for nome in nomes_alertas for linha in abas[nome]]
+    assert normalizar(lidos, COLUNAS_ALERTAS_EXPORTACAO) == normalizar(esperado_alertas, COLUNAS_ALERTAS_EXPORTACAO)
+
+
+@pytest.mark.parametrize("formato", FORMATOS_EXPORTACAO)
+def test_destino_em_memoria(tmp_path, gerada, formato):
+    agenda, _ = gerada
+    saida = io.BytesIO()
+    total = exportar_agenda(saida, agenda, INICIO, formato)
+    assert not saida.closed
+    caminho = tmp_path / f"memoria.{formato}"
+    caminho.write_bytes(saida.getvalue())
+    (lidas,) = ler(str(caminho), formato).values()
+    assert len(lidas) == total == len(list(linhas_agenda(agenda, INICIO)))
+
+
+def test_formato_desconhecido(gerada):
+    agenda, _ = gerada
+    with pytest.raises(ValueError):
+        exportar_agenda(io.BytesIO(), agenda, INICIO, "ods")
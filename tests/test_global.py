@@ -0,0 +1,89 @@
+"""redistribuir_global: cadência, dia preservado, clientes fixos e sobrecarga nunca acima da gulosa."""
+
+import datetime
+import random
+from collections import Counter
+
+import pytest
+
+from roteirizador_core import DIAS_SEMANA, montar_buckets, redistribuir_global
+
+INICIO = datetime.date(2025, 12, 24)
+
+
+def clientes_aleatorios(semente):
+    r = random.Random(semente)
+    return [
+        {"id": i, "nome": f"Cliente {i}", "rota": "BR001",
+         "dia_semana": ",".join(r.sample(DIAS_SEMANA[:r.choice([2, 3, 5])], r.choice([1, 1, 1, 2]))),
+         "frequencia": r.choice([7, 14, 21, 28, 30, 60]), "deslocamento": r.randint(0, 2)}
+        for i in range(r.choice([60, 200]))
+    ]
+
+
+def dias_por_cliente(agenda):
+    """{semana: {id: [dias]}} com os dias em que cada cliente aparece em cada semana."""
+    dias = {}
+    for semana_id, semana in agenda.items():
+        por_id = dias.setdefault(semana_id, {})
+        for dia, lst in semana.items():
+            for c in lst:
+                por_id.setdefault(c["id"], []).append(dia)
+    return dias
+
+
+@pytest.mark.parametrize("semente", range(12))
+@pytest.mark.parametrize("permitir", [False, True])
+@pytest.mark.parametrize("preservar", [False, True])
+def test_cadencia_e_sobrecarga_nunca_acima_da_gulosa(semente, permitir, preservar):
+    clientes = clientes_aleatorios(semente)
+    capacidade = random.Random(semente).choice([5, 10, 20])
+    original = montar_buckets(INICIO, 8, clientes)
+    agenda, realocados, relatorio = redistribuir_global(
+        INICIO, 8, clientes, capacidade, permitir_mover_semanal=permitir, preservar_dia_semana=preservar,
+        tempo_limite=30,
+    )
+
+    assert relatorio["global"]["sobrecarga"] <= relatorio["guloso"]["sobrecarga"]
+    antes, depois = dias_por_cliente(original), dias_por_cliente(agenda)
+    por_cliente = {c["id"]: c for c in clientes}
+    assert antes.keys() == depois.keys()
+    for semana_id in antes:
+        # Mesmas visitas nas mesmas semanas (cadência) e nunca duas visitas do cliente no mesmo dia
+        assert Counter({k: len(v) for k, v in antes[semana_id].items()}) == \
+            Counter({k: len(v) for k, v in depois[semana_id].items()})
+        for cliente_id, dias in depois[semana_id].items():
+            assert len(set(dias)) == len(dias)
+            if por_cliente[cliente_id]["frequencia"] == 7 and not permitir:
+                assert dias == antes[semana_id][cliente_id]
+    assert len(realocados) == sum(
+        1 for semana_id in antes for cliente_id, dias in depois[semana_id].items()
+        for dia in dias if dia not in antes[semana_id][cliente_id]
+    )
+
+    if relatorio["semanas_gulosas"] == 0:
+        # Sem semanas da gulosa: um dia fixo por cliente e clientes de vários dias intocados
+        for cliente_id, c in por_cliente.items():
+            vistos = {tuple(depois[s][cliente_id]) for s in depois if cliente_id in depois[s]}
+            assert len(vistos) <= 1
+            if "," in c["dia_semana"]:
+                assert {tuple(sorted(v, key=DIAS_SEMANA.index)) for v in vistos} <= \
+                    {tuple(sorted(c["dia_semana"].split(","), key=DIAS_SEMANA.index))}
+
+
+def test_preservar_dia_sem_sobrecarga_nao_move():
+    clientes = clientes_aleatorios(3)
+    agenda, realocados, relatorio = redistribuir_global(
+        INICIO, 8, clientes, 1000, permitir_mover_semanal=True, preservar_dia_semana=True,
+    )
+    assert realocados == []
+    assert relatorio["global"]["sobrecarga"] == relatorio["original"]["sobrecarga"] == 0
+
+
+def test_prazo_esgotado_mantem_garantias():
+    clientes = clientes_aleatorios(5)
+    agenda, _, relatorio = redistribuir_global(INICIO, 8, clientes, 5, tempo_limite=0)
+    assert relatorio["interrompido_por_tempo"]
+    assert relatorio["global"]["sobrecarga"] <= relatorio["guloso"]["sobrecarga"]
+    assert sum(len(lst) for dias in agenda.values() for lst in dias.values()) == \
+        sum(len(lst) for dias in montar_buckets(INICIO, 8, clientes).values() for lst in dias.values())
@@ -0,0 +1,108 @@
+"""Importação em blocos (csv, xlsx e parquet): fronteiras de bloco, dedupe, linhas inválidas e vários dias."""
+
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from roteirizador_core import (
+    ArmazemClientesMemoria, Tarefa, contar_linhas_clientes, importar_clientes, ler_blocos_clientes, tarefa_importar,
+)
+
+LINHAS = [
+    # nome, rota, dia_semana, frequencia, lat, lon
+    ("Ana", "BR001", "Segunda", "7", -23.5, -46.6),
+    ("Bia", "BR001", "Quinta, Segunda", "14", 95.0, -46.6),      # lat fora da faixa: mantida sem coordenadas
+    ("Caio", "BR002", "Terça", "abc", -23.5, -46.6),             # frequência não numérica: descartada
+    ("Ana", "BR001", "Segunda", "7", -23.5, -46.6),              # repetida no arquivo (outro bloco)
+    ("Davi", "BR002", "Sexta,Quarta", "30", None, -46.6),        # sem lat: mantida sem coordenadas
+    ("Eva", "BR002", "Quarta", "14", -22.9, -43.2),              # já cadastrada no armazém
+    ("Fábio", None, "Quarta", "7", -22.9, -43.2),                # incompleta: descartada
+]
+EXISTENTE = {"id": 10, "nome": "Eva", "rota": "BR002", "dia_semana": "Quarta", "frequencia": 14}
+
+
+@pytest.fixture(params=["csv", "xlsx", "parquet"])
+def arquivo(request, tmp_path):
+    df = pd.DataFrame(LINHAS, columns=["Nome", "Rota", "Dia_Semana", "Frequencia", "lat", "lon"])
+    caminho = tmp_path / f"clientes.{request.param}"
+    if request.param == "csv":
+        df.to_csv(caminho, index=False)
+    elif request.param == "xlsx":
+        df.to_excel(caminho, index=False)
+    else:
+        df.to_parquet(caminho, index=False)
+    return str(caminho)
+
+
+@pytest.mark.parametrize("tamanho_bloco", [2, 3, 1000])
+def test_blocos_respeitam_o_tamanho(arquivo, tamanho_bloco):
+    blocos = list(ler_blocos_clientes(arquivo, arquivo, tamanho_bloco))
+    assert [len(b) for b in blocos][:-1] == [tamanho_bloco] * (len(blocos) - 1)
+    assert sum(len(b) for b in blocos) == len(LINHAS)
+    assert {"nome", "rota", "dia_semana", "frequencia", "lat", "lon"} <= set(blocos[0].columns)
+
+
+@pytest.mark.parametrize("tamanho_bloco", [2, 3, 1000])
+def test_importacao(arquivo, tamanho_bloco):
+    armazem = ArmazemClientesMemoria([EXISTENTE])
+    progresso = []
+    resultado = importar_clientes(arquivo, arquivo, armazem, tamanho_bloco,
+                                  progresso=lambda lidas, inseridos: progresso.append(lidas))
+
+    assert resultado == {"lidas": len(LINHAS), "inseridos": 3, "ignorados": len(LINHAS) - 3}
+    assert progresso[-1] == len(LINHAS) and progresso == sorted(progresso)
+    novos = {c["nome"]: c for c in armazem.todos()[1:]}
+    assert sorted(novos) == ["Ana", "Bia", "Davi"]
+    assert sorted(c["id"] for c in novos.values()) == [11, 12, 13]
+    assert novos["Bia"]["dia_semana"] == "Segunda,Quinta"
+    assert novos["Davi"]["dia_semana"] == "Quarta,Sexta"
+    assert novos["Bia"]["frequencia"] == 14 and novos["Davi"]["frequencia"] == 30
+    assert (novos["Ana"]["lat"], novos["Ana"]["lon"]) == (-23.5, -46.6)
+    assert novos["Bia"]["lat"] is None and novos["Bia"]["lon"] is None
+    assert novos["Davi"]["lat"] is None and novos["Davi"]["lon"] is None
+
+    # Reimportar o mesmo arquivo não insere nada: todas as chaves já existem
+    assert importar_clientes(arquivo, arquivo, armazem, tamanho_bloco)["inseridos"] == 0
+
+
+def test_colunas_obrigatorias(tmp_path):
+    caminho = tmp_path / "incompleto.csv"
+    pd.DataFrame({"nome": ["Ana"], "rota": ["BR001"]}).to_csv(caminho, index=False)
+    with pytest.raises(ValueError):
+        importar_clientes(str(caminho), str(caminho), ArmazemClientesMemoria())
+
+
+class TarefaRegistrada(Tarefa):
+    """Tarefa executada direto no teste, guardando cada progresso reportado."""
+
+    def __init__(self):
+        super().__init__("importacao")
+        self.historico = []
+
+    def reportar(self, progresso=None, mensagem=None, parcial=None):
+        self.historico.append(progresso)
+        super().reportar(progresso, mensagem, parcial)
+
+
+def test_contar_linhas(arquivo):
+    esperado = None if arquivo.endswith(".csv") else len(LINHAS)
+    with open(arquivo, "rb") as f:
+        assert contar_linhas_clientes(f, arquivo) == esperado
+        assert f.tell() == 0
+
+
+def test_progresso_da_tarefa_por_linhas(arquivo):
+    with open(arquivo, "rb") as f:
+        dados = f.read()
+    tarefa = TarefaRegistrada()
+    resultado = tarefa_importar(tarefa, io.BytesIO(dados), arquivo, ArmazemClientesMemoria([EXISTENTE]),
+                                os.path.getsize(arquivo), tamanho_bloco=2)
+
+    assert resultado["lidas"] == len(LINHAS)
+    assert len(tarefa.historico) == 4  # um por bloco de 2 linhas
+    assert tarefa.historico == sorted(tarefa.historico) and tarefa.historico[-1] == 1.0
+    if not arquivo.endswith(".csv"):
+        # xlsx e parquet: fração exata de linhas lidas, não a posição no arquivo
+        assert tarefa.historico == [min(n / len(LINHAS), 1.0) for n in (2, 4, 6, 7)]
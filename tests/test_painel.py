@@ -0,0 +1,128 @@
+"""PainelCargas atualizado pelos movimentos deve coincidir com um painel montado do zero (de_agenda)."""
+
+import copy
+import datetime
+import random
+
+import pytest
+
+from roteirizador_core import (
+    DIAS_SEMANA, PainelCargas, alertas_agenda, gerar_agenda, redistribuir_balanceado, redistribuir_balanceado_heap,
+)
+
+INICIO = datetime.date(2025, 12, 24)
+CAPACIDADE = 12
+LIMIARES = (0.5, 0.3)
+
+
+def base_aleatoria(semente, n=160):
+    """Clientes concentrados em poucos dias, com vários dias por cliente e todas as frequências conhecidas."""
+    aleatorio = random.Random(semente)
+    return [
+        {"id": i, "nome": f"Cliente {i}", "rota": "BR001",
+         "dia_semana": ",".join(aleatorio.sample(DIAS_SEMANA[:3], aleatorio.choice([1, 1, 2]))),
+         "frequencia": aleatorio.choice([7, 14, 21, 28, 30, 60]), "deslocamento": aleatorio.randint(0, 1)}
+        for i in range(n)
+    ]
+
+
+def estado(painel, agenda):
+    """Tudo o que o painel expõe sobre a agenda: cargas, extremos, dias marcados, visitas e repetidos."""
+    ids = {c["id"] for dias in agenda.values() for lst in dias.values() for c in lst}
+    return {
+        "cargas": {s: list(painel.cargas[s]) for s in agenda},
+        "extremos": {s: (painel.maximo(s), painel.minimo(s)) for s in agenda},
+        "sobrecarregados": set(painel.sobrecarregados),
+        "subcarregados": set(painel.subcarregados),
+        "visitas": {(s, d, i) for s in agenda for d in range(len(DIAS_SEMANA)) for i in ids if painel.contem(s, d, i)},
+        "repetidos": {chave: +contagem for chave, contagem in painel.repetidos.items() if +contagem},
+    }
+
+
+def conferir(painel, agenda):
+    novo = PainelCargas.de_agenda(agenda, CAPACIDADE, *LIMIARES)
+    assert estado(painel, agenda) == estado(novo, agenda)
+    assert list(alertas_agenda(agenda, [], CAPACIDADE, *LIMIARES, painel=painel)) == \
+        list(alertas_agenda(agenda, [], CAPACIDADE, *LIMIARES))
+
+
+@pytest.mark.parametrize("semente", range(6))
+@pytest.mark.parametrize("preservar", [False, True])
+def test_painel_apos_redistribuicao_heap(semente, preservar):
+    agenda, _, resumo = gerar_agenda(INICIO, 8, base_aleatoria(semente), CAPACIDADE, limiar_dia_pct=LIMIARES[0],
+                                     limiar_semana_pct=LIMIARES[1])
+    painel = resumo["painel"]
+    ajustada, realocados = redistribuir_balanceado_heap(agenda, CAPACIDADE, permitir_mover_semanal=True,
+                                                       preservar_dia_semana=preservar, painel=painel)
+    assert realocados
+    conferir(painel, ajustada)
+
+
+@pytest.mark.parametrize("semente", range(6))
+def test_painel_apos_redistribuicao_classica(semente):
+    agenda, _, resumo = gerar_agenda(INICIO, 8, base_aleatoria(semente), CAPACIDADE, limiar_dia_pct=LIMIARES[0],
+                                     limiar_semana_pct=LIMIARES[1])
+    painel = resumo["painel"]
+    ajustada, realocados = redistribuir_balanceado(agenda, CAPACIDADE, permitir_mover_semanal=True, painel=painel)
+    assert realocados
+    conferir(painel, ajustada)
+
+
+@pytest.mark.parametrize("redistribuir", [redistribuir_balanceado, redistribuir_balanceado_heap])
+def test_painel_com_visitas_repetidas(redistribuir):
+    """Agenda com o mesmo id repetido em um dia (caminho dos repetidos em mover/aplicar_semana)."""
+    agenda, _, _ = gerar_agenda(INICIO, 4, base_aleatoria(7), CAPACIDADE)
+    for dias in agenda.values():
+        segunda = dias["Segunda"]
+        segunda.extend(copy.deepcopy(segunda[:3]))
+    painel = PainelCargas.de_agenda(agenda, CAPACIDADE, *LIMIARES)
+    assert painel.repetidos
+    ajustada, _ = redistribuir(agenda, CAPACIDADE, permitir_mover_semanal=True, painel=painel)
+    conferir(painel, ajustada)
+
+
+@pytest.mark.parametrize("semente", range(4))
+def test_painel_movimentos_aleatorios(semente):
+    """Sequência aleatória de adicionar/remover/mover, espelhada nas listas da agenda."""
+    aleatorio = random.Random(semente)
+    agenda, _, _ = gerar_agenda(INICIO, 3, base_aleatoria(semente, 60), CAPACIDADE)
+    painel = PainelCargas.de_agenda(agenda, CAPACIDADE, *LIMIARES)
+    semanas = list(agenda)
+    for _ in range(600):
+        semana_id = aleatorio.choice(semanas)
+        dias = agenda[semana_id]
+        origem, destino = aleatorio.randrange(len(DIAS_SEMANA)), aleatorio.randrange(len(DIAS_SEMANA))
+        lst = dias[DIAS_SEMANA[origem]]
+        operacao = aleatorio.random()
+        if operacao < 0.2 or not lst:
+            cliente = {"id": aleatorio.randrange(70)}
+            dias[DIAS_SEMANA[destino]].append(cliente)
+            painel.adicionar(semana_id, destino, cliente["id"])
+        elif operacao < 0.4:
+            cliente = lst.pop(aleatorio.randrange(len(lst)))
+            painel.remover(semana_id, origem, cliente["id"])
+        else:
+            cliente = lst.pop(aleatorio.randrange(len(lst)))
+            dias[DIAS_SEMANA[destino]].append(cliente)
+            painel.mover(semana_id, origem, destino, cliente["id"])
+    conferir(painel, agenda)
+
+
+@pytest.mark.parametrize("semente", range(4))
+def test_painel_aplicar_semana(semente):
+    """Movimentos em lote (como no heap), inclusive para um dia em que o cliente já tem visita."""
+    aleatorio = random.Random(semente)
+    agenda, _, _ = gerar_agenda(INICIO, 4, base_aleatoria(semente, 80), CAPACIDADE)
+    painel = PainelCargas.de_agenda(agenda, CAPACIDADE, *LIMIARES)
+    for semana_id, dias in agenda.items():
+        movimentos = []
+        for _ in range(aleatorio.randrange(30)):
+            origem, destino = aleatorio.randrange(len(DIAS_SEMANA)), aleatorio.randrange(len(DIAS_SEMANA))
+            lst = dias[DIAS_SEMANA[origem]]
+            if lst and origem != destino:
+                cliente = lst.pop(aleatorio.randrange(len(lst)))
+                dias[DIAS_SEMANA[destino]].append(cliente)
+                movimentos.append((cliente["id"], origem, destino))
+        painel.aplicar_semana(semana_id, [len(dias[dia]) for dia in DIAS_SEMANA], movimentos)
+    assert painel.repetidos
+    conferir(painel, agenda)
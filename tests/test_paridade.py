@@ -0,0 +1,81 @@
+"""Paridade dos motores de geração (vetorizado e com cache) contra gerar_agenda."""
+
+import datetime
+import random
+
+import pytest
+
+from roteirizador_core import (
+    DIAS_SEMANA, REGRAS_FREQUENCIA, CacheCompartilhado, CacheLRU, gerar_agenda, gerar_agenda_cacheada,
+    gerar_agenda_vetorizada, materializar_agenda,
+)
+
+ROTAS = ["BR001", "BR002", "BR003"]
+
+
+def base_aleatoria(semente, n=300):
+    """Base com ids repetidos, cadastros incompletos, dias inválidos, frequências desconhecidas e vários dias."""
+    aleatorio = random.Random(semente)
+    clientes = []
+    for i in range(n):
+        dias = aleatorio.sample(DIAS_SEMANA, aleatorio.choice([1, 1, 1, 2, 3]))
+        cliente = {
+            "id": aleatorio.randint(1, n * 9 // 10),
+            "nome": f"Cliente {i}",
+            "rota": aleatorio.choice(ROTAS),
+            "dia_semana": ",".join(dias),
+            "frequencia": aleatorio.choice(list(REGRAS_FREQUENCIA) * 4 + [10]),
+        }
+        if aleatorio.random() < 0.2:
+            cliente["deslocamento"] = aleatorio.randint(0, 3)
+        sorteio = aleatorio.random()
+        if sorteio < 0.03:
+            cliente["dia_semana"] = "Domingo"
+        elif sorteio < 0.06:
+            cliente["nome"] = ""
+        clientes.append(cliente)
+    return clientes
+
+
+@pytest.mark.parametrize("semente", range(8))
+@pytest.mark.parametrize("rota", [None, "BR002"])
+def test_vetorizada_igual_a_gerar_agenda(semente, rota):
+    aleatorio = random.Random(semente)
+    inicio = datetime.date(2025, 12, 24) + datetime.timedelta(days=aleatorio.randint(0, 120))
+    semanas = aleatorio.choice([1, 6, 12, 27])
+    capacidade = aleatorio.choice([5, 20, 40])
+    clientes = base_aleatoria(semente)
+
+    agenda, alertas, resumo = gerar_agenda(inicio, semanas, clientes, capacidade, rota=rota)
+    indices, alertas_vet, resumo_vet = gerar_agenda_vetorizada(inicio, semanas, clientes, capacidade, rota=rota)
+
+    assert materializar_agenda(indices, resumo_vet["colunas"]) == agenda
+    assert list(alertas_vet) == list(alertas)
+    assert resumo_vet["total_clientes"] == resumo["total_clientes"]
+
+
+@pytest.mark.parametrize("semente", range(4))
+@pytest.mark.parametrize("rota", [None, "BR002"])
+@pytest.mark.parametrize("compartilhado", [False, True])
+def test_cacheada_igual_a_gerar_agenda(semente, rota, compartilhado):
+    aleatorio = random.Random(semente)
+    inicio = datetime.date(2025, 12, 24) + datetime.timedelta(days=aleatorio.randint(0, 120))
+    semanas = aleatorio.choice([1, 6, 12])
+    capacidade = aleatorio.choice([5, 20])
+    clientes = base_aleatoria(semente)
+    cache = CacheCompartilhado().escopo("Sul") if compartilhado else CacheLRU()
+
+    def conferir(clientes):
+        agenda, alertas, resumo = gerar_agenda(inicio, semanas, clientes, capacidade, rota=rota)
+        for _ in range(2):  # a segunda chamada vem do cache
+            agenda_cache, alertas_cache, resumo_cache = gerar_agenda_cacheada(
+                inicio, semanas, clientes, capacidade, rota=rota, cache=cache,
+            )
+            assert agenda_cache == agenda
+            assert list(alertas_cache) == list(alertas)
+            assert resumo_cache["total_clientes"] == resumo["total_clientes"]
+
+    conferir(clientes)
+    # Novos clientes numa única rota: as demais reaproveitam os buckets guardados
+    novos = [{**c, "id": 10_000 + i, "nome": f"Novo {i}", "rota": "BR001"} for i, c in enumerate(clientes[:20])]
+    conferir(clientes + novos)
@@ -0,0 +1,54 @@
+"""Redistribuição gulosa (clássica e com heap) com todas as frequências de REGRAS_FREQUENCIA."""
+
+import copy
+import datetime
+
+import pytest
+
+from roteirizador_core import (
+    DIAS_SEMANA, PRIORIDADE_MOVER, REGRAS_FREQUENCIA, gerar_agenda, redistribuir_balanceado,
+    redistribuir_balanceado_heap,
+)
+
+INICIO = datetime.date(2025, 12, 24)
+CAPACIDADE = 10
+
+
+def agenda_mista():
+    """6 semanas com todos os clientes na Segunda, misturando 7/14/21/28/30/60 (cabe na capacidade da semana)."""
+    frequencias = list(REGRAS_FREQUENCIA)
+    clientes = [
+        {"id": i, "nome": f"Cliente {i}", "rota": "BR001", "dia_semana": "Segunda",
+         "frequencia": frequencias[i % len(frequencias)]}
+        for i in range(48)
+    ]
+    agenda, _, _ = gerar_agenda(INICIO, 6, clientes, CAPACIDADE)
+    return agenda
+
+
+def test_prioridade_cobre_todas_as_frequencias():
+    assert set(PRIORIDADE_MOVER) == set(REGRAS_FREQUENCIA)
+    assert sorted(PRIORIDADE_MOVER, key=PRIORIDADE_MOVER.get) == sorted(REGRAS_FREQUENCIA, reverse=True)
+
+
+@pytest.mark.parametrize("redistribuir", [redistribuir_balanceado, redistribuir_balanceado_heap])
+def test_move_todas_as_frequencias_nao_semanais(redistribuir):
+    original = agenda_mista()
+    ajustada, realocados = redistribuir(copy.deepcopy(original), CAPACIDADE, permitir_mover_semanal=True)
+
+    movidas = {int(nome.split()[1]) % len(REGRAS_FREQUENCIA) for nome, _, _, _ in realocados}
+    assert {list(REGRAS_FREQUENCIA).index(f) for f in (21, 28, 60)} <= movidas
+    for semana_id, dias in ajustada.items():
+        cargas = [len(dias[dia]) for dia in DIAS_SEMANA]
+        total = sum(len(lst) for lst in original[semana_id].values())
+        if total <= CAPACIDADE * len(DIAS_SEMANA):
+            assert max(cargas) <= CAPACIDADE, (semana_id, cargas)
+        ids = sorted(c["id"] for lst in dias.values() for c in lst)
+        assert ids == sorted(c["id"] for lst in original[semana_id].values() for c in lst)
+
+
+def test_motores_gulosos_concordam():
+    original = agenda_mista()
+    classica = redistribuir_balanceado(copy.deepcopy(original), CAPACIDADE)
+    heap = redistribuir_balanceado_heap(copy.deepcopy(original), CAPACIDADE)
+    assert classica == heap
@@ -0,0 +1,114 @@
+"""Sequenciamento do dia: paradas preservadas, rota nunca pior que a ordem de entrada, clientes sem coordenadas."""
+
+import random
+
+import pytest
+
+from roteirizador_core import (
+    MAPA_DIA_IDX, IndiceEspacial, TabelaAlertas, _ordem_visita, matriz_distancias, sequenciar_agenda, sequenciar_dia,
+    tem_coordenadas,
+)
+
+ORIGEM = (-23.55, -46.63)
+
+
+def clientes_aleatorios(n, semente, sem_coordenadas=0.0):
+    r = random.Random(semente)
+    clientes = []
+    for i in range(n):
+        c = {"id": i, "nome": f"Cliente {i}", "rota": "BR001"}
+        if r.random() >= sem_coordenadas:
+            c["lat"], c["lon"] = -23.55 + r.uniform(-0.3, 0.3), -46.63 + r.uniform(-0.3, 0.3)
+        clientes.append(c)
+    return clientes
+
+
+def km_da_ordem(clientes, origem):
+    """Distância percorrendo os clientes com coordenadas na ordem dada (circuito com origem, caminho sem)."""
+    pontos = [(c["lat"], c["lon"]) for c in clientes if tem_coordenadas(c)]
+    if origem is not None:
+        pontos = [origem] + pontos + [origem]
+    if len(pontos) < 2:
+        return 0.0
+    matriz = matriz_distancias([p[0] for p in pontos], [p[1] for p in pontos])
+    return float(sum(matriz[q, q + 1] for q in range(len(pontos) - 1)))
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 8, 40, 150])
+@pytest.mark.parametrize("origem", [None, ORIGEM])
+@pytest.mark.parametrize("sem_coordenadas", [0.0, 0.3])
+def test_ordem_mantem_paradas_e_nao_piora(n, origem, sem_coordenadas):
+    clientes = clientes_aleatorios(n, n, sem_coordenadas)
+    ordem, km = _ordem_visita(clientes, origem)
+
+    assert sorted(ordem) == list(range(n))
+    sem = [p for p, c in enumerate(clientes) if not tem_coordenadas(c)]
+    assert ordem[len(ordem) - len(sem):] == sem  # sem coordenadas: no fim, na ordem original
+    visitados = [clientes[p] for p in ordem]
+    assert km == pytest.approx(km_da_ordem(visitados, origem))
+    assert km <= km_da_ordem(clientes, origem) + 1e-9
+
+
+def test_dia_sem_nenhuma_coordenada():
+    clientes = clientes_aleatorios(5, 1, sem_coordenadas=1.0)
+    assert sequenciar_dia(clientes, ORIGEM) == (clientes, 0.0)
+
+
+@pytest.mark.parametrize("n", [1, 5, 60])
+def test_indice_espacial_candidatos(n):
+    r = random.Random(n)
+    lats = [r.uniform(-1, 1) for _ in range(n)]
+    lons = [r.uniform(-1, 1) for _ in range(n)]
+    indice = IndiceEspacial(lats, lons)
+    for i in range(n):
+        for k in (1, 4, n):
+            candidatos = indice.candidatos(i, k)
+            assert i not in candidatos and len(set(candidatos)) == len(candidatos)
+            assert len(candidatos) >= min(k, n - 1)
+            assert set(indice.celulas[indice.celula[i]]) - {i} <= set(candidatos)
+        assert sorted(indice.candidatos(i, n)) == [j for j in range(n) if j != i]
+
+
+def agenda_de(clientes):
+    # Duas semanas com o mesmo dia (memo) e uma diferente
+    return {
+        "Semana 1": {"Segunda": clientes[:20], "Terça": clientes[20:]},
+        "Semana 2": {"Segunda": clientes[:20], "Terça": []},
+    }
+
+
+def test_sequenciar_agenda_mantem_cada_parada_uma_vez():
+    clientes = clientes_aleatorios(35, 7, sem_coordenadas=0.2)
+    agenda = agenda_de(clientes)
+    sequenciada, percursos, alertas = sequenciar_agenda(agenda, origem=ORIGEM)
+
+    for semana_id, dias in agenda.items():
+        for dia, lst in dias.items():
+            nova = sequenciada[semana_id][dia]
+            assert nova is not lst
+            assert sorted(id(c) for c in nova) == sorted(id(c) for c in lst)
+            assert percursos[semana_id][dia]["sem_coordenadas"] == sum(1 for c in lst if not tem_coordenadas(c))
+            assert percursos[semana_id][dia]["km"] <= round(km_da_ordem(lst, ORIGEM), 2) + 0.01
+    assert percursos["Semana 1"]["Segunda"] == percursos["Semana 2"]["Segunda"]
+    assert len(alertas) == 0
+
+
+def test_alerta_de_jornada():
+    clientes = clientes_aleatorios(35, 7)
+    agenda = agenda_de(clientes)
+    _, percursos, _ = sequenciar_agenda(agenda, origem=ORIGEM, minutos_por_visita=15)
+    minutos_segunda = percursos["Semana 1"]["Segunda"]["minutos"]
+
+    alertas = TabelaAlertas()
+    _, _, alertas = sequenciar_agenda(agenda, origem=ORIGEM, minutos_por_visita=15,
+                                      jornada_minutos=minutos_segunda - 1, alertas=alertas, rota="BR001")
+    excedidos = [(alertas.semana[i], alertas.dia[i], alertas.qtd[i]) for i in range(len(alertas))
+                 if alertas.tipo_de(i) == "jornada_excedida"]
+    dias_acima = {(s, MAPA_DIA_IDX[dia]) for s, semana in enumerate(percursos.values())
+                  for dia, p in semana.items() if p["minutos"] > minutos_segunda - 1}
+    assert {(s, d) for s, d, _ in excedidos} == dias_acima
+    assert (0, 0, minutos_segunda) in excedidos and (1, 0, minutos_segunda) in excedidos
+    assert all(alertas.rota[i] == "BR001" for i in range(len(alertas)))
+
+    _, _, sem_alerta = sequenciar_agenda(agenda, origem=ORIGEM, jornada_minutos=10 ** 6)
+    assert len(sem_alerta) == 0
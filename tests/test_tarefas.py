@@ -0,0 +1,125 @@
+"""GerenciadorTarefas: reaproveitamento por chave, cancelamento, resubmissão e resultados parciais."""
+
+import threading
+
+import pytest
+
+from roteirizador_core import GerenciadorTarefas, TarefaCancelada
+
+ESPERA = 5
+
+
+@pytest.fixture
+def gerenciador():
+    g = GerenciadorTarefas(workers=1)
+    yield g
+    g.encerrar()
+
+
+def bloquear(tarefa, liberar, iniciou=None):
+    """Fica em execução até 'liberar', conferindo o cancelamento a cada volta."""
+    if iniciou is not None:
+        iniciou.set()
+    while not liberar.wait(0.01):
+        tarefa.verificar_cancelamento()
+    return "ok"
+
+
+def somar(tarefa, a, b):
+    return a + b
+
+
+def falhar(tarefa, tentativas):
+    tentativas.append(1)
+    if len(tentativas) == 1:
+        raise RuntimeError("falha na primeira tentativa")
+    return len(tentativas)
+
+
+def test_mesma_chave_reaproveita_a_tarefa(gerenciador):
+    chamadas = []
+
+    def contar(tarefa):
+        chamadas.append(1)
+        return len(chamadas)
+
+    primeira = gerenciador.submeter(("soma", 1), contar)
+    assert primeira.aguardar(ESPERA)
+    assert gerenciador.submeter(("soma", 1), contar) is primeira
+    assert primeira.resultado == 1 and chamadas == [1]
+
+    outra = gerenciador.submeter(("soma", 2), somar, 2, 3)
+    assert outra is not primeira
+    assert outra.aguardar(ESPERA) and outra.resultado == 5
+
+
+def test_cancelar_tarefa_na_fila_e_em_execucao(gerenciador):
+    liberar, iniciou = threading.Event(), threading.Event()
+    executando = gerenciador.submeter(("bloqueia",), bloquear, liberar, iniciou)
+    assert iniciou.wait(ESPERA)
+    na_fila = gerenciador.submeter(("soma",), somar, 1, 2)  # um único worker: fica na fila
+
+    na_fila.cancelar()
+    assert na_fila.estado == "cancelada" and na_fila.aguardar(0)
+
+    executando.cancelar()
+    assert executando.aguardar(ESPERA)
+    assert executando.estado == "cancelada" and executando.resultado is None
+    with pytest.raises(TarefaCancelada):
+        executando.reportar(0.5)
+
+
+def test_canceladas_e_com_erro_sao_refeitas(gerenciador):
+    liberar, iniciou = threading.Event(), threading.Event()
+    cancelada = gerenciador.submeter(("bloqueia",), bloquear, liberar, iniciou)
+    assert iniciou.wait(ESPERA)
+    cancelada.cancelar()
+    assert cancelada.aguardar(ESPERA)
+    liberar.set()
+    refeita = gerenciador.submeter(("bloqueia",), bloquear, liberar)
+    assert refeita is not cancelada
+    assert refeita.aguardar(ESPERA) and refeita.resultado == "ok"
+
+    tentativas = []
+    com_erro = gerenciador.submeter(("falha",), falhar, tentativas)
+    assert com_erro.aguardar(ESPERA)
+    assert com_erro.estado == "erro" and isinstance(com_erro.erro, RuntimeError)
+    nova = gerenciador.submeter(("falha",), falhar, tentativas)
+    assert nova is not com_erro
+    assert nova.aguardar(ESPERA) and nova.estado == "concluida" and nova.resultado == 2
+
+
+def test_parciais_em_ordem(gerenciador):
+    continuar = [threading.Event() for _ in range(3)]
+    publicados = [threading.Event() for _ in range(3)]
+
+    def publicar(tarefa):
+        for i in range(3):
+            tarefa.reportar((i + 1) / 3, f"parte {i}", parcial=i)
+            publicados[i].set()
+            continuar[i].wait(ESPERA)
+        return "fim"
+
+    tarefa = gerenciador.submeter(("parciais",), publicar)
+    lidos = []
+    for i in range(3):
+        assert publicados[i].wait(ESPERA)
+        lidos.extend(tarefa.parciais(len(lidos)))
+        assert lidos == list(range(i + 1))
+        assert tarefa.progresso == pytest.approx((i + 1) / 3)
+        continuar[i].set()
+    assert tarefa.aguardar(ESPERA)
+    assert tarefa.parciais() == [0, 1, 2] and tarefa.resultado == "fim"
+
+
+def test_guarda_so_as_ultimas_concluidas():
+    gerenciador = GerenciadorTarefas(workers=1, max_concluidas=2)
+    try:
+        tarefas = [gerenciador.submeter(("soma", i), somar, i, i) for i in range(4)]
+        for tarefa in tarefas:
+            assert tarefa.aguardar(ESPERA)
+        gerenciador.submeter(("soma", 4), somar, 4, 4).aguardar(ESPERA)
+        assert gerenciador.obter(("soma", 0)) is None
+        assert gerenciador.obter(("soma", 3)) is tarefas[3]
+    finally:
+        gerenciador.encerrar()